@@ -0,0 +1,275 @@
+"""Cost rollup tables maintained by triggers.
+
+product_costs holds the part and labour costs of each group product,
+group_costs and offer_costs the total costs of groups and offers.
+Triggers on the source tables apply the change of each write as a delta
+to the rollups, so reading a total does not depend on the size of the database.
+When a primary key changes, foreign key cascades move the child rows first
+and the renamed rollup row is then summed from it's children. Inserted rows
+are summed from their existing children too, as undo restores the rows
+deleted by a cascade before their parents.
+
+All costs are fixed-point integers, see db.dbtypes.
+"""
+
+import sqlite3
+
+import db.dbtypes as dbt
+from db.vars import VarID
+
+
+class CostRollups:
+    """Create, fill and read the cost rollup tables.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection created with db.database.connect.
+    """
+    TABLES = ("product_costs", "group_costs", "offer_costs")
+    # Triggers changed after the first schema version, replaced by migrations.
+    REPLACED_TRIGGERS = ("rollup_products_it", "rollup_groups_it", "rollup_offers_it")
+
+    def __init__(self, connection):
+        self.con: sqlite3.Connection = connection
+        labour = dbt.sql_round_div(
+            "coalesce({t},0)*coalesce("
+            f"(SELECT value_decimal FROM variables WHERE variable_id={VarID.WORK_COST}),0)",
+            dbt.FIXED_SCALE
+        )
+        self.sql_labour_cost = labour
+        self.sql_create_tables = """
+            CREATE TABLE IF NOT EXISTS product_costs (
+                group_product_id INTEGER PRIMARY KEY,
+                group_id    INTEGER NOT NULL,
+                work_time   INTEGER NOT NULL DEFAULT 0,
+                part_cost   INTEGER NOT NULL DEFAULT 0,
+                labour_cost INTEGER NOT NULL DEFAULT 0,
+                tot_cost    INTEGER GENERATED ALWAYS AS (part_cost + labour_cost) STORED
+            );
+            CREATE INDEX IF NOT EXISTS idx_product_costs_group
+            ON product_costs(group_id);
+            CREATE TABLE IF NOT EXISTS group_costs (
+                group_id    INTEGER PRIMARY KEY,
+                offer_id    INTEGER NOT NULL,
+                tot_cost    INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_group_costs_offer
+            ON group_costs(offer_id);
+            CREATE TABLE IF NOT EXISTS offer_costs (
+                offer_id    INTEGER PRIMARY KEY,
+                tot_cost    INTEGER NOT NULL DEFAULT 0
+            );
+        """
+
+    def get_triggers_script(self) -> str:
+        """Return the script creating the triggers that maintain the rollups."""
+        new_labour = self.sql_labour_cost.format(t="new.work_time")
+        return f"""
+        CREATE TRIGGER IF NOT EXISTS rollup_parts_it
+        AFTER INSERT ON group_parts BEGIN
+            UPDATE product_costs SET part_cost=part_cost+coalesce(new.cost,0)
+            WHERE group_product_id=new.group_product_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_parts_ut
+        AFTER UPDATE OF cost, group_product_id ON group_parts BEGIN
+            UPDATE product_costs SET part_cost=part_cost-coalesce(old.cost,0)
+            WHERE group_product_id=old.group_product_id;
+            UPDATE product_costs SET part_cost=part_cost+coalesce(new.cost,0)
+            WHERE group_product_id=new.group_product_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_parts_dt
+        AFTER DELETE ON group_parts BEGIN
+            UPDATE product_costs SET part_cost=part_cost-coalesce(old.cost,0)
+            WHERE group_product_id=old.group_product_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_products_it
+        AFTER INSERT ON group_products BEGIN
+            INSERT OR REPLACE INTO product_costs(
+                group_product_id, group_id, work_time, part_cost, labour_cost
+            ) VALUES (
+                new.group_product_id, new.group_id,
+                coalesce(new.work_time,0),
+                (SELECT coalesce(SUM(cost),0) FROM group_parts
+                 WHERE group_product_id=new.group_product_id),
+                {new_labour}
+            );
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_products_ut
+        AFTER UPDATE OF group_product_id, group_id, work_time ON group_products BEGIN
+            UPDATE product_costs SET
+                group_product_id=new.group_product_id,
+                group_id=new.group_id,
+                work_time=coalesce(new.work_time,0),
+                labour_cost={new_labour}
+            WHERE group_product_id=old.group_product_id;
+            UPDATE product_costs SET part_cost=(
+                SELECT coalesce(SUM(cost),0) FROM group_parts
+                WHERE group_product_id=new.group_product_id
+            )
+            WHERE group_product_id=new.group_product_id
+                AND new.group_product_id<>old.group_product_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_products_dt
+        AFTER DELETE ON group_products BEGIN
+            DELETE FROM product_costs WHERE group_product_id=old.group_product_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_work_cost_ut
+        AFTER UPDATE OF value_decimal ON variables
+        WHEN new.variable_id={VarID.WORK_COST} BEGIN
+            UPDATE product_costs
+            SET labour_cost={self.sql_labour_cost.format(t="work_time")};
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_product_costs_it
+        AFTER INSERT ON product_costs BEGIN
+            UPDATE group_costs SET tot_cost=tot_cost+new.tot_cost
+            WHERE group_id=new.group_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_product_costs_ut
+        AFTER UPDATE ON product_costs BEGIN
+            UPDATE group_costs SET tot_cost=tot_cost-old.tot_cost
+            WHERE group_id=old.group_id;
+            UPDATE group_costs SET tot_cost=tot_cost+new.tot_cost
+            WHERE group_id=new.group_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_product_costs_dt
+        AFTER DELETE ON product_costs BEGIN
+            UPDATE group_costs SET tot_cost=tot_cost-old.tot_cost
+            WHERE group_id=old.group_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_groups_it
+        AFTER INSERT ON groups BEGIN
+            INSERT OR REPLACE INTO group_costs(group_id, offer_id, tot_cost)
+            VALUES (new.group_id, new.offer_id, (
+                SELECT coalesce(SUM(tot_cost),0) FROM product_costs
+                WHERE group_id=new.group_id
+            ));
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_groups_ut
+        AFTER UPDATE OF group_id, offer_id ON groups BEGIN
+            UPDATE group_costs SET group_id=new.group_id, offer_id=new.offer_id
+            WHERE group_id=old.group_id;
+            UPDATE group_costs SET tot_cost=(
+                SELECT coalesce(SUM(tot_cost),0) FROM product_costs
+                WHERE group_id=new.group_id
+            )
+            WHERE group_id=new.group_id AND new.group_id<>old.group_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_groups_dt
+        AFTER DELETE ON groups BEGIN
+            DELETE FROM group_costs WHERE group_id=old.group_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_group_costs_it
+        AFTER INSERT ON group_costs BEGIN
+            UPDATE offer_costs SET tot_cost=tot_cost+new.tot_cost
+            WHERE offer_id=new.offer_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_group_costs_ut
+        AFTER UPDATE ON group_costs BEGIN
+            UPDATE offer_costs SET tot_cost=tot_cost-old.tot_cost
+            WHERE offer_id=old.offer_id;
+            UPDATE offer_costs SET tot_cost=tot_cost+new.tot_cost
+            WHERE offer_id=new.offer_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_group_costs_dt
+        AFTER DELETE ON group_costs BEGIN
+            UPDATE offer_costs SET tot_cost=tot_cost-old.tot_cost
+            WHERE offer_id=old.offer_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_offers_it
+        AFTER INSERT ON offers BEGIN
+            INSERT OR REPLACE INTO offer_costs(offer_id, tot_cost)
+            VALUES (new.offer_id, (
+                SELECT coalesce(SUM(tot_cost),0) FROM group_costs
+                WHERE offer_id=new.offer_id
+            ));
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_offers_ut
+        AFTER UPDATE OF offer_id ON offers BEGIN
+            UPDATE offer_costs SET offer_id=new.offer_id, tot_cost=(
+                SELECT coalesce(SUM(tot_cost),0) FROM group_costs
+                WHERE offer_id=new.offer_id
+            )
+            WHERE offer_id=old.offer_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_offers_dt
+        AFTER DELETE ON offers BEGIN
+            DELETE FROM offer_costs WHERE offer_id=old.offer_id;
+        END;
+        """
+
+    def exists(self) -> bool:
+        """Return True if all rollup tables exist."""
+        binds = ",".join(["?"] * len(self.TABLES))
+        count = self.con.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name IN ({binds})",
+            self.TABLES
+        ).fetchone()[0]
+        return count == len(self.TABLES)
+
+    def create(self):
+        """Create the rollup tables and triggers.
+
+        The rollups are filled from the source tables if they did not exist.
+        Must be called after the source tables are created.
+        """
+        existed = self.exists()
+        try:
+            self.con.executescript(self.sql_create_tables)
+            self.con.executescript(self.get_triggers_script())
+        except sqlite3.OperationalError as err:
+            print(f"Could not create cost rollups: {err}")
+            return
+        if not existed:
+            self.refresh()
+
+    def replace_triggers(self):
+        """Drop and create again the triggers changed since they were created."""
+        for name in self.REPLACED_TRIGGERS:
+            self.con.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self.con.executescript(self.get_triggers_script())
+
+    def refresh(self):
+        """Recompute all rollups from the source tables.
+
+        Triggers keep the rollups up to date, this is needed only for
+        databases written without them.
+        """
+        labour = self.sql_labour_cost.format(t="p.work_time")
+        with self.con:
+            self.con.execute("DELETE FROM offer_costs")
+            self.con.execute("DELETE FROM group_costs")
+            self.con.execute("DELETE FROM product_costs")
+            self.con.execute("INSERT INTO offer_costs(offer_id) SELECT offer_id FROM offers")
+            self.con.execute(
+                "INSERT INTO group_costs(group_id, offer_id) SELECT group_id, offer_id FROM groups"
+            )
+            self.con.execute(f"""
+                INSERT INTO product_costs(
+                    group_product_id, group_id, work_time, part_cost, labour_cost
+                )
+                SELECT
+                    p.group_product_id,
+                    p.group_id,
+                    coalesce(p.work_time,0),
+                    coalesce((
+                        SELECT SUM(a.cost) FROM group_parts AS a
+                        WHERE a.group_product_id=p.group_product_id
+                    ),0),
+                    {labour}
+                FROM group_products AS p
+            """)
+
+    def get_offer_cost(self, offer_id: int):
+        """Return the total cost of the offer as Decimal or None if not found."""
+        result = self.con.execute(
+            "SELECT tot_cost AS 'tot_cost [pydecimal]' FROM offer_costs WHERE offer_id=(?)",
+            (offer_id,)
+        ).fetchone()
+        return None if result is None else result[0]
@@ -0,0 +1,85 @@
+"""Row counts of the tables maintained by triggers.
+
+row_counts holds the number of rows of each table for each foreign key,
+tables without a foreign key use 0 as the key. Triggers on the tables
+apply each insert, delete and change of foreign key to the count, so the
+size of a group or catalogue is read without scanning it's rows.
+"""
+
+import sqlite3
+
+
+class RowCounts:
+    """Create, fill and read the maintained row counts.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection created with db.database.connect.
+    """
+    def __init__(self, connection):
+        self.con: sqlite3.Connection = connection
+
+    @staticmethod
+    def get_script(table) -> str:
+        """Return the script creating the count triggers of a SQLTableBase."""
+        name = table.name
+        if table.foreign_key is None:
+            new = old = "0"
+        else:
+            new = f"coalesce(new.{table.foreign_key},0)"
+            old = f"coalesce(old.{table.foreign_key},0)"
+        add = f"""
+            INSERT INTO row_counts(tablename, fk, n) VALUES ('{name}', {new}, 1)
+            ON CONFLICT(tablename, fk) DO UPDATE SET n=n+1;"""
+        remove = f"""
+            UPDATE row_counts SET n=n-1 WHERE tablename='{name}' AND fk={old};
+            DELETE FROM row_counts WHERE tablename='{name}' AND fk={old} AND n<=0;"""
+        script = f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_count_it AFTER INSERT ON {name} BEGIN{add}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {name}_count_dt AFTER DELETE ON {name} BEGIN{remove}
+        END;
+        """
+        if table.foreign_key is not None:
+            script += f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_count_ut AFTER UPDATE OF {table.foreign_key}
+        ON {name} WHEN {old} IS NOT {new} BEGIN{remove}{add}
+        END;
+        """
+        return script
+
+    def create(self, tables: list):
+        """Create the count table and triggers and count the existing rows.
+
+        Parameters
+        ----------
+        tables : list
+            SQLTableBase objects to count, must be created before.
+        """
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS row_counts (
+                tablename   TEXT NOT NULL,
+                fk          INTEGER NOT NULL,
+                n           INTEGER NOT NULL,
+                PRIMARY KEY (tablename, fk)
+            ) WITHOUT ROWID
+        """)
+        for table in tables:
+            try:
+                self.con.executescript(self.get_script(table))
+                self.refresh(table)
+            except sqlite3.OperationalError as err:
+                print(f"Could not create row count triggers for {table.name}: {err}")
+
+    def refresh(self, table):
+        """Count the rows of a SQLTableBase again."""
+        fk = "0" if table.foreign_key is None else f"coalesce({table.foreign_key},0)"
+        with self.con:
+            self.con.execute("DELETE FROM row_counts WHERE tablename=(?)", (table.name,))
+            self.con.execute(
+                f"""
+                INSERT INTO row_counts(tablename, fk, n)
+                SELECT '{table.name}', {fk}, COUNT(*) FROM {table.name} GROUP BY 2
+                """
+            )
@@ -4,22 +4,27 @@ Use Variables and VarID classes to get and set values from variables table.
 Use connect function to create a sqlite3 connection object required by
 tables. Catalogue tables work as a local database for now.
 Could be implemented to connect to remote at a later time.
-
-TODO: Add a paste_row method to SQLTableBase that sets unique columns to None and
-inserts.
 """
 import sqlite3
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 # from asteval import Interpreter
 
 import db.dbtypes as dbt
-from db.super import SQLTableBase
+import db.migrations as migrations
+from db.super import SQLTableBase, iter_rows, transaction
 from db.offer import OffersTable
 from db.group import GroupsTable
 from db.predef import GroupPredefsTable
 from db.material import GroupMaterialsTable
 from db.product import GroupProductsTable
 from db.part import GroupPartsTable
+from db.costs import CostRollups
+from db.counts import RowCounts
+from db.fts import FullTextIndex
+from db.groupcommit import GroupCommit
+from db.pool import ConnectionManager
 from db.vars import VarID
 
 
@@ -27,7 +32,8 @@ def connect(
     db_name: str,
     fk_on: bool=True,
     cb_trace: bool=False,
-    print_err: bool=False
+    print_err: bool=False,
+    persist_undo: bool=False
 ) -> sqlite3.Connection:
     """Create the connection to SQL database.
 
@@ -36,13 +42,17 @@ def connect(
         SELECT column_name AS 'column_name [pydecimal]' FROM table
 
     Do adapter/converter registering for custom types:
-        pydecimal
+        pydecimal, stored as an INTEGER scaled by dbtypes.FIXED_SCALE
     Create functions:
         dec_add, dec_sub, dec_mul, dec_div, material_cost, product_cost
     Create aggregates:
         dec_sum
-    Create tables for variables and columns if they do not exist.
-    Delete and create a new undolog table.
+    The functions are kept for custom queries, the table classes use
+    native SQL arithmetic on the scaled integers.
+    Create tables for variables, columns, undolog and undostep if the
+    schema version in PRAGMA user_version is not current, see db.migrations.
+    The undo history of the last session is deleted unless 'persist_undo'
+    is set.
 
     Parameters
     ----------
@@ -55,6 +65,8 @@ def connect(
         Use for debugging custom SQLite functions and types. Default False.
     print_err : bool, optional
         Set True to print error messages to console.
+    persist_undo : bool, optional
+        Set True to keep the undo history between sessions. Default False.
 
     Returns
     -------
@@ -62,8 +74,8 @@ def connect(
         The connection object needed to init the table classes.
     """
     # Converter and adapter for Decimal type.
-    sqlite3.register_adapter(Decimal, dbt.adapter_decimal)
-    sqlite3.register_converter("pydecimal", dbt.converter_decimal)
+    sqlite3.register_adapter(Decimal, dbt.adapter_fixed)
+    sqlite3.register_converter("pydecimal", dbt.converter_fixed)
 
     # Custom type is parsed from table declaration.
     con = sqlite3.connect(db_name, detect_types=sqlite3.PARSE_COLNAMES)
@@ -78,27 +90,62 @@ def connect(
     SQLTableBase.print_errors = print_err
 
     # Create functions to handle math in queries for custom types.
-    con.create_function("dec_add", -1, dbt.decimal_add, deterministic=True)
-    con.create_function("dec_sub", 2, dbt.decimal_sub, deterministic=True)
-    con.create_function("dec_mul", 2, dbt.decimal_mul, deterministic=True)
-    con.create_function("dec_div", 2, dbt.decimal_div, deterministic=True)
-    con.create_function("material_cost", 5, dbt.material_cost, deterministic=True)
-    con.create_function("product_cost", 3, dbt.product_cost, deterministic=True)
-    con.create_aggregate("dec_sum", 1, dbt.DecimalSum)
+    dbt.register_functions(con)
 
-    try:
-        con.execute("DROP TABLE undolog")
-    except sqlite3.Error:
-        pass
+    if migrations.get_version(con) < migrations.SCHEMA_VERSION:
+        create_base_tables(con, persist_undo)
+    elif not persist_undo:
+        clear_undo(con)
+    return con
+
+
+def create_base_tables(con: sqlite3.Connection, persist_undo: bool=False):
+    """Create the undolog, undostep, columns and variables tables.
+
+    Run by connect for databases older than the current schema version.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the database.
+    persist_undo : bool, optional
+        Set True to keep the undo history of the last session. Default False.
+    """
+    # Entries with SQL text from older versions can not be replayed.
+    log_keys = [row[1] for row in con.execute("PRAGMA table_info(undolog)")]
+    if not persist_undo or "sql" in log_keys:
+        con.execute("DROP TABLE IF EXISTS undolog")
+        con.execute("DROP TABLE IF EXISTS undostep")
 
     con.execute("""
-        CREATE TABLE undolog (
+        CREATE TABLE IF NOT EXISTS undolog (
             seq INTEGER PRIMARY KEY AUTOINCREMENT,
             fk INTEGER,
             tablename TEXT,
-            sql TEXT
+            op TEXT,
+            pk INTEGER,
+            data TEXT
         )
     """)
+    con.execute("""
+        CREATE INDEX IF NOT EXISTS idx_undolog
+        ON undolog(tablename, fk, seq)"""
+    )
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS undostep (
+            step_id     INTEGER PRIMARY KEY,
+            tablename   TEXT,
+            fk          INTEGER,
+            redo        INTEGER,
+            begin       INTEGER,
+            end         INTEGER,
+            all_tables  INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    con.execute("""
+        CREATE INDEX IF NOT EXISTS idx_undostep
+        ON undostep(tablename, fk, redo, step_id)"""
+    )
     con.execute("""
         CREATE TABLE IF NOT EXISTS columns (
             columns_id  INTEGER PRIMARY KEY,
@@ -155,15 +202,30 @@ def connect(
         pass
 
     con.commit()
-    return con
+
+
+def clear_undo(con: sqlite3.Connection):
+    """Delete the undo history of the last session."""
+    with con:
+        con.execute("DELETE FROM undolog")
+        con.execute("DELETE FROM undostep")
 
 
 class Database:
     """Handler for database table classes."""
-    def __init__(self, name=":memory:", fk_on=True, cb_trace=False, print_err=False):
+    def __init__(self, name=":memory:", fk_on=True, cb_trace=False, print_err=False,
+                 persist_undo=False, profile=None, readers=2):
         self.open_offers = []
 
-        self.con = connect(name, fk_on, cb_trace, print_err)
+        self.con = connect(name, fk_on, cb_trace, print_err, persist_undo)
+        # WAL mode and read-only connections if a profile from db.pool is given.
+        self.pool = None
+        if profile is not None:
+            self.pool = ConnectionManager(name, self.con, profile, readers)
+        # Cell edits are committed in timed transactions the readers do not
+        # see until committed, see reader.
+        self.commits = GroupCommit(self.con)
+        self.writer_thread = threading.get_ident()
         self.offers = OffersTable(self.con)
         self.groups = GroupsTable(self.con)
         self.group_predefs = GroupPredefsTable(self.con)
@@ -171,30 +233,146 @@ class Database:
         self.group_products = GroupProductsTable(self.con)
         self.group_parts = GroupPartsTable(self.con)
 
-        self.materials = self.group_materials.get_catalogue_table()
-        self.products = self.group_products.get_catalogue_table()
-        self.parts = self.group_parts.get_catalogue_table()
-
-        self.offers.create()
-        self.groups.create()
-        self.group_predefs.create()
-        self.group_materials.create()
-        self.group_products.create()
-        self.group_parts.create()
-
-        self.search_tables = {
-            "offers": self.offers,
-            "groups": self.groups,
-            "materials": self.materials,
-            "products": self.products,
-            "parts": self.parts
-        }
+        self.costs = CostRollups(self.con)
+        self.fts = FullTextIndex(self.con)
+        self.counts = RowCounts(self.con)
+
+        # Tables, triggers and columns are created by the migrations when
+        # the schema version of the file is not current.
+        migrations.migrate(self)
+        self.group_parts.create_queue()
+
         self.catalogue_tables = {
             "materials": self.group_materials,
             "products": self.group_products,
             "parts": self.group_parts,
         }
 
+    @property
+    def materials(self):
+        """The materials catalogue table, created on first use."""
+        return self.group_materials.get_catalogue_table()
+
+    @property
+    def products(self):
+        """The products catalogue table, created on first use."""
+        return self.group_products.get_catalogue_table()
+
+    @property
+    def parts(self):
+        """The parts catalogue table, created on first use."""
+        return self.group_parts.get_catalogue_table()
+
+    def transaction(self):
+        """Return a context manager running the block in a single transaction.
+
+        Use for bulk operations on many tables, see db.super.transaction.
+        Use SQLTableBase.batch to also group the changes into one undo step.
+        """
+        return transaction(self.con)
+
+    @contextmanager
+    def reader(self, latest: bool=False):
+        """Lend a connection for read-only queries.
+
+        With a pool the connection reads the last committed state without
+        waiting for writes. Without a pool the writer connection is used.
+
+        Parameters
+        ----------
+        latest : bool, optional
+            Set True to commit the pending edits of 'commits' first, for
+            reads that must see the latest edits. Only the thread of the
+            writer connection can commit them. Default False.
+        """
+        if latest and threading.get_ident() == self.writer_thread:
+            self.commits.flush()
+        if self.pool is None:
+            yield self.con
+        else:
+            with self.pool.reader() as con:
+                yield con
+
+    def close(self):
+        """Commit the pending edits, close the reader pool and the connection."""
+        self.commits.close()
+        if self.pool is not None:
+            self.pool.close()
+        self.con.close()
+
+    def search(self, key: str, text: str, limit: int=50) -> list:
+        """Return the rows of a search table best matching the text.
+
+        Each word of text is matched as a prefix of words in the indexed
+        columns, see db.fts. Runs on a reader connection.
+
+        Parameters
+        ----------
+        key : str
+            Key to the table, one of get_table_keys.
+        text : str
+            Words to search. Without words the first rows are returned.
+        limit : int, optional
+            Max number of rows, by default 50.
+
+        Returns
+        -------
+        list
+            Rows as in SQLTableBase.select, best match first.
+        """
+        table = self.get_table(key)
+        with self.reader() as con:
+            rows = self.fts.search(con, table, text, limit)
+        if rows is None:
+            return self.search_filter(key, None, (limit, 0))
+        return rows
+
+    def search_filter(self, key: str, filt: dict=None, pagination: list=None) -> list:
+        """Return the rows of a search table matching the filter.
+
+        Runs on a reader connection, see SQLTableBase.select for the arguments.
+
+        Parameters
+        ----------
+        key : str
+            Key to the table, one of get_table_keys.
+        """
+        (sql, values) = self.get_table(key).get_select_sql(None, filt, False, pagination)
+        with self.reader() as con:
+            return con.execute(sql, values or ()).fetchall()
+
+    def iter_search(self, key: str, filt: dict=None, chunk_size: int=500, row_factory=None):
+        """Yield the rows of a search table fetching them in chunks.
+
+        Runs on a reader connection that is kept until the iteration ends,
+        see SQLTableBase.iter_select for the arguments.
+
+        Parameters
+        ----------
+        key : str
+            Key to the table, one of get_table_keys.
+        """
+        (sql, values) = self.get_table(key).get_select_sql(None, filt)
+        with self.reader() as con:
+            yield from iter_rows(con.execute(sql, values or ()), chunk_size, row_factory)
+
+    def search_page(self, key: str, filt: dict=None, order: str=None,
+                    limit: int=50, token: str=None) -> tuple:
+        """Return a page of a search table and the token of the next page.
+
+        Runs on a reader connection, see SQLTableBase.select_page for the arguments.
+
+        Parameters
+        ----------
+        key : str
+            Key to the table, one of get_table_keys.
+        """
+        table = self.get_table(key)
+        (sql, values, keys) = table.get_page_sql(None, filt, order, limit, token)
+        with self.reader() as con:
+            rows = con.execute(sql, values).fetchall()
+        return table.split_page(rows, order, limit, keys)
+
     def open_offer(self, offer_id):
         """Open the given offer."""
         self.open_offers.append(offer_id)
@@ -211,7 +389,9 @@ class Database:
         key (str): String key for the table, one of:
             offers, groups, materials, products, parts
         """
-        return self.search_tables[key]
+        if key not in self.get_table_keys():
+            raise KeyError(key)
+        return getattr(self, key)
 
     def get_table_labels(self):
         """Return the table labels"""
@@ -236,7 +416,7 @@ class Database:
     def get_columns_search(self, name):
         """."""
         try:
-            table = self.search_tables[name]
+            table = self.get_table(name)
         except KeyError as err:
             print(f"No such table is defined for search: {err}")
             raise err
@@ -244,42 +424,228 @@ class Database:
 
     def get_group_costs(self, offer_id: int) -> list:
         """Return the group ids, names and costs."""
-        # groups = self.groups.select(offer_id)   # [(group_id, offer_id, name), ...]
-        costs = self.group_products.execute_dql(
-            """
-            SELECT
-                group_id,
-                name,
-                dec_sum(
-                    product_cost(
-                        a.part_cost,
-                        p.work_time,
-                        (
-                            SELECT value_decimal
-                            FROM variables
-                            WHERE variable_id=0
-                        )
-                    )
-                ) AS 'tot_cost [PYDECIMAL]'
-            FROM
-                groups AS g
-                LEFT JOIN group_products as p USING(group_id)
-                LEFT JOIN (
-                    SELECT a.group_product_id, dec_sum(a.cost) AS part_cost
-                    FROM group_parts AS a
-                    GROUP BY a.group_product_id
-                ) a USING(group_product_id)
-            WHERE offer_id = (?)
-            GROUP BY group_id
+        with self.reader(True) as con:
+            return con.execute(
+                """
+                SELECT
+                    g.group_id,
+                    g.name,
+                    c.tot_cost AS 'tot_cost [pydecimal]'
+                FROM
+                    groups AS g
+                    LEFT JOIN group_costs AS c USING(group_id)
+                WHERE g.offer_id = (?)
+                ORDER BY g.group_id ASC
+                """,
+                (offer_id,)
+            ).fetchall()
+
+    def get_offer_cost(self, offer_id: int) -> Decimal:
+        """Return the total cost of the offer."""
+        return self.costs.get_offer_cost(offer_id)
+
+    def price_offer(self, offer_id: int):
+        """Return the prices of all parts, products and groups of the offer.
+
+        Uses the numpy pricing engine in db.pricing, see OfferPrices
+        for the returned object.
+        """
+        from db.pricing import price_offer
+        with self.reader(True) as con:
+            return price_offer(con, offer_id)
+
+    def price_scenarios(self, offer_id: int, scenarios: list):
+        """Return the prices of the products and groups under each scenario.
+
+        See db.pricing.Scenario for the parameters of a scenario.
+        """
+        from db.pricing import price_scenarios
+        with self.reader(True) as con:
+            return price_scenarios(con, offer_id, scenarios)
+
+    def copy_group(self, group_id: int, offer_id: int) -> int:
+        """Copy given group and it's content to an offer.
+
+        The copy is named as the group, with a number added if the offer
+        has a group with the name. Copying is one undo step of the offer's
+        groups, the rows copied to the group are not in the undo history.
+
+        Returns
+        -------
+        int
+            ID of the new group, None on Error.
+        """
+        name = self.con.execute(
+            "SELECT name FROM groups WHERE group_id=(?)", (group_id,)).fetchone()
+        if name is None:
+            print(f"No group with id '{group_id}' to copy.")
+            return None
+        name = self.get_copy_name("groups", name[0], "offer_id=(?)", [offer_id])
+        return self.copy_rows(
+            self.groups, "group_id=(?)", [group_id], {"offer_id": offer_id, "name": name})
+
+    def copy_offer(self, offer_id: int, name: str=None) -> int:
+        """Copy the offer with it's groups and their content, like a template.
+
+        Parameters
+        ----------
+        offer_id : int
+            ID of the offer to copy.
+        name : str, optional
+            Name of the copy, by default the name of the offer with a number.
+
+        Returns
+        -------
+        int
+            ID of the new offer, None on Error.
+        """
+        if name is None:
+            old_name = self.con.execute(
+                "SELECT name FROM offers WHERE offer_id=(?)", (offer_id,)).fetchone()
+            if old_name is None:
+                print(f"No offer with id '{offer_id}' to copy.")
+                return None
+            name = self.get_copy_name("offers", old_name[0])
+        return self.copy_rows(self.offers, "offer_id=(?)", [offer_id], {"name": name})
+
+    def get_copy_name(self, table: str, name: str, where: str="1", values: list=()) -> str:
+        """Return name, or name with a number if it's used in the rows of 'where'."""
+        if name is None:
+            return None
+        names = {
+            row[0] for row in self.con.execute(
+                f"SELECT name FROM {table} WHERE {where} AND substr(name, 1, (?))=(?)",
+                list(values) + [len(name), name]
+            )
+        }
+        copy_name = name
+        n = 1
+        while copy_name in names:
+            n += 1
+            copy_name = f"{name} ({n})"
+        return copy_name
+
+    def copy_rows(self, table, where: str, values: list, replace: dict) -> int:
+        """Copy rows of offers or groups and their children.
+
+        Each table from 'table' down the hierarchy is copied with one
+        INSERT ... SELECT. The new primary keys of copied parents are
+        allocated in temp.copy_map, which maps the old keys to them.
+
+        Parameters
+        ----------
+        table : SQLTableBase
+            The offers or groups table.
+        where : str
+            Condition selecting the rows to copy.
+        values : list
+            Bound values of the condition.
+        replace : dict
+            {key: value} set to the copied rows.
+
+        Returns
+        -------
+        int
+            New primary key of the first copied row, None on Error.
+        """
+        # (table, parent table, it's rows are parents of other rows)
+        chain = [
+            (self.groups, "offers", True),
+            (self.group_predefs, "groups", False),
+            (self.group_materials, "groups", False),
+            (self.group_products, "groups", True),
+            (self.group_parts, "group_products", False),
+        ]
+        level = table.name
+        if level == "groups":
+            chain = chain[1:]
+
+        foreign_key = replace.get(table.foreign_key)
+        try:
+            with table.batch(foreign_key):
+                seq = table.get_undo_maxseq()
+                self.con.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS copy_map (
+                        tablename   TEXT,
+                        old         INTEGER,
+                        new         INTEGER,
+                        PRIMARY KEY (tablename, old)
+                    )"""
+                )
+                self.con.execute("DELETE FROM temp.copy_map")
+
+                pk = table.primary_key
+                self.map_keys(table, f"SELECT {pk} AS k FROM {table.name} WHERE {where}", values)
+                keys = table.get_insert_keys()
+                cols = ["(?)" if k in replace else f"t.{k}" for k in keys]
+                self.con.execute(
+                    f"""
+                    INSERT INTO {table.name}({pk},{','.join(keys)})
+                    SELECT m.new,{','.join(cols)} FROM {table.name} AS t
+                    JOIN temp.copy_map AS m ON m.tablename='{table.name}' AND m.old=t.{pk}
+                    ORDER BY t.{pk}
+                    """,
+                    [replace[k] for k in keys if k in replace]
+                )
+
+                for (child, parent, is_parent) in chain:
+                    parents = (f"SELECT c.{child.primary_key} AS k FROM {child.name} AS c "
+                               f"JOIN temp.copy_map AS p ON p.tablename='{parent}' "
+                               f"AND p.old=c.{child.foreign_key}")
+                    if is_parent:
+                        self.map_keys(child, parents)
+                    self.copy_children(child, parent, is_parent)
+
+                # The copy is undone by deleting the copied rows of 'level'.
+                self.con.execute(
+                    "DELETE FROM undolog WHERE seq>(?) AND tablename<>(?)", (seq, level))
+                result = self.con.execute(
+                    "SELECT MIN(new) FROM temp.copy_map WHERE tablename=(?)", (level,)
+                ).fetchone()[0]
+        except sqlite3.Error as err:
+            print(f"Could not copy {level}: {err}")
+            return None
+        return result
+
+    def map_keys(self, table, select: str, values: list=()):
+        """Allocate new primary keys in copy_map for the keys 'k' of 'select'."""
+        pk = table.primary_key
+        self.con.execute(
+            f"""
+            INSERT INTO temp.copy_map(tablename, old, new)
+            SELECT '{table.name}', k,
+                (SELECT coalesce(MAX({pk}),0) FROM {table.name}) + row_number() OVER (ORDER BY k)
+            FROM ({select})
             """,
-            (offer_id,)
+            values
         )
-        # print(costs)
-        return costs
 
-    def copy_group(self, _group_id: int, _offer_id: int):
-        """Copy given group and it's content to an offer."""
-        print("UNIMPLEMENTED")
+    def copy_children(self, child, parent: str, keep_keys: bool):
+        """Copy the rows of 'child' whose parents are in copy_map.
+
+        The foreign keys are replaced with the new keys of the parents.
+        With 'keep_keys' the new primary keys are taken from copy_map.
+        """
+        pk = child.primary_key
+        fk = child.foreign_key
+        keys = [k for k in child.get_insert_keys() if k != fk]
+        cols = ",".join(f"c.{k}" for k in keys)
+        if keep_keys:
+            sql = f"""
+                INSERT INTO {child.name}({pk},{fk},{','.join(keys)})
+                SELECT m.new,p.new,{cols} FROM {child.name} AS c
+                JOIN temp.copy_map AS p ON p.tablename='{parent}' AND p.old=c.{fk}
+                JOIN temp.copy_map AS m ON m.tablename='{child.name}' AND m.old=c.{pk}
+                ORDER BY c.{pk}
+            """
+        else:
+            sql = f"""
+                INSERT INTO {child.name}({fk},{','.join(keys)})
+                SELECT p.new,{cols} FROM {child.name} AS c
+                JOIN temp.copy_map AS p ON p.tablename='{parent}' AND p.old=c.{fk}
+                ORDER BY c.{pk}
+            """
+        self.con.execute(sql)
 
     def get_group_labels(self, offer_id: int):
         """Return a list of (group_id, name) of the given offer."""
@@ -1,16 +1,28 @@
-""" Functions for custom sqlite types. """
+""" Functions for custom sqlite types.
 
-from decimal import Decimal
+PYDECIMAL columns are stored as INTEGERs scaled by FIXED_SCALE (hundredths).
+SQL using them can do sums and arithmetic natively, see sql_material_cost and
+sql_product_cost. The functions working with ASCII bytes are kept for reading
+databases written before the fixed-point storage, see migrate_fixed_point in
+db.migrations.
+"""
+
+import sqlite3
+from decimal import Decimal, ROUND_HALF_EVEN
+
+
+FIXED_SCALE = 100
+FIXED_PLACES = 2
 
 
 class DecimalSum:
     """Custom AggregateClass for sqlite3 to sum pydecimal columns."""
     def __init__(self):
         self.sum = Decimal('0.00')
-    
+
     def step(self, value):
         self.sum += converter_decimal(value)
-    
+
     def finalize(self):
         return adapter_decimal(self.sum)
 
@@ -60,3 +72,124 @@ def product_cost(part_cost, work_time, work_cost):
     b = converter_decimal(work_time)
     c = converter_decimal(work_cost)
     return adapter_decimal(a + (b * c))
+
+
+class FixedSum:
+    """Custom AggregateClass for sqlite3 to sum fixed-point pydecimal columns."""
+    def __init__(self):
+        self.sum = 0
+
+    def step(self, value):
+        self.sum += to_fixed(value)
+
+    def finalize(self):
+        return self.sum
+
+def adapter_fixed(decimal: Decimal) -> int:
+    """Adapt a decimal to a scaled integer for insert into sqlite table."""
+    return int((decimal * FIXED_SCALE).to_integral_value(ROUND_HALF_EVEN))
+
+def converter_fixed(value: bytes) -> Decimal:
+    """Convert a scaled integer from sqlite to Decimal.
+
+    Values still stored as ASCII decimals are converted with converter_decimal.
+    """
+    try:
+        return Decimal(int(value)).scaleb(-FIXED_PLACES)
+    except ValueError:
+        return converter_decimal(value)
+
+def to_fixed(value) -> int:
+    """Return a value received in a sqlite function as a scaled integer."""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, bytes):
+        return adapter_fixed(converter_decimal(value))
+    return adapter_fixed(Decimal(str(value)))
+
+def round_div(a: int, b: int) -> int:
+    """Divide integers rounding half away from zero like sql_round_div."""
+    if a >= 0:
+        return (a + b // 2) // b
+    return -((-a + b // 2) // b)
+
+def fixed_add(*args):
+    """Define custom function for adding fixed-point arguments in sqlite queries."""
+    return sum(to_fixed(value) for value in args)
+
+def fixed_sub(a, b):
+    """Define custom function for substracting fixed-point arguments in sqlite queries."""
+    return to_fixed(a) - to_fixed(b)
+
+def fixed_mul(a, b):
+    """Define custom function for multiplying fixed-point arguments in sqlite queries."""
+    return round_div(to_fixed(a) * to_fixed(b), FIXED_SCALE)
+
+def fixed_div(a, b):
+    """Define custom function for dividing fixed-point arguments in sqlite queries."""
+    divisor = to_fixed(b)
+    if divisor == 0:
+        return None
+    numerator = to_fixed(a) * FIXED_SCALE
+    # Round half away from zero with the sign of the result.
+    quotient = round_div(abs(numerator), abs(divisor))
+    return quotient if (numerator >= 0) == (divisor > 0) else -quotient
+
+def fixed_material_cost(cost, add, edg, loss, discount):
+    """Return the total cost per unit for the material row.
+
+    Python reference for sql_material_cost.
+    """
+    scale = FIXED_SCALE
+    a = to_fixed(cost) * (scale + to_fixed(loss))
+    b = (to_fixed(add) + to_fixed(edg)) * scale
+    return round_div((a + b) * (scale - to_fixed(discount)), scale * scale)
+
+def fixed_product_cost(part_cost, work_time, work_cost):
+    """Return the products cost.
+
+    Python reference for sql_product_cost.
+    """
+    work = round_div(to_fixed(work_time) * to_fixed(work_cost), FIXED_SCALE)
+    return to_fixed(part_cost) + work
+
+def sql_round_div(expr: str, divisor: int) -> str:
+    """Return SQL dividing integer 'expr' by 'divisor' rounding half away from zero."""
+    half = divisor // 2
+    return (
+        f"(CASE WHEN ({expr})>=0 THEN (({expr})+{half})/{divisor} "
+        f"ELSE (({expr})-{half})/{divisor} END)"
+    )
+
+def sql_material_cost(cost: str, add: str, edg: str, loss: str, discount: str) -> str:
+    """Return SQL expression for the material cost of fixed-point columns."""
+    scale = FIXED_SCALE
+    expr = (
+        f"(coalesce({cost},0)*({scale}+coalesce({loss},0))"
+        f"+(coalesce({add},0)+coalesce({edg},0))*{scale})"
+        f"*({scale}-coalesce({discount},0))"
+    )
+    return sql_round_div(expr, scale * scale)
+
+def sql_product_cost(part_cost: str, work_time: str, work_cost: str) -> str:
+    """Return SQL expression for the product cost of fixed-point columns."""
+    work = sql_round_div(f"coalesce({work_time},0)*coalesce({work_cost},0)", FIXED_SCALE)
+    return f"(coalesce({part_cost},0)+{work})"
+
+def register_functions(con: sqlite3.Connection):
+    """Create the functions for fixed-point pydecimals on the connection.
+
+    Functions:
+        dec_add, dec_sub, dec_mul, dec_div, material_cost, product_cost
+    Aggregates:
+        dec_sum
+    """
+    con.create_function("dec_add", -1, fixed_add, deterministic=True)
+    con.create_function("dec_sub", 2, fixed_sub, deterministic=True)
+    con.create_function("dec_mul", 2, fixed_mul, deterministic=True)
+    con.create_function("dec_div", 2, fixed_div, deterministic=True)
+    con.create_function("material_cost", 5, fixed_material_cost, deterministic=True)
+    con.create_function("product_cost", 3, fixed_product_cost, deterministic=True)
+    con.create_aggregate("dec_sum", 1, FixedSum)
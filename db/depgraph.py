@@ -0,0 +1,111 @@
+"""Dependency graph for incremental recalculation of computed values.
+
+Nodes are computed values that depend on other nodes and on inputs.
+Inputs are values that are not computed by the graph, like a column
+in another table. After a change only the nodes reading the changed inputs
+and the nodes depending on them are recalculated, in topological order.
+"""
+
+
+class DependencyGraph:
+    """Directed graph of computed values and the inputs they read."""
+    def __init__(self):
+        self.depends = {}       # {node: set(nodes it reads)}
+        self.dependents = {}    # {node: set(nodes reading it)}
+        self.readers = {}       # {input: set(nodes reading it)}
+        self.position = None    # {node: position in topological order}
+        self.cyclic = set()
+
+    def add_node(self, node, depends: list=None, inputs: list=None):
+        """Add a node with the nodes and inputs it reads.
+
+        Parameters
+        ----------
+        node : hashable
+            Key for the computed value.
+        depends : list, optional
+            Nodes used to compute the value of this node.
+        inputs : list, optional
+            Inputs used to compute the value of this node.
+        """
+        self.position = None
+        self.depends.setdefault(node, set())
+        self.dependents.setdefault(node, set())
+        for dep in depends or []:
+            self.depends[node].add(dep)
+            self.dependents.setdefault(dep, set()).add(node)
+            self.depends.setdefault(dep, set())
+        for key in inputs or []:
+            self.readers.setdefault(key, set()).add(node)
+
+    def sort(self):
+        """Compute the topological order and the nodes in or after cycles.
+
+        Uses Kahn's algorithm. Nodes that can not be ordered depend on
+        a cycle and are saved in 'cyclic'.
+        """
+        remaining = {node: len(deps) for node, deps in self.depends.items()}
+        ready = [node for node, count in remaining.items() if count == 0]
+        position = {}
+        while ready:
+            node = ready.pop()
+            position[node] = len(position)
+            for dependent in self.dependents[node]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        self.position = position
+        self.cyclic = {node for node in self.depends if node not in position}
+
+    def affected(self, inputs=None, nodes=None) -> set:
+        """Return the nodes that need recalculation after a change.
+
+        Parameters
+        ----------
+        inputs : iterable, optional
+            Changed inputs.
+        nodes : iterable, optional
+            Nodes that are changed directly.
+
+        Returns
+        -------
+        set
+            The nodes reading the inputs, given nodes and all their dependents.
+        """
+        stack = list(nodes or [])
+        for key in inputs or []:
+            stack.extend(self.readers.get(key, ()))
+
+        found = set()
+        while stack:
+            node = stack.pop()
+            if node in found or node not in self.depends:
+                continue
+            found.add(node)
+            stack.extend(self.dependents[node])
+        return found
+
+    def order(self, nodes) -> tuple:
+        """Return the nodes in order of calculation and the nodes in cycles.
+
+        Parameters
+        ----------
+        nodes : iterable
+            Nodes to calculate, usually from 'affected'.
+
+        Returns
+        -------
+        tuple
+            (ordered, cyclic) where ordered is a list of the nodes that can be
+            calculated in that order and cyclic a list of nodes that depend
+            on a cycle and have no value.
+        """
+        if self.position is None:
+            self.sort()
+        ordered = sorted(
+            (node for node in nodes if node in self.position),
+            key=self.position.__getitem__
+        )
+        cyclic = [node for node in nodes if node in self.cyclic]
+        return ordered, cyclic
@@ -0,0 +1,154 @@
+"""Compiler and cache for the codes of group parts.
+
+A code is a string starting with '=' followed by an expression like:
+    =tleveys - 2 * mpaksuus
+    ="sivu".pituus * määrä
+
+Names in the expression are keys to values of the same part row and
+"part".key refers to the value in another part of the same product.
+Each code is parsed once and the parsed form is cached by the code string.
+The asteval interpreter is slow to import and is created on first evaluation.
+"""
+
+import ast
+from decimal import Decimal
+from functools import lru_cache
+
+
+CACHE_SIZE = 2048
+
+
+class Formula:
+    """A compiled code.
+
+    Parameters
+    ----------
+    text : str
+        The expression without the leading '='.
+    node : ast.Module
+        Parsed expression with references replaced by names of arguments.
+    refs : list
+        List of (part, key) tuples for each argument in order.
+        The part is None if the key refers to the part row itself.
+    """
+    def __init__(self, text: str, node: ast.Module, refs: list):
+        self.text = text
+        self.node = node
+        self.refs = refs
+
+
+class ReferenceTransformer(ast.NodeTransformer):
+    """Replace the references to part values with argument names."""
+    def __init__(self, keys):
+        super().__init__()
+        self.keys = keys
+        self.refs = []
+
+    def argument(self, part: str, key: str, node: ast.AST) -> ast.Name:
+        """Return a Name node for the argument of the reference."""
+        ref = (part, key)
+        try:
+            idx = self.refs.index(ref)
+        except ValueError:
+            idx = len(self.refs)
+            self.refs.append(ref)
+        return ast.copy_location(ast.Name(id=f"_arg{idx}", ctx=ast.Load()), node)
+
+    def visit_Name(self, node):
+        """Replace a key of this part."""
+        if node.id in self.keys:
+            return self.argument(None, node.id, node)
+        return node
+
+    def visit_Attribute(self, node):
+        """Replace a "part".key reference."""
+        is_part = isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        if is_part and node.attr in self.keys:
+            return self.argument(node.value.value, node.attr, node)
+        return self.generic_visit(node)
+
+
+class FormulaCompiler:
+    """Compile codes to Formula objects and evaluate them.
+
+    Parameters
+    ----------
+    keys : iterable
+        The keys that can be used in codes.
+    maxsize : int, optional
+        Number of compiled codes kept in the cache, by default CACHE_SIZE.
+    """
+    def __init__(self, keys, maxsize: int=CACHE_SIZE):
+        self.keys = frozenset(keys)
+        self._aeval = None
+        self.compile = lru_cache(maxsize=maxsize)(self.compile_code)
+
+    @property
+    def aeval(self):
+        """The asteval Interpreter, imported and created on first use."""
+        if self._aeval is None:
+            from asteval import Interpreter
+            self._aeval = Interpreter(minimal=True)
+        return self._aeval
+
+    def compile_code(self, code: str) -> Formula:
+        """Return the Formula for code or None if code is not a valid formula.
+
+        Use 'compile' instead to get the cached result.
+        """
+        try:
+            if code[0] != "=":
+                return None
+        except (TypeError, IndexError):
+            return None
+
+        text = code[1:]
+        try:
+            node = ast.parse(text)
+        except SyntaxError as err:
+            print(f'SyntaxError when parsing "{code}": {err.msg}\n' +
+                  'to refer to another part use: "part".key')
+            return None
+
+        transformer = ReferenceTransformer(self.keys)
+        node = ast.fix_missing_locations(transformer.visit(node))
+        return Formula(text, node, transformer.refs)
+
+    def evaluate(self, formula: Formula, args: list):
+        """Evaluate the formula using given values for it's references.
+
+        Parameters
+        ----------
+        formula : Formula
+            Compiled code.
+        args : list
+            Values for each of formula.refs.
+
+        Returns
+        -------
+        int | Decimal
+            Result of the formula or None on errors.
+        """
+        symtable = self.aeval.symtable
+        for idx, value in enumerate(args):
+            if value is None:
+                value = 0
+            elif isinstance(value, Decimal):
+                value = float(value)
+            symtable[f"_arg{idx}"] = value
+
+        self.aeval.error = []
+        result = self.aeval.run(formula.node, expr=formula.text, with_raise=False)
+        if self.aeval.error:
+            err = self.aeval.error[0]
+            print(f'{err.exc.__name__} when evaluating "={formula.text}": {err.msg}')
+            self.aeval.error = []
+            return None
+
+        if isinstance(result, float):
+            return Decimal(str(result))
+        return result
+
+    def cache_info(self):
+        """Return the statistics of the compiled code cache."""
+        return self.compile.cache_info()
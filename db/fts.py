@@ -0,0 +1,214 @@
+"""Full-text search indexes of the offers and catalogue tables.
+
+Each searchable table has an FTS5 table '{table}_fts' with external content,
+it indexes the text columns and reads the rows from the table itself.
+Triggers on the table keep the index in sync with the rows.
+
+Search text is split to words and each word is matched as a prefix, so
+"tammi 18" finds rows with words starting with "tammi" and "18" in any
+of the indexed columns. Results are ranked with bm25, matches in the
+earlier columns like code weigh more. Ranking computes bm25 for every
+match, so it's done only for up to RANK_LIMIT matches. With more matches
+only the matches in the first column are ranked, the rest of the rows
+are filled in primary key order. Text matching more rows than that in the
+first column too is not ranked at all.
+"""
+
+import re
+import sqlite3
+
+
+# {table: (primary key, [indexed columns], [bm25 weight of each column])}
+SEARCH_COLUMNS = {
+    "offers": ("offer_id", ["name", "firstname", "lastname", "company", "info"],
+               [10.0, 2.0, 2.0, 2.0, 1.0]),
+    "groups": ("group_id", ["name"], [1.0]),
+    "materials": ("material_id", ["code", "category", "desc", "prod"],
+                  [10.0, 3.0, 1.0, 2.0]),
+    "products": ("product_id", ["code", "category", "desc", "prod"],
+                 [10.0, 3.0, 1.0, 2.0]),
+    "parts": ("part_id", ["part", "code", "desc", "default_mat"],
+              [10.0, 2.0, 1.0, 2.0]),
+}
+WORD = re.compile(r"\w+")
+RANK_LIMIT = 2000
+
+
+def match_query(text: str) -> str:
+    """Return a FTS5 query matching all words of text as prefixes.
+
+    Returns None if the text has no words.
+    """
+    if not text:
+        return None
+    words = WORD.findall(text)
+    if len(words) == 0:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+class FullTextIndex:
+    """Create, rebuild and query the full-text indexes.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection created with db.database.connect.
+    """
+    def __init__(self, connection):
+        self.con: sqlite3.Connection = connection
+
+    @staticmethod
+    def get_name(table: str) -> str:
+        """Return the name of the FTS table of 'table'."""
+        return f"{table}_fts"
+
+    def get_script(self, table: str) -> str:
+        """Return the script creating the FTS table and triggers of 'table'."""
+        (pk, cols, _) = SEARCH_COLUMNS[table]
+        fts = self.get_name(table)
+        keys = ",".join(cols)
+        new = ",".join(f"new.{c}" for c in cols)
+        old = ",".join(f"old.{c}" for c in cols)
+        return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {keys},
+            content='{table}',
+            content_rowid='{pk}',
+            tokenize='unicode61 remove_diacritics 0',
+            prefix='1 2 3'
+        );
+        CREATE TRIGGER IF NOT EXISTS {fts}_it AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid,{keys}) VALUES (new.{pk},{new});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {fts}_dt AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts},rowid,{keys}) VALUES ('delete',old.{pk},{old});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {fts}_ut AFTER UPDATE OF {pk},{keys} ON {table} BEGIN
+            INSERT INTO {fts}({fts},rowid,{keys}) VALUES ('delete',old.{pk},{old});
+            INSERT INTO {fts}(rowid,{keys}) VALUES (new.{pk},{new});
+        END;
+        """
+
+    def exists(self, table: str) -> bool:
+        """Return True if the FTS table of 'table' exists."""
+        result = self.con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=(?)",
+            (self.get_name(table),)
+        ).fetchone()
+        return result is not None
+
+    def create(self, tables: list=None):
+        """Create the indexes and fill them from the tables.
+
+        Must be called after the tables are created.
+
+        Parameters
+        ----------
+        tables : list, optional
+            Names of the tables to index, by default all in SEARCH_COLUMNS.
+        """
+        for table in SEARCH_COLUMNS if tables is None else tables:
+            try:
+                self.con.executescript(self.get_script(table))
+                self.rebuild(table)
+            except sqlite3.OperationalError as err:
+                print(f"Could not create full-text index for {table}: {err}")
+
+    def rebuild(self, table: str):
+        """Rebuild the index of 'table' from it's rows."""
+        fts = self.get_name(table)
+        with self.con:
+            self.con.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def count_matches(self, con: sqlite3.Connection, table: str, query: str) -> int:
+        """Return the number of rows matching query, counting up to RANK_LIMIT + 1."""
+        fts = self.get_name(table)
+        return con.execute(
+            f"SELECT COUNT(*) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH (?) LIMIT (?))",
+            (query, RANK_LIMIT + 1)
+        ).fetchone()[0]
+
+    def search(self, con: sqlite3.Connection, table, text: str, limit: int=50) -> list:
+        """Return the rows best matching text.
+
+        The matches are ranked if there are at most RANK_LIMIT of them,
+        see the module docstring for more matches.
+
+        Parameters
+        ----------
+        con : sqlite3.Connection
+            Connection used for the queries.
+        table : SQLTableBase
+            Table object with the select query of the rows.
+        text : str
+            Words to search, see match_query.
+        limit : int, optional
+            Max number of rows, by default 50.
+
+        Returns
+        -------
+        list
+            Rows as in SQLTableBase.select, best match first. None if
+            text has no words.
+        """
+        query = match_query(text)
+        if query is None:
+            return None
+        if self.count_matches(con, table.name, query) <= RANK_LIMIT:
+            return con.execute(*self.get_search_sql(table, query, limit)).fetchall()
+
+        first_col = SEARCH_COLUMNS[table.name][1][0]
+        first_query = f"{{{first_col}}} : ({query})"
+        rows = []
+        if 0 < self.count_matches(con, table.name, first_query) <= RANK_LIMIT:
+            rows = con.execute(*self.get_search_sql(table, first_query, limit)).fetchall()
+        if len(rows) < limit:
+            found = {row[0] for row in rows}
+            rows += [
+                row for row in con.execute(
+                    *self.get_search_sql(table, query, limit + len(rows), False))
+                if row[0] not in found
+            ][:limit - len(rows)]
+        return rows
+
+    def get_search_sql(self, table, query: str, limit: int=50, rank: bool=True) -> tuple:
+        """Return the (sql, values) selecting the matches of a FTS5 query.
+
+        Parameters
+        ----------
+        table : SQLTableBase
+            Table object with the select query of the rows.
+        query : str
+            FTS5 query, see match_query.
+        limit : int, optional
+            Max number of rows, by default 50.
+        rank : bool, optional
+            Set False to select the first matches in primary key order
+            without computing bm25 for them. Default True.
+
+        Returns
+        -------
+        tuple
+            (sql, values)
+        """
+        (pk, _, weights) = SEARCH_COLUMNS[table.name]
+        fts = self.get_name(table.name)
+        if rank:
+            bm25 = ",".join(str(w) for w in weights)
+            matches = f"""
+                SELECT rowid AS fts_id, bm25({fts},{bm25}) AS fts_rank
+                FROM {fts} WHERE {fts} MATCH (?)
+                ORDER BY fts_rank LIMIT {int(limit)}"""
+        else:
+            matches = f"""
+                SELECT rowid AS fts_id, 0 AS fts_rank
+                FROM {fts} WHERE {fts} MATCH (?)
+                LIMIT {int(limit)}"""
+        sql = f"""
+            {table.get_select_query()}
+            INNER JOIN ({matches}
+            ) AS f ON f.fts_id={table.get_table_alias()}.{pk}
+            ORDER BY f.fts_rank, f.fts_id
+        """
+        return (sql, (query,))
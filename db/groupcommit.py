@@ -0,0 +1,107 @@
+"""Write-behind commits for interactive edits.
+
+Edits made within 'window' seconds of the first uncommitted edit share a
+single transaction, so rapid edits do not each wait for a sync to disk.
+The transaction is committed when the window ends, on flush and on close.
+"""
+
+import sqlite3
+import time
+from collections import deque
+
+from db.super import SQLTableBase
+
+
+class GroupCommit:
+    """Coalesce the writes to a connection into timed transactions.
+
+    Without 'schedule' an expired window is committed on the next write or
+    flush. With it the window is committed when it ends, which bounds the
+    edits lost in a crash to those made within one window.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection used by the tables.
+    window : float, optional
+        Seconds from the first edit of a transaction to it's commit,
+        by default 0.15
+    schedule : callable, optional
+        Function as schedule(milliseconds, function) that calls function
+        later in the thread of the connection, like wx.CallLater.
+    history : int, optional
+        Number of commits kept in 'absorbed', by default 100
+    """
+    def __init__(self, connection, window: float=0.15, schedule=None, history: int=100):
+        self.con: sqlite3.Connection = connection
+        self.window = window
+        self.schedule = schedule
+        self.clock = time.monotonic
+        self.enabled = True
+        self.pending = 0            # Edits in the open transaction.
+        self.opened = None          # Clock time of the first pending edit.
+        self.generation = 0         # Count of opened transactions.
+        self.absorbed = deque(maxlen=history)   # Edits in each commit.
+
+    def write(self, fn, *args, **kwargs):
+        """Call fn inside the open transaction and return it's result.
+
+        Parameters
+        ----------
+        fn : callable
+            Function writing to the database, like SQLTableBase.update.
+        args, kwargs
+            Arguments for fn.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        if self.pending > 0 and self.clock() - self.opened >= self.window:
+            self.flush()
+        if self.pending == 0:
+            self.begin()
+        self.pending += 1
+        return fn(*args, **kwargs)
+
+    def begin(self):
+        """Open a transaction the table methods do not commit."""
+        depth = SQLTableBase._batch.get(self.con, 0)
+        if depth == 0 and not self.con.in_transaction:
+            self.con.execute("BEGIN")
+        SQLTableBase._batch[self.con] = depth + 1
+        self.opened = self.clock()
+        self.generation += 1
+        if self.schedule is not None:
+            generation = self.generation
+            self.schedule(int(self.window * 1000), lambda: self.expire(generation))
+
+    def expire(self, generation: int):
+        """Commit the transaction opened as 'generation' if still open."""
+        if generation == self.generation:
+            self.flush()
+
+    def flush(self) -> int:
+        """Commit the pending edits and return their count."""
+        count = self.pending
+        if count == 0:
+            return 0
+
+        depth = SQLTableBase._batch.get(self.con, 1) - 1
+        SQLTableBase._batch[self.con] = depth
+        self.pending = 0
+        self.opened = None
+        if depth == 0:
+            self.con.commit()
+        self.absorbed.append(count)
+        return count
+
+    def close(self):
+        """Commit the pending edits and write through from now on."""
+        self.flush()
+        self.enabled = False
+
+    def get_stats(self) -> tuple:
+        """Return (commits, edits, max edits per commit) of the kept history."""
+        if len(self.absorbed) == 0:
+            return (0, 0, 0)
+        return (len(self.absorbed), sum(self.absorbed), max(self.absorbed))
@@ -1,14 +1,14 @@
 """The materials table class for database."""
 
 from db.super import SQLTableBase, CatalogueTable
+import db.dbtypes as dbt
 
 
 class GroupMaterialsTable(CatalogueTable):
     def __init__(self, connection):
-        cat_table = MaterialsTable(connection)
-        super().__init__(connection, cat_table)
+        super().__init__(connection, MaterialsTable)
         self.name = "group_materials"
-        self.sql_create_table = """
+        self.sql_create_table = f"""
             CREATE TABLE IF NOT EXISTS group_materials (
                 group_material_id INTEGER PRIMARY KEY,
                 group_id    INTEGER NOT NULL,
@@ -26,7 +26,7 @@ class GroupMaterialsTable(CatalogueTable):
                 discount    PYDECIMAL,
                 tot_cost    PYDECIMAL
                     GENERATED ALWAYS AS (
-                        material_cost(cost, add_cost, edg_cost, loss, discount)
+                        {dbt.sql_material_cost("cost", "add_cost", "edg_cost", "loss", "discount")}
                     ) STORED,
 
                 FOREIGN KEY (group_id) REFERENCES groups (group_id)
@@ -242,6 +242,7 @@ class MaterialsTable(SQLTableBase):
             """CREATE INDEX IF NOT EXISTS idx_materials_category ON materials(category, code)"""
         ]
         self.primary_key = "material_id"
+        self.sort_orders = {"code": ["code"], "category": ["category", "code"]}
         self.foreign_key = None
         self.read_only = ["material_id"]
         self.default_columns = [
@@ -0,0 +1,208 @@
+"""Schema versions and migrations of the database file.
+
+The version of the schema in a file is kept in PRAGMA user_version. Opening
+a file with the current version only reads the version, the tables, indexes,
+persistent triggers and column setups are created by the migrations.
+
+Register a migration for each change to the schema with a new version:
+
+    @migration(2)
+    def add_column(database):
+        database.con.execute("ALTER TABLE ...")
+
+The migrations newer than the version of the file are run in order by
+migrate when a Database is opened.
+"""
+
+import sqlite3
+from decimal import Decimal, InvalidOperation
+
+import db.dbtypes as dbt
+
+
+MIGRATIONS = {}     # {version: function(database)}
+
+
+def migration(version: int):
+    """Register the decorated function as the migration to 'version'."""
+    def register(fn):
+        if version in MIGRATIONS:
+            raise ValueError(f"Migration to version {version} is already registered.")
+        MIGRATIONS[version] = fn
+        return fn
+    return register
+
+
+def get_version(con: sqlite3.Connection) -> int:
+    """Return the schema version of the database."""
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def set_version(con: sqlite3.Connection, version: int):
+    """Set the schema version of the database."""
+    con.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def migrate(database) -> list:
+    """Run the migrations newer than the schema version of the database.
+
+    The version is saved after each migration, so a failed migration is
+    tried again on next open and the earlier ones are not.
+
+    Parameters
+    ----------
+    database : db.database.Database
+        Database with the table objects.
+
+    Returns
+    -------
+    list
+        Versions of the migrations that were run.
+    """
+    con = database.con
+    version = get_version(con)
+    done = []
+    for target in sorted(v for v in MIGRATIONS if v > version):
+        try:
+            MIGRATIONS[target](database)
+        except sqlite3.Error as err:
+            if con.in_transaction:
+                con.rollback()
+            print(f"Migration to schema version {target} failed: {err}")
+            break
+        set_version(con, target)
+        con.commit()
+        done.append(target)
+    return done
+
+
+def migrate_fixed_point(con: sqlite3.Connection, tables: list, batch_size: int=500) -> int:
+    """Convert PYDECIMAL values stored as ASCII bytes to scaled integers.
+
+    Converts the rows in batches, each committed on it's own, so the migration
+    can be interrupted and is continued from the remaining rows on next call.
+    Tables in 'tables' whose stored CREATE statement uses the sqlite functions
+    on pydecimal columns are rebuilt to use native arithmetic.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the database to migrate.
+    tables : list
+        SQLTableBase objects to rebuild if their definition is outdated.
+    batch_size : int, optional
+        Number of rows converted per transaction, by default 500
+
+    Returns
+    -------
+    int
+        Number of converted rows.
+    """
+    converted = 0
+    names = con.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (name,) in names:
+        keys = [
+            row[1] for row in con.execute(f"PRAGMA table_info({name})")
+            if row[2].upper() == "PYDECIMAL"
+        ]
+        if len(keys) == 0:
+            continue
+
+        legacy = " OR ".join(f"typeof({k}) IN ('blob','text','real')" for k in keys)
+        cols = ",".join(f"CAST({k} AS TEXT)" for k in keys)
+        sets = ",".join(f"{k}=(?)" for k in keys)
+        while True:
+            rows = con.execute(
+                f"SELECT rowid,{cols} FROM {name} WHERE {legacy} LIMIT {batch_size}"
+            ).fetchall()
+            if len(rows) == 0:
+                break
+
+            values = []
+            for row in rows:
+                fixed = []
+                for value in row[1:]:
+                    try:
+                        fixed.append(dbt.adapter_fixed(Decimal(value)))
+                    except (TypeError, InvalidOperation):
+                        fixed.append(None)
+                values.append(fixed + [row[0]])
+            with con:
+                con.executemany(f"UPDATE {name} SET {sets} WHERE rowid=(?)", values)
+            converted += len(rows)
+
+    for table in tables:
+        result = con.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name=(?)",
+            (table.name,)
+        ).fetchone()
+        if result is not None and "material_cost(" in result[0]:
+            table.rebuild()
+
+    return converted
+
+
+@migration(1)
+def create_schema(database):
+    """Create the tables, triggers and column setups.
+
+    Databases without a version may have been written before the
+    fixed-point storage and without the persistent triggers.
+    """
+    migrate_fixed_point(database.con, [database.group_materials])
+    for table in (
+        database.offers,
+        database.groups,
+        database.group_predefs,
+        database.group_materials,
+        database.group_products,
+        database.group_parts
+    ):
+        table.create()
+    database.costs.create()
+
+
+@migration(2)
+def create_full_text_search(database):
+    """Create the full-text indexes of offers and catalogues, see db.fts."""
+    database.fts.create()
+
+
+@migration(3)
+def create_row_counts(database):
+    """Create the row counts kept by triggers, see db.counts."""
+    database.counts.create([
+        database.offers,
+        database.groups,
+        database.group_predefs,
+        database.group_materials,
+        database.group_products,
+        database.group_parts,
+        database.materials,
+        database.products,
+        database.parts
+    ])
+
+
+@migration(4)
+def undo_all_tables(database):
+    """Add the undo steps replaying the entries of all tables, see SQLTableBase.batch.
+
+    The cost rollups of inserted rows are summed from their children, so
+    the rows restored by undo before their parents are counted.
+    """
+    con = database.con
+    if "all_tables" not in [row[1] for row in con.execute("PRAGMA table_info(undostep)")]:
+        con.execute("ALTER TABLE undostep ADD COLUMN all_tables INTEGER NOT NULL DEFAULT 0")
+    database.costs.replace_triggers()
+
+
+@migration(5)
+def create_group_search(database):
+    """Create the full-text index of group names, see db.fts."""
+    database.fts.create(["groups"])
+
+
+SCHEMA_VERSION = max(MIGRATIONS)
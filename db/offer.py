@@ -27,6 +27,7 @@ class OffersTable(SQLTableBase):
             """CREATE INDEX IF NOT EXISTS idx_offers_name ON offers(name)"""
         ]
         self.primary_key = "offer_id"
+        self.sort_orders = {"name": ["name"]}
         self.foreign_key = None
         self.read_only = ["offer_id"]
         self.default_columns = [
@@ -1,13 +1,17 @@
 """The parts table class for database."""
 
+import sqlite3
+from collections import OrderedDict
+from decimal import Decimal
+
 from db.super import SQLTableBase, CatalogueTable
-from asteval import Interpreter
+from db.formula import FormulaCompiler
+from db.depgraph import DependencyGraph
 
 
 class GroupPartsTable(CatalogueTable):
     def __init__(self, connection):
-        cat_table = PartsTable(connection)
-        super().__init__(connection, cat_table)
+        super().__init__(connection, PartsTable)
         self.name = "group_parts"
         self.sql_create_table = """
             CREATE TABLE IF NOT EXISTS group_parts (
@@ -90,7 +94,7 @@ class GroupPartsTable(CatalogueTable):
             "code_length", 
             "code_cost"
         ]
-        self.aeval = Interpreter(minimal=True)
+        self.derived = ["width", "length", "cost"]
         self.code2col = {
             "määrä": 3,
             "leveys": 8,
@@ -102,21 +106,75 @@ class GroupPartsTable(CatalogueTable):
             "tkorkeus": 18,
             "tsyvyys": 19
         }
+        self.computed_cols = (8, 9, 10)
+        self.product_cols = (17, 18, 19)
+        self.formulas = FormulaCompiler(self.code2col)
+        self.graphs = OrderedDict()     # {group_product_id: (signature, graph, args)}
+        self.max_graphs = 256
 
     def select(self, fk: int=None, filter: dict=None) -> list:
-        """Update parts values before returning the select list.
-        
+        """Return the parts with values parsed from codes.
+
         Returns the parts only if it's foreign key
         product exists in group_products table.
+
+        The values are computed in memory on the selected rows. Changed
+        values are saved with save_derived, outside of the undolog. A second
+        SELECT is needed only if a filter is used, as the codes can refer
+        to parts that are filtered out.
         """
         # SELECT all parts of product with fk as id.
-        parts = super().select(fk, None)
-        # for part in parts:
-        #     print(part)
+        parts = [list(part) for part in super().select(fk, None)]
         # Parse the codes in parts of this product and return changed values.
-        new_values = self.parse_codes(parts)
-        # UPDATE the changed values.
-        self.execute_dml(
+        new_values = self.parse_codes(parts, fk)
+        self.save_derived(new_values)
+        if filter:
+            return super().select(fk, filter)
+        return [tuple(part) for part in parts]
+
+    def select_page(self, fk: int=None, filter: dict=None, order: str=None,
+                    limit: int=50, token: str=None) -> tuple:
+        """Return a page of the parts as in SQLTableBase.select_page.
+
+        The parts of product 'fk' are parsed and saved with 'select' first,
+        so the pages have the values 'select' would return. A product has
+        few parts, all of them are needed to parse the codes. Without 'fk'
+        the saved values are returned.
+        """
+        if fk is not None:
+            self.select(fk, None)
+        return super().select_page(fk, filter, order, limit, token)
+
+    def get_changed_rows(self, pk_value: int) -> list:
+        """Return the updated part and the parts of it's product with changed values.
+
+        The codes of the product are parsed and the changed values saved
+        as in 'select'.
+        """
+        rows = self.select_keys([pk_value])
+        if not rows:
+            return rows
+        fk = rows[0][1]
+        parts = [list(part) for part in super().select(fk, None)]
+        new_values = self.parse_codes(parts, fk)
+        self.save_derived(new_values)
+        changed = {pk_value}.union(values[3] for values in new_values)
+        return [tuple(part) for part in parts if part[0] in changed]
+
+    def save_derived(self, values: list) -> bool:
+        """Save the values parsed from codes.
+
+        The undolog UPDATE trigger of this table does not fire for the
+        derived columns, so saving does not create undo steps.
+
+        Parameters
+        ----------
+        values : list
+            [[width, length, cost, group_part_id], ...]
+        """
+        if not values:
+            return True
+        return self.execute_dml(
             """
             UPDATE
                 group_parts
@@ -124,111 +182,283 @@ class GroupPartsTable(CatalogueTable):
                 width=(?), length=(?), cost=(?)
             WHERE
                 group_part_id=(?)
-            """, new_values, True
+            """, values, True
         )
-        # Get the parts with updated values.
-        return super().select(fk=fk, filter=filter)
 
-    def parse_codes(self, parts: list):
-        """Return list of changed values parsed from codes."""
+    def create(self):
+        """Create the table and the triggers queueing changes for recalculation."""
+        super().create()
+        self.create_queue()
+
+    def create_queue(self):
+        """Create the part_queue table and it's triggers for this connection.
+
+        They are TEMP objects, created again for every connection.
+        """
+        try:
+            self.con.executescript(self.get_queue_script())
+        except sqlite3.OperationalError as err:
+            print(f"Could not create part queue triggers: {err}")
+
+    def get_queue_script(self) -> str:
+        """Return the script creating part_queue table and it's triggers.
+
+        Changes to inputs of part codes in group_parts, group_products,
+        group_materials and group_predefs add the key of the changed input to
+        part_queue. NULL group_part_id is used for inputs of the product.
+        Changes to the codes themselves are found by GroupPartsTable.recalculate.
+        """
+        material_keys = ("mhinta", "mpaksuus")
+        using_material = """
+            INSERT INTO part_queue
+            SELECT pa.group_product_id, pa.group_part_id, '{k}'
+            FROM group_parts AS pa
+                INNER JOIN group_products AS pr
+                    ON pa.group_product_id=pr.group_product_id
+                LEFT JOIN group_predefs AS d
+                    ON pr.group_id=d.group_id AND pa.part=d.part
+            WHERE
+                pr.group_id IN ({g}) AND
+                CASE
+                    WHEN pa.use_predef=0 THEN pa.default_mat
+                    ELSE d.material
+                END IN ({c});"""
+        using_predef = """
+            INSERT INTO part_queue
+            SELECT pa.group_product_id, pa.group_part_id, '{k}'
+            FROM group_parts AS pa
+                INNER JOIN group_products AS pr
+                    ON pa.group_product_id=pr.group_product_id
+            WHERE pr.group_id IN ({g}) AND pa.part IN ({c}) AND pa.use_predef<>0;"""
+        trigger = """
+        CREATE TEMP TRIGGER IF NOT EXISTS {name} AFTER {event} BEGIN{body}
+        END;"""
+
+        def each_key(sql, keys, g, c):
+            return "".join(sql.format(k=k, g=g, c=c) for k in keys)
+
+        triggers = [
+            ("group_parts_pq_count", "UPDATE OF count ON group_parts", """
+            INSERT INTO part_queue
+            VALUES(new.group_product_id, new.group_part_id, 'määrä');"""),
+            ("group_parts_pq_mat", "UPDATE OF use_predef, default_mat ON group_parts",
+             "".join(f"""
+            INSERT INTO part_queue
+            VALUES(new.group_product_id, new.group_part_id, '{k}');"""
+                for k in material_keys)),
+            ("group_products_pq_delete", "DELETE ON group_products", """
+            DELETE FROM part_queue WHERE group_product_id=old.group_product_id;"""),
+            ("group_materials_pq_cost",
+             "UPDATE OF cost, add_cost, edg_cost, loss, discount ON group_materials",
+             each_key(using_material, ["mhinta"], "new.group_id", "new.code")),
+            ("group_materials_pq_thickness", "UPDATE OF thickness ON group_materials",
+             each_key(using_material, ["mpaksuus"], "new.group_id", "new.code")),
+            ("group_materials_pq_code", "UPDATE OF code, group_id ON group_materials",
+             each_key(using_material, material_keys,
+                      "old.group_id,new.group_id", "old.code,new.code")),
+            ("group_materials_pq_insert", "INSERT ON group_materials",
+             each_key(using_material, material_keys, "new.group_id", "new.code")),
+            ("group_materials_pq_delete", "DELETE ON group_materials",
+             each_key(using_material, material_keys, "old.group_id", "old.code")),
+            ("group_predefs_pq_update", "UPDATE ON group_predefs",
+             each_key(using_predef, material_keys,
+                      "old.group_id,new.group_id", "old.part,new.part")),
+            ("group_predefs_pq_insert", "INSERT ON group_predefs",
+             each_key(using_predef, material_keys, "new.group_id", "new.part")),
+            ("group_predefs_pq_delete", "DELETE ON group_predefs",
+             each_key(using_predef, material_keys, "old.group_id", "old.part")),
+        ]
+        for (key, col) in (("tleveys", "width"), ("tkorkeus", "height"), ("tsyvyys", "depth")):
+            triggers.append((
+                f"group_products_pq_{col}",
+                f"UPDATE OF {col} ON group_products",
+                f"""
+            INSERT INTO part_queue VALUES(new.group_product_id, NULL, '{key}');"""
+            ))
+
+        script = """
+        CREATE TEMP TABLE IF NOT EXISTS part_queue (
+            group_product_id    INTEGER,
+            group_part_id       INTEGER,
+            key                 TEXT
+        );
+        CREATE INDEX IF NOT EXISTS temp.idx_part_queue
+        ON part_queue(group_product_id);"""
+        for (name, event, body) in triggers:
+            script += trigger.format(name=name, event=event, body=body)
+        return script
+
+    def read_queue(self, product_ids: list=None) -> dict:
+        """Return and remove the queued changes to inputs of part codes.
+
+        Parameters
+        ----------
+        product_ids : list, optional
+            Products to return the changes for, None for all products.
+
+        Returns
+        -------
+        dict
+            {group_product_id: [(group_part_id, key), ...]}
+        """
+        sql = "SELECT group_product_id, group_part_id, key FROM part_queue"
+        sql_del = "DELETE FROM part_queue"
+        values = None
+        if product_ids is not None:
+            binds = ",".join(["?"] * len(product_ids))
+            sql += f" WHERE group_product_id IN ({binds})"
+            sql_del += f" WHERE group_product_id IN ({binds})"
+            values = product_ids
+
+        result = self.execute_dql(sql, values)
+        if not result:
+            return {}
+        self.execute_dml(sql_del, values)
+
+        queue = {}
+        for (product_id, part_id, key) in result:
+            queue.setdefault(product_id, []).append((part_id, key))
+        return queue
+
+    def parse_codes(self, parts: list, fk: int=None):
+        """Return list of changed values parsed from codes.
+
+        Parameters
+        ----------
+        parts : list
+            Rows from SELECT query of this table as lists, updated in place.
+        fk : int, optional
+            The product all parts belong to or None if parts can be from
+            all products.
+
+        Returns
+        -------
+        list
+            [[width, length, cost, group_part_id], ...] for changed parts.
+        """
+        products = {}
+        for part in parts:
+            products.setdefault(part[1], []).append(part)
+
+        queue = self.read_queue(None if fk is None else [fk])
         new_values_list = []
-        for part_row, part in enumerate(parts):
-            new_values = []
-            is_changed = False
-
-            for n in range(8, 11):
-                old_value = part[n]
-                code = part[n + 3]
-                # print("\nCODE:\n{}".format(code))
-                value = self.code2value(code, part_row, parts)
-                # print("\nVALUE:\n{}".format(value))
-                new_values.append(value)
-                if value != old_value:
-                    is_changed = True
-
-            if is_changed:
-                new_values.append(part[0])
-                new_values_list.append(new_values)
+        for product_id, rows in products.items():
+            new_values_list.extend(
+                self.recalculate(product_id, rows, queue.get(product_id, []))
+            )
         return new_values_list
 
-    def code2value(self, code: str, row: int, parts: list):
-        """Parse a code to a value.
+    def recalculate(self, product_id: int, rows: list, changes: list) -> list:
+        """Recalculate the values of a product's parts affected by changes.
+
+        The dependency graph of a product is kept until the codes or parts
+        of the product change. All values are calculated when the graph
+        is built.
 
         Parameters
         ----------
-        code : str
-            Code string.
-        row : int
-            Origin row in parts list.
-        parts : list
-            Parts data for finding values referred to in code.
+        product_id : int
+            ID of the product.
+        rows : list
+            All part rows of the product as lists, updated in place.
+        changes : list
+            Changed inputs as [(group_part_id, key), ...]
 
         Returns
         -------
-        int | Decimal
-            Parsed value.
+        list
+            [[width, length, cost, group_part_id], ...] for changed parts.
         """
-        # Test for valididy of the code string.
+        signature = tuple((row[0], row[2], row[11], row[12], row[13]) for row in rows)
         try:
-            if code[0] != "=":
-                return None
-            code = code[1:]
-        except (TypeError, IndexError):
-            return None
+            (old_signature, graph, args) = self.graphs[product_id]
+        except KeyError:
+            old_signature = None
+
+        if old_signature != signature:
+            (graph, args) = self.build_graph(rows)
+            self.graphs[product_id] = (signature, graph, args)
+            if len(self.graphs) > self.max_graphs:
+                self.graphs.popitem(last=False)
+            nodes = graph.affected(nodes=args.keys())
         else:
-            # Remove dublicates and split to list.
-            split = list(dict.fromkeys(code.split(" ")))
-            for word in split:
-                # print(word)
-                # Default values
-                src_row = row
-                key = word
-                # Link format: "part".key
-                # If word is link to another row in parts.
-                # get value from parts list.
-                if word[0] == '"':
-                    try:
-                        # ("part", key)
-                        (source, key) = word.split(".")
-                    except ValueError:
-                        print('SyntaxError when parsing "{}"\n'.format(code) +
-                              'to refer to another part use: "part".key')
-                        return None
-                    else:
-                        # Find row for source part.
-                        source_part = source.strip('"')
-                        temp_row = None
-                        for n, dr in enumerate(parts):
-                            if dr[2] == source_part:
-                                temp_row = n
-                                break
-                        if temp_row:
-                            src_row = temp_row
-                # if key in code2col:
-                # if len(key) == 1 and key in '*/+-^()':
-                #     continue
-                try:
-                    col = self.code2col[key]
-                    value = parts[src_row][col]
-                except KeyError:
-                    continue
-                else:
-                    if value is None:
-                        value_str = "0"
+            self.graphs.move_to_end(product_id)
+            nodes = graph.affected(inputs=changes)
+
+        (ordered, cyclic) = graph.order(nodes)
+        if cyclic:
+            print(f"Circular reference in codes of product {product_id}")
+
+        row_of = {row[0]: n for n, row in enumerate(rows)}
+        changed = set()
+        for node in ordered + cyclic:
+            (part_id, col) = node
+            (formula, refs) = args[node]
+            row = rows[row_of[part_id]]
+            value = None
+            if formula is not None and node not in cyclic:
+                ev = self.formulas.evaluate(formula, [rows[i][c] for (i, c) in refs])
+                value = self.column_value(col, ev)
+            if value != row[col]:
+                row[col] = value
+                changed.add(part_id)
+
+        return [[row[8], row[9], row[10], row[0]] for row in rows if row[0] in changed]
+
+    def build_graph(self, rows: list) -> tuple:
+        """Return the dependency graph of the codes in part rows of a product.
+
+        Nodes are (group_part_id, col) for width, length and cost columns.
+        Inputs are (group_part_id, key) for count and material keys and
+        (None, key) for product keys.
+
+        Returns
+        -------
+        tuple
+            (DependencyGraph, {node: (Formula, [(row, col), ...])})
+        """
+        index = {}
+        for n, row in enumerate(rows):
+            index.setdefault(row[2], n)
+
+        graph = DependencyGraph()
+        args = {}
+        for n, row in enumerate(rows):
+            for col in self.computed_cols:
+                formula = self.formulas.compile(row[col + 3])
+                refs = []
+                depends = []
+                inputs = []
+                for (source, key) in [] if formula is None else formula.refs:
+                    # Refer to the row itself if source part is not found.
+                    src_row = n if source is None else index.get(source, n)
+                    ref_col = self.code2col[key]
+                    refs.append((src_row, ref_col))
+                    if ref_col in self.computed_cols:
+                        depends.append((rows[src_row][0], ref_col))
+                    elif ref_col in self.product_cols:
+                        inputs.append((None, key))
                     else:
-                        value_str = str(value)
-                    code = code.replace(word, value_str)
-            try:
-                # print("\nCODE TO EVAL:\{}".format(code))
-                ev = self.aeval(code)
-                if isinstance(ev, float):
-                    return Decimal(str(ev))
-                else:
-                    return ev
-
-            except NameError as e:
-                print("{}: {}".format(type(e), e))
-                return None
+                        inputs.append((rows[src_row][0], key))
+
+                graph.add_node((row[0], col), depends, inputs)
+                args[(row[0], col)] = (formula, refs)
+        return (graph, args)
+
+    def column_value(self, col: int, value):
+        """Return a value parsed from code in the type stored in the column.
+
+        Width and length are integers and cost a Decimal with two decimals.
+        Return None if the value can not be converted.
+        """
+        if value is None:
+            return None
+        try:
+            if col == 10:
+                return Decimal(value).quantize(Decimal('.01'))
+            return int(Decimal(value).to_integral_value())
+        except (TypeError, ValueError, ArithmeticError):
+            return None
 
     def get_table_alias(self):
         """Return the alias used for this tables name."""
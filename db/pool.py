@@ -0,0 +1,191 @@
+"""Connection manager with WAL mode and a pool of read-only connections.
+
+The writer connection is used by the table classes. Searches and reports
+run on read-only connections from the pool, which in WAL mode read the last
+committed state without waiting for the writer. A background thread
+checkpoints the WAL so it does not grow while the app is open.
+
+In memory databases can not be shared, their readers are the writer.
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import db.dbtypes as dbt
+
+
+PROFILES = {
+    # Cell edits, durable on commit except for a power loss.
+    "interactive": {
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+    },
+    # Imports and other bulk writes that can be redone.
+    "bulk": {
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+    },
+    # Every commit synced to disk.
+    "safe": {
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+    },
+}
+
+
+def apply_profile(con: sqlite3.Connection, profile: str, read_only: bool=False):
+    """Set the pragmas of the profile on the connection.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to configure.
+    profile : str
+        Key to PROFILES.
+    read_only : bool, optional
+        Set True for a reader connection, by default False.
+    """
+    settings = PROFILES[profile]
+    con.execute(f"PRAGMA cache_size = {int(settings['cache_size'])}")
+    con.execute(f"PRAGMA mmap_size = {int(settings['mmap_size'])}")
+    if read_only:
+        con.execute("PRAGMA query_only = ON")
+    else:
+        con.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+
+
+class ConnectionManager:
+    """Manage the writer, the reader pool and the checkpoints of a database.
+
+    Parameters
+    ----------
+    db_name : str
+        Path to the database file or ':memory:'.
+    writer : sqlite3.Connection
+        Connection used for writes, created with db.database.connect.
+    profile : str, optional
+        Key to PROFILES, by default "interactive".
+    readers : int, optional
+        Max number of read-only connections, by default 2.
+    checkpoint_interval : float, optional
+        Seconds between checkpoints, by default 30.0. Use None to leave
+        checkpoints to sqlite.
+    """
+    def __init__(self, db_name: str, writer: sqlite3.Connection, profile: str="interactive",
+                 readers: int=2, checkpoint_interval: float=30.0):
+        self.db_name = db_name
+        self.writer = writer
+        self.profile = profile
+        self.max_readers = readers
+        self.readers = queue.LifoQueue()
+        self.n_readers = 0
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.checkpoints = 0
+        self.checkpointer = None
+        self.in_memory = db_name == ":memory:" or db_name.startswith("file::memory:")
+
+        if not self.in_memory:
+            mode = self.writer.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode.lower() != "wal":
+                print(f"Could not enable WAL mode for {db_name}, using '{mode}'.")
+        apply_profile(self.writer, profile)
+
+        if not self.in_memory and checkpoint_interval is not None:
+            self.writer.execute("PRAGMA wal_autocheckpoint = 0")
+            self.checkpointer = threading.Thread(
+                target=self.run_checkpoints,
+                args=(checkpoint_interval,),
+                name="wal-checkpoint",
+                daemon=True
+            )
+            self.checkpointer.start()
+
+    def new_reader(self) -> sqlite3.Connection:
+        """Return a new read-only connection with the pydecimal functions."""
+        con = sqlite3.connect(
+            f"file:{self.db_name}?mode=ro",
+            uri=True,
+            detect_types=sqlite3.PARSE_COLNAMES,
+            check_same_thread=False
+        )
+        dbt.register_functions(con)
+        apply_profile(con, self.profile, True)
+        return con
+
+    @contextmanager
+    def reader(self):
+        """Lend a read-only connection for the block.
+
+        Waits for a connection to be returned if all 'readers' are in use.
+        """
+        if self.in_memory:
+            yield self.writer
+            return
+
+        con = None
+        try:
+            con = self.readers.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                if self.n_readers < self.max_readers:
+                    self.n_readers += 1
+                    create = True
+                else:
+                    create = False
+            con = self.new_reader() if create else self.readers.get()
+        try:
+            yield con
+        finally:
+            # End the read transaction so the WAL can be checkpointed.
+            if con.in_transaction:
+                con.rollback()
+            self.readers.put(con)
+
+    def run_checkpoints(self, interval: float):
+        """Checkpoint the WAL every 'interval' seconds until closed."""
+        con = sqlite3.connect(self.db_name)
+        try:
+            while not self.stop.wait(interval):
+                try:
+                    con.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                    self.checkpoints += 1
+                except sqlite3.Error as err:
+                    print(f"WAL checkpoint failed: {err}")
+        finally:
+            con.close()
+
+    def checkpoint(self, mode: str="PASSIVE") -> tuple:
+        """Checkpoint the WAL now using the writer.
+
+        Returns
+        -------
+        tuple
+            (busy, log frames, checkpointed frames) from sqlite.
+        """
+        return self.writer.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+    def close(self):
+        """Stop the checkpoints and close the readers.
+
+        The writer is left open, it belongs to the caller.
+        """
+        self.stop.set()
+        if self.checkpointer is not None:
+            self.checkpointer.join()
+            self.checkpointer = None
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+        if not self.in_memory:
+            try:
+                self.checkpoint("TRUNCATE")
+            except sqlite3.Error as err:
+                print(f"WAL checkpoint failed: {err}")
@@ -0,0 +1,324 @@
+"""Batch pricing of whole offers with numpy.
+
+The materials, products and parts of an offer are loaded as columns of
+fixed-point integers (see db.dbtypes) with one query per table and priced
+with vectorized int64 operations. The results are identical to the row at a
+time functions in db.dbtypes, which are kept as the reference.
+
+Requires numpy, import this module only when pricing is needed.
+"""
+
+import sqlite3
+from decimal import Decimal
+
+import numpy as np
+
+import db.dbtypes as dbt
+from db.super import iter_rows
+from db.vars import VarID
+
+
+CHUNK_SIZE = 1000   # Rows fetched at a time.
+
+
+def round_div(a: np.ndarray, b: int) -> np.ndarray:
+    """Divide int64 array by integer rounding half away from zero."""
+    half = b // 2
+    return np.where(a >= 0, (a + half) // b, -((half - a) // b))
+
+
+def material_cost(cost, add, edg, loss, discount) -> np.ndarray:
+    """Return the total costs per unit of material columns.
+
+    Vectorized dbtypes.fixed_material_cost.
+    """
+    scale = dbt.FIXED_SCALE
+    a = cost * (scale + loss)
+    b = (add + edg) * scale
+    return round_div((a + b) * (scale - discount), scale * scale)
+
+
+def product_cost(part_cost, work_time, work_cost: int) -> np.ndarray:
+    """Return the costs of product columns.
+
+    Vectorized dbtypes.fixed_product_cost.
+    """
+    return part_cost + round_div(work_time * work_cost, dbt.FIXED_SCALE)
+
+
+def group_sum(ids: np.ndarray, keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Return the sums of values grouped by keys for each of the ids.
+
+    Parameters
+    ----------
+    ids : np.ndarray
+        Sorted unique ids of the groups.
+    keys : np.ndarray
+        Group id for each value.
+    values : np.ndarray
+        Values to sum, one row for each key.
+    """
+    sums = np.zeros((len(ids),) + values.shape[1:], dtype=np.int64)
+    if len(keys):
+        np.add.at(sums, np.searchsorted(ids, keys), values)
+    return sums
+
+
+class OfferPrices:
+    """Prices of an offer as fixed-point int64 arrays.
+
+    Each *_ids array is sorted and the arrays with costs are in the same order.
+    """
+    def __init__(self):
+        self.material_ids = None
+        self.material_costs = None
+        self.part_ids = None
+        self.part_costs = None
+        self.product_ids = None
+        self.product_part_costs = None
+        self.product_costs = None
+        self.group_ids = None
+        self.group_costs = None
+        self.total = 0
+
+    @staticmethod
+    def as_dict(ids: np.ndarray, costs: np.ndarray) -> dict:
+        """Return {id: Decimal cost} for the arrays."""
+        return {
+            int(i): Decimal(int(c)).scaleb(-dbt.FIXED_PLACES)
+            for (i, c) in zip(ids, costs)
+        }
+
+    def get_materials(self) -> dict:
+        """Return {group_material_id: tot_cost}."""
+        return self.as_dict(self.material_ids, self.material_costs)
+
+    def get_parts(self) -> dict:
+        """Return {group_part_id: cost}."""
+        return self.as_dict(self.part_ids, self.part_costs)
+
+    def get_products(self) -> dict:
+        """Return {group_product_id: tot_cost}."""
+        return self.as_dict(self.product_ids, self.product_costs)
+
+    def get_groups(self) -> dict:
+        """Return {group_id: tot_cost}."""
+        return self.as_dict(self.group_ids, self.group_costs)
+
+    def get_total(self) -> Decimal:
+        """Return the total cost of the offer."""
+        return Decimal(int(self.total)).scaleb(-dbt.FIXED_PLACES)
+
+
+def load_columns(con: sqlite3.Connection, sql: str, values: tuple, ncols: int) -> list:
+    """Return the result of the query as a list of int64 column arrays.
+
+    The rows are fetched in chunks straight into the array.
+    """
+    rows = iter_rows(con.execute(sql, values), CHUNK_SIZE)
+    table = np.fromiter(rows, dtype=np.dtype((np.int64, ncols)))
+    return list(table.T)
+
+
+def get_variable(con: sqlite3.Connection, var_id: int) -> int:
+    """Return a decimal variable as fixed-point int."""
+    result = con.execute(
+        "SELECT coalesce(value_decimal,0) FROM variables WHERE variable_id=(?)",
+        (var_id,)
+    ).fetchone()
+    return 0 if result is None else dbt.to_fixed(result[0])
+
+
+def load_products(con: sqlite3.Connection, offer_id: int) -> tuple:
+    """Return the columns of the groups, products and parts of an offer.
+
+    Returns
+    -------
+    tuple
+        (group_ids, product_ids, product_groups, work_time, inst_unit,
+        part_ids, part_products, part_costs)
+    """
+    group_ids = load_columns(
+        con, "SELECT group_id FROM groups WHERE offer_id=(?) ORDER BY group_id",
+        (offer_id,), 1
+    )[0]
+    (product_ids, product_groups, work_time, inst_unit) = load_columns(
+        con,
+        """
+        SELECT
+            p.group_product_id, p.group_id,
+            coalesce(p.work_time,0), coalesce(p.inst_unit,0)
+        FROM group_products AS p INNER JOIN groups AS g USING(group_id)
+        WHERE g.offer_id=(?)
+        ORDER BY p.group_product_id
+        """, (offer_id,), 4
+    )
+    (part_ids, part_products, part_costs) = load_columns(
+        con,
+        """
+        SELECT a.group_part_id, a.group_product_id, coalesce(a.cost,0)
+        FROM group_parts AS a
+            INNER JOIN group_products AS p USING(group_product_id)
+            INNER JOIN groups AS g USING(group_id)
+        WHERE g.offer_id=(?)
+        ORDER BY a.group_part_id
+        """, (offer_id,), 3
+    )
+    return (group_ids, product_ids, product_groups, work_time, inst_unit,
+            part_ids, part_products, part_costs)
+
+
+def price_offer(con: sqlite3.Connection, offer_id: int, work_cost: int=None) -> OfferPrices:
+    """Price all materials, parts, products and groups of an offer.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection created with db.database.connect.
+    offer_id : int
+        ID of the offer.
+    work_cost : int | Decimal, optional
+        Cost of work as fixed-point int or Decimal, by default read from variables.
+
+    Returns
+    -------
+    OfferPrices
+    """
+    if work_cost is None:
+        work_cost = get_variable(con, VarID.WORK_COST)
+    work_cost = dbt.to_fixed(work_cost)
+
+    prices = OfferPrices()
+    (prices.material_ids, cost, add, edg, loss, discount) = load_columns(
+        con,
+        """
+        SELECT
+            m.group_material_id,
+            coalesce(m.cost,0), coalesce(m.add_cost,0), coalesce(m.edg_cost,0),
+            coalesce(m.loss,0), coalesce(m.discount,0)
+        FROM group_materials AS m INNER JOIN groups AS g USING(group_id)
+        WHERE g.offer_id=(?)
+        ORDER BY m.group_material_id
+        """, (offer_id,), 6
+    )
+    prices.material_costs = material_cost(cost, add, edg, loss, discount)
+
+    (prices.group_ids, prices.product_ids, product_groups, work_time, _,
+     prices.part_ids, part_products, prices.part_costs) = load_products(con, offer_id)
+
+    prices.product_part_costs = group_sum(prices.product_ids, part_products, prices.part_costs)
+    prices.product_costs = product_cost(prices.product_part_costs, work_time, work_cost)
+    prices.group_costs = group_sum(prices.group_ids, product_groups, prices.product_costs)
+    prices.total = int(prices.group_costs.sum())
+    return prices
+
+
+class Scenario:
+    """Parameters of a what-if pricing.
+
+    Parameters left to None price the products like price_offer and the
+    cost rollups, so Scenario() is the current price of the offer.
+
+    Parameters
+    ----------
+    work_cost : Decimal, optional
+        Cost of work per unit of product work_time, by default from variables.
+    install_unit_mult : Decimal, optional
+        Cost per installation unit of product inst_unit, by default 0.
+    loss : Decimal, optional
+        Loss factor added to part costs, by default 0.
+    discount : Decimal, optional
+        Discount of part costs, by default 0.
+    """
+    def __init__(self, work_cost=None, install_unit_mult=None, loss=None, discount=None):
+        self.work_cost = work_cost
+        self.install_unit_mult = install_unit_mult
+        self.loss = loss
+        self.discount = discount
+
+
+class ScenarioPrices:
+    """Prices of an offer under K scenarios as fixed-point int64 arrays.
+
+    The cost arrays have a column for each scenario, in the order given
+    to price_scenarios.
+    """
+    def __init__(self):
+        self.product_ids = None
+        self.product_costs = None   # (products, K)
+        self.group_ids = None
+        self.group_costs = None     # (groups, K)
+        self.totals = None          # (K,)
+
+    def get_totals(self) -> list:
+        """Return the total cost of the offer for each scenario."""
+        return [Decimal(int(c)).scaleb(-dbt.FIXED_PLACES) for c in self.totals]
+
+    def get_groups(self) -> dict:
+        """Return {group_id: [tot_cost for each scenario]}."""
+        return {
+            int(i): [Decimal(int(c)).scaleb(-dbt.FIXED_PLACES) for c in costs]
+            for (i, costs) in zip(self.group_ids, self.group_costs)
+        }
+
+
+def price_scenarios(con: sqlite3.Connection, offer_id: int, scenarios: list) -> ScenarioPrices:
+    """Price the products and groups of an offer under each scenario.
+
+    The cost of a product under a scenario is
+        part_cost * (1 + loss) * (1 - discount)
+        + work_time * work_cost
+        + inst_unit * install_unit_mult
+    with each term rounded to hundredths like db.dbtypes.material_cost.
+    Part costs are the stored results of the part codes, which include the
+    loss and discount of their materials. The installation units are not
+    priced elsewhere, so the variable INSTALL_UNIT_MULT is not used by
+    default and a scenario without changes matches price_offer.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection created with db.database.connect.
+    offer_id : int
+        ID of the offer.
+    scenarios : list
+        List of Scenario objects.
+
+    Returns
+    -------
+    ScenarioPrices
+    """
+    defaults = {
+        "work_cost": get_variable(con, VarID.WORK_COST),
+        "install_unit_mult": 0,
+        "loss": 0,
+        "discount": 0
+    }
+    params = {
+        key: np.array(
+            [default if getattr(sc, key) is None else dbt.to_fixed(getattr(sc, key))
+             for sc in scenarios],
+            dtype=np.int64
+        )
+        for (key, default) in defaults.items()
+    }
+
+    (group_ids, product_ids, product_groups, work_time, inst_unit,
+     _, part_products, part_costs) = load_products(con, offer_id)
+
+    scale = dbt.FIXED_SCALE
+    parts = group_sum(product_ids, part_products, part_costs)[:, None]
+    factor = (scale + params["loss"]) * (scale - params["discount"])
+    costs = (
+        round_div(parts * factor, scale * scale)
+        + round_div(work_time[:, None] * params["work_cost"], scale)
+        + round_div(inst_unit[:, None] * params["install_unit_mult"], scale)
+    )
+
+    prices = ScenarioPrices()
+    prices.product_ids = product_ids
+    prices.product_costs = costs
+    prices.group_ids = group_ids
+    prices.group_costs = group_sum(group_ids, product_groups, costs)
+    prices.totals = prices.group_costs.sum(axis=0)
+    return prices
@@ -5,8 +5,7 @@ from db.super import SQLTableBase, CatalogueTable
 
 class GroupProductsTable(CatalogueTable):
     def __init__(self, connection):
-        cat_table = ProductsTable(connection)
-        super().__init__(connection, cat_table)
+        super().__init__(connection, ProductsTable)
         self.name = "group_products"
         self.sql_create_table = """
             CREATE TABLE IF NOT EXISTS group_products (
@@ -91,24 +90,12 @@ class GroupProductsTable(CatalogueTable):
                 p.depth,    
                 p.inst_unit AS 'inst_unit [pydecimal]',
                 p.work_time AS 'work_time [pydecimal]',
-                a.part_cost AS 'part_cost [pydecimal]',
-                product_cost(
-                    a.part_cost,
-                    p.work_time,
-                    (
-                        SELECT value_decimal
-                        FROM variables
-                        WHERE variable_id=0
-                    )
-                ) AS 'tot_cost [pydecimal]'
+                c.part_cost AS 'part_cost [pydecimal]',
+                c.tot_cost AS 'tot_cost [pydecimal]'
 
             FROM
                 group_products as p
-                LEFT JOIN (
-                    SELECT a.group_product_id, dec_sum(a.cost) AS part_cost
-                    FROM group_parts AS a
-                    GROUP BY a.group_product_id
-                ) a USING(group_product_id)
+                LEFT JOIN product_costs AS c USING(group_product_id)
         """
 
     def get_table_alias(self) -> str:
@@ -223,6 +210,7 @@ class ProductsTable(SQLTableBase):
             """CREATE INDEX IF NOT EXISTS idx_products_category ON products(category, code)"""
         ]
         self.primary_key = "product_id"
+        self.sort_orders = {"code": ["code"], "category": ["category", "code"]}
         self.foreign_key = None
         self.read_only = ["product_id"]
         self.default_columns = [
@@ -1,6 +1,135 @@
 """Superclasses for database tables. """
 
+import base64
+import json
 import sqlite3
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
+
+
+@contextmanager
+def transaction(con: sqlite3.Connection):
+    """Run the statements of the block in a single transaction.
+
+    SQLTableBase methods do not commit inside the block. The transaction
+    is committed at the end of the outermost block and rolled back if
+    an exception is raised. A nested block is a savepoint of the outer
+    transaction, rolled back alone on an exception.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        The connection used by the tables.
+    """
+    depth = SQLTableBase._batch.get(con, 0)
+    savepoint = f"batch_{depth}"
+    if depth == 0 and not con.in_transaction:
+        con.execute("BEGIN")
+    elif depth > 0:
+        con.execute(f"SAVEPOINT {savepoint}")
+    SQLTableBase._batch[con] = depth + 1
+    try:
+        yield con
+    except BaseException:
+        SQLTableBase._batch[con] = depth
+        if depth == 0:
+            con.rollback()
+        else:
+            con.execute(f"ROLLBACK TO {savepoint}")
+            con.execute(f"RELEASE {savepoint}")
+        raise
+    SQLTableBase._batch[con] = depth
+    if depth == 0:
+        con.commit()
+    else:
+        con.execute(f"RELEASE {savepoint}")
+
+
+def encode_page_token(order: str, last: list) -> str:
+    """Return an opaque token for the page after the row with sort keys 'last'."""
+    data = json.dumps({"o": order, "k": last}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_page_token(token: str, order: str) -> list:
+    """Return the sort keys in a page token made for 'order'.
+
+    Raises ValueError if the token is not valid for the order.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        last = data["k"]
+        valid = data["o"] == order and isinstance(last, list)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        valid = False
+    if not valid:
+        raise ValueError(f"Invalid page token for sort order '{order}'.")
+    return last
+
+
+def iter_rows(cursor: sqlite3.Cursor, chunk_size: int=500, row_factory=None):
+    """Yield the rows of the cursor fetching 'chunk_size' rows at a time.
+
+    Parameters
+    ----------
+    cursor : sqlite3.Cursor
+        Cursor of an executed query.
+    chunk_size : int, optional
+        Number of rows per fetchmany, by default 500.
+    row_factory : callable, optional
+        Set as cursor.row_factory, called as row_factory(cursor, row), like sqlite3.Row.
+    """
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+class ColumnSchema:
+    """Column setup of a table loaded from the columns table.
+
+    The values are lists in col_idx order. The object is not modified after
+    loading, set_column_setup marks it 'stale' and the table loads a new one,
+    so holders of a schema can check 'stale' instead of asking the table.
+
+    Parameters
+    ----------
+    rows : list
+        Rows of (key, label, type, col_order, width, ro, visible) in col_idx order.
+    """
+    KEYS = ("key", "label", "type", "col_order", "width", "ro", "visible")
+
+    def __init__(self, rows: list):
+        self.stale = False
+        self.values = {k: [row[i] for row in rows] for (i, k) in enumerate(self.KEYS)}
+        # Type names without the parameters, "decimal:2" -> "decimal".
+        self.base_types = [t.split(":")[0] if t else "" for t in self.values["type"]]
+
+    def __len__(self):
+        return len(self.values["key"])
+
+    def get(self, key: str, col: int=None):
+        """Return the list of values for key or the value of a single column."""
+        values = self.values[key]
+        return values if col is None else values[col]
+
+    def label(self, col: int) -> str:
+        """Return the label of the column."""
+        return self.values["label"][col]
+
+    def type(self, col: int) -> str:
+        """Return the type string of the column."""
+        return self.values["type"][col]
+
+    def base_type(self, col: int) -> str:
+        """Return the type name of the column without parameters."""
+        return self.base_types[col]
 
 
 class SQLTableBase:
@@ -23,6 +152,9 @@ class SQLTableBase:
     _undo['active'] = True
     _undo['pending'] = []
     _undo['firstlog'] = {}  # {fk: seq}
+    _primary_keys = {}      # {tablename: primary key} for replaying steps of all tables.
+    undo_limit = 100        # Max undo steps kept for each table and foreign key.
+    _batch = {}             # {connection: depth of transaction blocks}
 
     def __init__(self, connection):
         self.con: sqlite3.Connection = connection
@@ -41,9 +173,6 @@ class SQLTableBase:
         self.variables_table_keys = [
             "variable_id", "label", "value_decimal", "value_int", "value_txt"
         ]
-        self.undostack = {}     # {foreign_key: [(begin rowid, end rowid), ...], ...}
-        self.redostack = {}
-
         self.name = None
         self.sql_create_table = None
         self.indexes = None
@@ -52,6 +181,9 @@ class SQLTableBase:
         self.read_only = None
         self.default_columns = None
         self.table_keys = None
+        self.derived = []       # Keys of values computed by the program, not journaled.
+        self._schema = None
+        self.sort_orders = {}   # {order: [keys]} for select_page, use indexed keys.
 
     def create(self):
         """Create the table and it's indexes."""
@@ -79,7 +211,7 @@ class SQLTableBase:
                 count = self.con.execute(
                     """SELECT COUNT(*) FROM columns WHERE tablename=(?)""",
                     (self.name,)
-                )
+                ).fetchone()[0]
                 if count != len(self.default_columns):
                     for i, col in enumerate(self.default_columns):
                         read_only = 1 if col[self.KEY] in self.read_only else 0
@@ -91,12 +223,71 @@ class SQLTableBase:
                             )
                         except sqlite3.IntegrityError:
                             pass
+            self.invalidate_schema()
 
         except sqlite3.OperationalError as err:
             if SQLTableBase.print_errors:
                 print(f"\nsqlite3.OperationalError: {err}")
                 print(f"Could not create table: {self.name}")
 
+    def rebuild(self):
+        """Recreate the table from 'sql_create_table' keeping the rows.
+
+        Used when the definition of an existing table has changed in a way
+        ALTER TABLE can not do, like the expression of a generated column.
+        """
+        temp_name = f"{self.name}_rebuild"
+        keys = ",".join(self.get_insert_keys(True))
+        fk_on = self.con.execute("PRAGMA foreign_keys").fetchone()[0]
+        self.con.execute("PRAGMA foreign_keys = OFF")
+        with self.con:
+            self.con.execute(f"DROP TABLE IF EXISTS {temp_name}")
+            self.con.execute(self.sql_create_table.replace(self.name, temp_name, 1))
+            self.con.execute(
+                f"INSERT INTO {temp_name}({keys}) SELECT {keys} FROM {self.name}"
+            )
+            self.con.execute(f"DROP TABLE {self.name}")
+            self.con.execute(f"ALTER TABLE {temp_name} RENAME TO {self.name}")
+            for idx in self.indexes:
+                self.con.execute(idx)
+        self.con.execute(f"PRAGMA foreign_keys = {'ON' if fk_on else 'OFF'}")
+        # Dropping the table dropped it's triggers.
+        self.create_undo_triggers()
+
+    def in_batch(self) -> bool:
+        """Return True if inside a transaction or batch block."""
+        return SQLTableBase._batch.get(self.con, 0) > 0
+
+    def autocommit(self):
+        """Return the context manager committing a single statement.
+
+        Inside a batch the commit is left to the end of the batch.
+        """
+        if self.in_batch():
+            return nullcontext()
+        return self.con
+
+    @contextmanager
+    def batch(self, foreign_key: int=None):
+        """Run the block in a single transaction and undo step.
+
+        The undolog entries from the block are saved as one undo step of
+        'foreign_key' when the block ends. The step covers the entries of
+        all tables, so rows changed by triggers and foreign key cascades
+        are restored with it. On an exception the changes are rolled back
+        and no step is saved.
+
+        Parameters
+        ----------
+        foreign_key : int, optional
+            Key to the undo stack of the step, by default None
+        """
+        with transaction(self.con):
+            # Entries before the block are a step of their own.
+            self.undo_barrier(foreign_key)
+            yield self
+            self.undo_barrier(foreign_key, True)
+
     def execute_dml(self, sql: str, values: list=None, many: bool=False, rowid: bool=False) -> bool:
         """Run execute on a data manipulation language string.
 
@@ -122,7 +313,7 @@ class SQLTableBase:
             Last rowid if 'rowid' is set as True.
         """
         try:
-            with self.con:
+            with self.autocommit():
                 if many:
                     if values is None:
                         cur = self.con.executemany(sql)
@@ -171,7 +362,7 @@ class SQLTableBase:
 #        print(sql)
 #        print(values)
         try:
-            with self.con:
+            with self.autocommit():
                 if values is None:
                     cur = self.con.execute(sql)
                 else:
@@ -247,6 +438,141 @@ class SQLTableBase:
 
         return rowid
 
+    def insert_rows(self, rows: list, foreign_key: int=None) -> list:
+        """Insert rows pasted to a grid in one statement and undo step.
+
+        The values are in the column order of the grid, like the rows of
+        'select', and are converted to the types of the columns setup.
+        Columns that do not allow inserts are left out. Values of unique
+        columns that are used by an existing or an earlier pasted row are
+        set to None.
+
+        Parameters
+        ----------
+        rows : list
+            Rows of values in column order.
+        foreign_key : int, optional
+            Foreign key set to the new rows and the key of the undo step,
+            by default the values in the rows are used.
+
+        Returns
+        -------
+        list
+            Primary keys of the inserted rows. Empty list on Error.
+        """
+        if not rows:
+            return []
+        schema = self.get_schema()
+        insert_keys = self.get_insert_keys()
+        cols = [(col, key) for (col, key) in enumerate(schema.get("key")) if key in insert_keys]
+        keys = [key for (_, key) in cols]
+        values = [
+            [
+                self.coerce(schema.base_type(col), row[col] if col < len(row) else None)
+                for (col, _) in cols
+            ]
+            for row in rows
+        ]
+        if foreign_key is not None and self.foreign_key in keys:
+            fk_idx = keys.index(self.foreign_key)
+            for row in values:
+                row[fk_idx] = foreign_key
+        self.null_unique(keys, values)
+
+        pk = self.primary_key
+        sql = f"INSERT INTO {self.name}({','.join(keys)}) VALUES ({','.join(['?'] * len(keys))})"
+        try:
+            with self.batch(foreign_key):
+                last = self.con.execute(f"SELECT coalesce(MAX({pk}),0) FROM {self.name}")
+                last = last.fetchone()[0]
+                self.con.executemany(sql, values)
+                result = self.con.execute(
+                    f"SELECT {pk} FROM {self.name} WHERE {pk}>(?) ORDER BY {pk} ASC",
+                    (last,)
+                ).fetchall()
+        except sqlite3.Error as err:
+            if SQLTableBase.print_errors:
+                print(f"Could not insert rows to {self.name}: {err}")
+            return []
+        return [r[0] for r in result]
+
+    @staticmethod
+    def coerce(type_name: str, value):
+        """Return value converted to a base type of the columns setup.
+
+        Empty strings and values that can not be converted are None.
+        Numbers may use a decimal comma and booleans the words true/false,
+        yes/no or kyllä/ei.
+        """
+        if value is None or value == "":
+            return None
+        number = value.strip().replace(",", ".") if isinstance(value, str) else str(value)
+        try:
+            if type_name == "long":
+                return int(Decimal(number).to_integral_value())
+            if type_name in ("double", "decimal"):
+                return Decimal(number)
+            if type_name == "bool":
+                if isinstance(value, bool):
+                    return int(value)
+                if isinstance(value, str) and value.strip().lower() in ("false", "no", "ei"):
+                    return 0
+                if isinstance(value, str) and value.strip().lower() in ("true", "yes", "kyllä"):
+                    return 1
+                return int(Decimal(number) != 0)
+        except (ValueError, ArithmeticError):
+            return None
+        if isinstance(value, str):
+            return value
+        return str(value)
+
+    def get_unique_keys(self) -> list:
+        """Return the keys of each UNIQUE constraint and index of the table."""
+        unique = []
+        for index in self.con.execute(f"PRAGMA index_list({self.name})").fetchall():
+            # (seq, name, unique, origin, partial)
+            if index[2] and index[3] != "pk":
+                info = self.con.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                unique.append([row[2] for row in info])
+        return unique
+
+    def null_unique(self, keys: list, values: list, chunk_size: int=200):
+        """Set the values of unique columns that would conflict to None.
+
+        Foreign keys are kept, the other columns of a conflicting
+        constraint are set to None. NULL values do not conflict.
+
+        Parameters
+        ----------
+        keys : list
+            Keys of the values in each row.
+        values : list
+            Rows of values to insert, modified in place.
+        """
+        for unique in self.get_unique_keys():
+            if any(k not in keys for k in unique):
+                continue
+            idx = [keys.index(k) for k in unique]
+            rows = [row for row in values if all(row[i] is not None for i in idx)]
+            existing = set()
+            cond = f"({','.join(unique)}) IN (VALUES {{}})"
+            bind = "(" + ",".join(["?"] * len(idx)) + ")"
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                sql = (f"SELECT {','.join(unique)} FROM {self.name} WHERE "
+                       + cond.format(",".join([bind] * len(chunk))))
+                params = [row[i] for row in chunk for i in idx]
+                existing.update(tuple(r) for r in self.con.execute(sql, params))
+
+            for row in rows:
+                value = tuple(row[i] for i in idx)
+                if value in existing:
+                    for (i, key) in zip(idx, unique):
+                        if key != self.foreign_key:
+                            row[i] = None
+                else:
+                    existing.add(value)
+
     def update(self, pk_value: int, col: int, value) -> bool:
         """Update a single value in the table.
 
@@ -270,12 +596,85 @@ class SQLTableBase:
         result = self.execute_dml(sql, values)
         return result
 
+    def update_cell(self, pk_value: int, col: int, value) -> list:
+        """Update a single value and return the rows changed by it.
+
+        Used by the grids to redraw only the changed rows instead of
+        selecting all rows again. Arguments are as in 'update'.
+
+        Returns
+        -------
+        list
+            Rows as in 'select' that changed, the updated row included.
+            None on Error.
+        """
+        if not self.update(pk_value, col, value):
+            return None
+        return self.get_changed_rows(pk_value)
+
+    def get_changed_rows(self, pk_value: int) -> list:
+        """Return the rows changed by an update of the row 'pk_value'.
+
+        Override for tables where an update changes values in other rows.
+        """
+        return self.select_keys([pk_value])
+
+    def select_keys(self, pk_values: list) -> list:
+        """Return the rows with the primary keys as in 'select'."""
+        if not pk_values:
+            return []
+        binds = ",".join(["?"] * len(pk_values))
+        sql = (f"{self.get_select_query()} WHERE {self.get_table_alias()}.{self.primary_key}"
+               f" IN ({binds}) ORDER BY {self.get_table_alias()}.{self.primary_key} ASC")
+        return self.execute_dql(sql, list(pk_values))
+
     def delete(self, pk_value: int) -> bool:
         """Delete the row with the matching primary key."""
         sql = f"DELETE FROM {self.name} WHERE {self.primary_key}=(?)"
         values = (pk_value,)
         return self.execute_dml(sql, values)
 
+    def delete_many(self, pk_values: list, foreign_key: int=None, temp_limit: int=500) -> int:
+        """Delete the rows with the primary keys in one statement and undo step.
+
+        Up to 'temp_limit' keys are bound to an IN list, larger sets are
+        inserted to a temporary table the DELETE selects them from.
+
+        Parameters
+        ----------
+        pk_values : list
+            Primary keys of the rows to delete.
+        foreign_key : int, optional
+            Key to the undo stack of the step, by default None
+
+        Returns
+        -------
+        int
+            Number of deleted rows, rows deleted by cascades not included.
+            None on Error.
+        """
+        pks = list(dict.fromkeys(pk for pk in pk_values if pk is not None))
+        if not pks:
+            return 0
+        sql = f"DELETE FROM {self.name} WHERE {self.primary_key} IN "
+        try:
+            with self.batch(foreign_key):
+                if len(pks) <= temp_limit:
+                    cur = self.con.execute(sql + f"({','.join(['?'] * len(pks))})", pks)
+                else:
+                    self.con.execute(
+                        "CREATE TEMP TABLE IF NOT EXISTS delete_keys (pk INTEGER PRIMARY KEY)")
+                    self.con.executemany(
+                        "INSERT INTO temp.delete_keys VALUES (?)", [(pk,) for pk in pks])
+                    cur = self.con.execute(sql + "(SELECT pk FROM temp.delete_keys)")
+                    self.con.execute("DELETE FROM temp.delete_keys")
+                count = cur.rowcount
+        except sqlite3.Error as err:
+            if SQLTableBase.print_errors:
+                print(f"Could not delete rows from {self.name}: {err}")
+            return None
+        return count
+
     def undo(self, foreign_key: int=None) -> bool:
         """Undo the last action.
 
@@ -321,17 +720,74 @@ class SQLTableBase:
         count : bool, optional
             Set true to return the count of entries matching given filter and foreign key.
         pagination : list, optional
-            Set the limit and offset for pagination [limit, offset]
+            Set the limit and offset for pagination [limit, offset]. Deep pages
+            scan the rows before them, use select_page for large tables.
 
         Returns
         -------
         list
             List of selected values.
         """
-        cond = ""
+        (sql, values) = self.get_select_sql(foreign_key, filt, count, pagination)
+        return self.execute_dql(sql, values)
+
+    def iter_select(self,
+                    foreign_key: int=None,
+                    filt: dict=None,
+                    chunk_size: int=500,
+                    row_factory=None):
+        """Yield the rows of 'select' fetching them in chunks.
+
+        Use to process whole tables without keeping all rows in memory.
+        The rows are as stored, subclasses that modify the rows of 'select'
+        are not applied.
+
+        Parameters
+        ----------
+        foreign_key : int, optional
+            Foreign key used for filtering the results, by default None
+        filt : dict, optional
+            A dictionary as a filter in format {key: [operator, value]}, by default None
+        chunk_size : int, optional
+            Number of rows fetched at a time, by default 500.
+        row_factory : callable, optional
+            Factory for the rows, see iter_rows. By default rows are tuples.
+        """
+        (sql, values) = self.get_select_sql(foreign_key, filt)
+        cur = self.execute_dql(sql, values, cursor=True)
+        if cur is not None:
+            yield from iter_rows(cur, chunk_size, row_factory)
+
+    def get_select_sql(self,
+                       foreign_key: int=None,
+                       filt: dict=None,
+                       count: bool=False,
+                       pagination: list=None) -> tuple:
+        """Return the (sql, values) of a SELECT with the arguments of 'select'.
+
+        Used to run the query on another connection, like a reader.
+        """
+        (conds, values) = self.get_select_where(foreign_key, filt)
+        sql = self.get_select_query(count)
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        else:
+            # SELECT whole table.
+            values = None
+
+        direction = "ASC"
+        sql += f" ORDER BY {self.primary_key} {direction}"
+
+        if pagination:
+            sql += f" LIMIT {pagination[0]} OFFSET {pagination[1]}"
+
+        return (sql, values)
+
+    def get_select_where(self, foreign_key: int=None, filt: dict=None) -> tuple:
+        """Return the (conditions, values) of the WHERE clause for the arguments of 'select'."""
+        conds = []
         values = []
         keys = self.table_keys
-        sql_sel = self.get_select_query(count)
         table_alias = self.get_table_alias() + "."
 
         # Add the foreign key to filter for parsing.
@@ -342,29 +798,159 @@ class SQLTableBase:
             else:
                 filt[fk_idx] = ["=", foreign_key]
 
-        if filt is not None and len(filt) > 0:
-            # Parse a WHERE string from filter dictionary.
-            where_str = "{t}{k} {op} (?)"
-            for i, (key, value) in enumerate(filt.items()):
-                cond += where_str.format(t=table_alias, k=keys[key], op=value[0])
+        if filt is not None:
+            # Parse the conditions from filter dictionary.
+            for (key, value) in filt.items():
+                conds.append(f"{table_alias}{keys[key]} {value[0]} (?)")
                 values.append(value[1])
-                if i < len(filt) - 1:
-                    cond += " AND "
-            sql_con = f" WHERE {cond}"
-            sql = sql_sel + sql_con
+        return (conds, values)
 
-        else:
-            # SELECT whole table.
-            sql = sql_sel
-            values = None
+    def select_page(self,
+                    foreign_key: int=None,
+                    filt: dict=None,
+                    order: str=None,
+                    limit: int=50,
+                    token: str=None) -> tuple:
+        """Get a page of rows continuing after the rows of the previous page.
 
-        direction = "ASC"
-        sql += f" ORDER BY {self.primary_key} {direction}"
+        The page starts after the sort key of the last row of the previous
+        page, so with an index on the sort order every page costs the same
+        regardless of how deep it is. Arguments foreign_key and filt are as
+        in 'select'.
 
-        if pagination:
-            sql += f" LIMIT {pagination[0]} OFFSET {pagination[1]}"
+        Parameters
+        ----------
+        order : str, optional
+            Key to 'sort_orders', by default None to sort by primary key.
+        limit : int, optional
+            Max number of rows on the page, by default 50.
+        token : str, optional
+            Token returned with the previous page, by default None for the first page.
 
-        return self.execute_dql(sql, values)
+        Returns
+        -------
+        tuple
+            (rows, token) where token is None on the last page.
+        """
+        (sql, values, keys) = self.get_page_sql(foreign_key, filt, order, limit, token)
+        rows = self.execute_dql(sql, values)
+        if rows is None:
+            return ([], None)
+        return self.split_page(rows, order, limit, keys)
+
+    def get_offset_token(self, foreign_key: int=None, filt: dict=None, offset: int=0) -> str:
+        """Return the token of the page starting at 'offset' in primary key order.
+
+        Used to jump to a position of 'select_page' without a previous page.
+        Returns None for the first page or if offset is past the last row.
+        """
+        if offset <= 0:
+            return None
+        (sql, values) = self.get_select_sql(foreign_key, filt, False, [1, int(offset) - 1])
+        rows = self.execute_dql(sql, values)
+        if not rows:
+            return None
+        return encode_page_token(None, [rows[0][0]])
+
+    def count_rows(self, foreign_key: int=None, filt: dict=None) -> int:
+        """Return the number of rows 'select' returns for the arguments.
+
+        Without a filter the count is read from row_counts kept by
+        triggers, see db.counts. A filter counts the matching rows.
+        """
+        if not filt:
+            sql = "SELECT coalesce(SUM(n),0) FROM row_counts WHERE tablename=(?)"
+            values = [self.name]
+            if foreign_key is not None and self.foreign_key is not None:
+                sql += " AND fk=(?)"
+                values.append(foreign_key)
+            rows = self.execute_dql(sql, values)
+            if rows is not None:
+                return rows[0][0]
+        (sql, values) = self.get_select_sql(foreign_key, filt, True)
+        rows = self.execute_dql(sql, values)
+        return rows[0][0] if rows else 0
+
+    def get_page_sql(self, foreign_key=None, filt=None, order=None, limit=50, token=None) -> tuple:
+        """Return the (sql, values, sort keys) of a page for 'select_page'.
+
+        Selects one row more than 'limit' to find if a next page exists.
+        """
+        try:
+            keys = list(self.sort_orders[order]) if order is not None else []
+        except KeyError:
+            raise ValueError(f"Table {self.name} has no sort order '{order}'.") from None
+        keys.append(self.primary_key)
+
+        (conds, values) = self.get_select_where(foreign_key, filt)
+        table_alias = self.get_table_alias() + "."
+        if token is not None:
+            (cond, after) = self.keyset_condition(
+                [table_alias + k for k in keys], decode_page_token(token, order))
+            conds.append(cond)
+            values.extend(after)
+
+        sql = self.get_select_query()
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sql += " ORDER BY " + ",".join(f"{table_alias}{k} ASC" for k in keys)
+        sql += f" LIMIT {int(limit) + 1}"
+        return (sql, values, keys)
+
+    def split_page(self, rows: list, order: str, limit: int, keys: list) -> tuple:
+        """Return (rows, token) of a page selected with one extra row."""
+        if len(rows) <= limit:
+            return (rows, None)
+        rows = rows[:limit]
+        last = [rows[-1][self.table_keys.index(k)] for k in keys]
+        return (rows, encode_page_token(order, last))
+
+    @staticmethod
+    def keyset_condition(keys: list, last: list) -> tuple:
+        """Return (condition, values) selecting the rows sorted after 'last'.
+
+        NULLs sort first, so a NULL in 'last' is followed by all non NULL
+        values. The leading range on the first key lets sqlite use the index.
+        """
+        if len(last) != len(keys):
+            raise ValueError("Page token does not match the sort order.")
+        terms = []
+        values = []
+        for (i, key) in enumerate(keys):
+            term = []
+            for (k, v) in zip(keys[:i], last[:i]):
+                term.append(f"{k} IS (?)")
+                values.append(v)
+            if last[i] is None:
+                term.append(f"{key} IS NOT NULL")
+            else:
+                term.append(f"{key} > (?)")
+                values.append(last[i])
+            terms.append("(" + " AND ".join(term) + ")")
+        cond = " OR ".join(terms)
+        if last[0] is not None:
+            cond = f"{keys[0]} >= (?) AND ({cond})"
+            values.insert(0, last[0])
+        return (f"({cond})", values)
+
+    def get_schema(self) -> ColumnSchema:
+        """Return the column setup of this table, loaded once and cached."""
+        if self._schema is None:
+            keys = ",".join(ColumnSchema.KEYS)
+            rows = self.execute_dql(
+                f"SELECT {keys} FROM columns WHERE tablename=(?) ORDER BY col_idx ASC",
+                (self.name,)
+            )
+            if rows is None:
+                return ColumnSchema([])
+            self._schema = ColumnSchema(rows)
+        return self._schema
+
+    def invalidate_schema(self):
+        """Mark the cached column setup stale and load it again on next use."""
+        if self._schema is not None:
+            self._schema.stale = True
+            self._schema = None
 
     def get_column_setup(self, key: str, col: int=None):
         """Get a list or value for column setup.
@@ -381,6 +967,9 @@ class SQLTableBase:
         list
             List of setup values for this tables columns.
         """
+        if key in ColumnSchema.KEYS:
+            return self.get_schema().get(key, col)
+
         sql = """
             SELECT {k} FROM columns WHERE tablename=(?){c}ORDER BY col_idx ASC
         """
@@ -417,7 +1006,10 @@ class SQLTableBase:
             UPDATE columns SET {key}=(?) WHERE tablename=(?) and col_idx=(?)
         """
         values = (value, self.name, col)
-        return self.execute_dml(sql, values)
+        success = self.execute_dml(sql, values)
+        if success:
+            self.invalidate_schema()
+        return success
 
     def get_column_search(self):
         """Get a list of (key, label) tuples of the columns of this table.
@@ -487,17 +1079,15 @@ class SQLTableBase:
 
     def get_num_columns(self) -> int:
         """Return the number of columns."""
-        sql = "SELECT COUNT(*) FROM columns WHERE tablename=(?)"
-        num = self.execute_dql(sql, (self.name,))[0][0]
-        return num
+        return len(self.get_schema())
 
     def get_column_label(self, col: int) -> str:
         """Return the label of the column."""
-        return self.get_column_setup("label", col)
+        return self.get_schema().label(col)
 
     def get_column_type(self, col: int) -> str:
         """Return the type string of the column."""
-        return self.get_column_setup("type", col)
+        return self.get_schema().type(col)
 
     def get_column_width(self, col: int) -> int:
         """Return the type string of the column."""
@@ -512,57 +1102,109 @@ class SQLTableBase:
         return self.get_column_setup("ro")
 
     def create_undo_triggers(self):
-        """Format and create the undolog triggers."""
+        """Format and create the undolog triggers.
+
+        The entries record the operation, the primary key of the row and the
+        old values as a JSON object. Updates record only the changed columns.
+        See apply_undo for replaying the entries.
+
+        The triggers are stored in the database file and replaced with the
+        current definitions when called, see db.migrations.
+        """
         ins_keys = self.get_insert_keys(True)
-        set_strings = map(
-            lambda k: "{key}='||quote(old.{key})||'".format(key=k),
-            ins_keys
+        # Updates to only derived values are not user actions.
+        upd_keys = [k for k in ins_keys if k not in self.derived]
+        if self.derived:
+            upd_event = f"UPDATE OF {','.join(upd_keys)}"
+        else:
+            upd_event = "UPDATE"
+        changed = " UNION ALL ".join(
+            f"SELECT '{k}' AS k, old.{k} AS v WHERE old.{k} IS NOT new.{k}"
+            for k in upd_keys
         )
-        keys = ins_keys
-        value_strings = map(lambda k: f"'||quote(old.{k})||'", ins_keys)
+        old_values = ",".join(f"'{k}',old.{k}" for k in ins_keys)
         if self.foreign_key is None:
             fk_str = "NULL"
             dfk_str = "NULL"
         else:
-            fk_str = f"quote(new.{self.foreign_key})"
-            dfk_str = f"quote(old.{self.foreign_key})"
+            fk_str = f"new.{self.foreign_key}"
+            dfk_str = f"old.{self.foreign_key}"
 
         script = """
-        CREATE TEMP TRIGGER {t}_it AFTER INSERT ON {t} BEGIN
-            INSERT INTO undolog VALUES(
-                NULL,
-                {fk},
-                '{t}',
-                'DELETE FROM {t} WHERE {pk}='||new.{pk}
-                );
+        DROP TRIGGER IF EXISTS {t}_it;
+        DROP TRIGGER IF EXISTS {t}_ut;
+        DROP TRIGGER IF EXISTS {t}_dt;
+        CREATE TRIGGER {t}_it AFTER INSERT ON {t} BEGIN
+            INSERT INTO undolog(fk, tablename, op, pk, data)
+            VALUES({fk}, '{t}', 'I', new.{pk}, NULL);
         END;
-        CREATE TEMP TRIGGER {t}_ut AFTER UPDATE ON {t} BEGIN
-            INSERT INTO undolog VALUES(
-                NULL,
-                {fk},
-                '{t}',
-                'UPDATE {t} SET {s} WHERE {pk}='||old.{pk}
-            );
+        CREATE TRIGGER {t}_ut AFTER {ue} ON {t} BEGIN
+            INSERT INTO undolog(fk, tablename, op, pk, data)
+            SELECT {fk}, '{t}', 'U', new.{pk}, d
+            FROM (SELECT json_group_object(k, v) AS d FROM ({c}))
+            WHERE d<>'{{}}';
         END;
-        CREATE TEMP TRIGGER {t}_dt BEFORE DELETE ON {t} BEGIN
-            INSERT INTO undolog VALUES(
-                NULL,
-                {dfk},
-                '{t}',
-                'INSERT INTO {t}({k}) VALUES({v})'
-            );
+        CREATE TRIGGER {t}_dt BEFORE DELETE ON {t} BEGIN
+            INSERT INTO undolog(fk, tablename, op, pk, data)
+            VALUES({dfk}, '{t}', 'D', old.{pk}, json_object({o}));
         END;
         """.format(
             t=self.name,
+            ue=upd_event,
             fk=fk_str,
             dfk=dfk_str,
             pk=self.primary_key,
-            s=','.join(set_strings),
-            k=','.join(keys),
-            v=','.join(value_strings)
+            c=changed,
+            o=old_values
         )
         self.con.executescript(script)
 
+    def apply_undo(self, op: str, pk: int, data: str, tablename: str=None) -> bool:
+        """Replay an undolog entry reversing the recorded operation.
+
+        The SQL strings are the same for all entries with the same columns,
+        so the statements are prepared once and reused from the statement
+        cache of the connection.
+
+        Parameters
+        ----------
+        op : str
+            'I', 'U' or 'D' for the recorded insert, update or delete.
+        pk : int
+            Primary key of the row.
+        data : str
+            JSON object of the old values.
+        tablename : str, optional
+            Table of the entry, by default this table.
+        """
+        if tablename is None or tablename == self.name:
+            (name, key) = (self.name, self.primary_key)
+        else:
+            (name, key) = (tablename, self.get_primary_key(tablename))
+        if op == "I":
+            return self.execute_dml(f"DELETE FROM {name} WHERE {key}=(?)", (pk,))
+
+        values = json.loads(data)
+        keys = list(values)
+        if op == "U":
+            sets = ",".join(f"{k}=(?)" for k in keys)
+            sql = f"UPDATE {name} SET {sets} WHERE {key}=(?)"
+            return self.execute_dml(sql, list(values.values()) + [pk])
+
+        binds = ",".join(["?"] * len(keys))
+        sql = f"INSERT INTO {name}({','.join(keys)}) VALUES({binds})"
+        return self.execute_dml(sql, list(values.values()))
+
+    def get_primary_key(self, tablename: str) -> str:
+        """Return the name of the primary key column of a table."""
+        pks = SQLTableBase._primary_keys
+        if tablename not in pks:
+            pks[tablename] = next(
+                row[1] for row in self.con.execute(f"PRAGMA table_info({tablename})")
+                if row[5] == 1
+            )
+        return pks[tablename]
+
     def undo_freeze(self):
         """Stop accepting changes to undolog.
 
@@ -587,8 +1229,23 @@ class SQLTableBase:
         )
         _undo['freeze'] = -1
 
-    def undo_barrier(self, foreign_key: int):
-        """Create an undo barrier."""
+    def undo_barrier(self, foreign_key: int, all_tables: bool=False):
+        """Create an undo barrier.
+
+        The undolog entries since last barrier are saved as an undo step and
+        the redo steps are cleared. Steps exceeding 'undo_limit' are compacted
+        away starting from the oldest.
+
+        Parameters
+        ----------
+        foreign_key : int
+            Key to the undo stack of the step.
+        all_tables : bool, optional
+            Set True if the step replays the entries of all tables since the
+            last barrier of 'foreign_key', not only the entries of this table.
+            The caller must make sure the interval has no entries of other
+            steps, like batch does. Default False.
+        """
         _undo = SQLTableBase._undo
         SQLTableBase.pending = []
 
@@ -611,36 +1268,85 @@ class SQLTableBase:
         if begin > end:
             begin = end
 
-        try:
-            self.undostack[foreign_key].append((begin, end))
-        except KeyError:
-            self.undostack[foreign_key] = [(begin, end)]
-        self.redostack[foreign_key] = []
-
-        # for k, v in self.undostack.items():
-        #     # print("\nfk: {}".format(k))
-        #     for interval in v:
-        #         # print("\tinterval: {}".format(interval))
+        self.push_step(foreign_key, False, begin, end, all_tables)
+        self.clear_steps(foreign_key, True)
+        self.compact_steps(foreign_key)
 
     def can_undo(self, foreign_key: int) -> bool:
         """Return True if there is an action that can be undone."""
-        try:
-            return len(self.undostack[foreign_key]) > 0
-        except KeyError:
-            return False
+        return self.peek_step(foreign_key, False) is not None
 
     def can_redo(self, foreign_key: int) -> bool:
         """Return True if there is an action that can be redone."""
-        try:
-            return len(self.redostack[foreign_key]) > 0
-        except KeyError:
-            return False
+        return self.peek_step(foreign_key, True) is not None
+
+    def peek_step(self, foreign_key: int, is_redo: bool) -> tuple:
+        """Return the (step_id, begin, end, all_tables) of the last undo or redo step or None."""
+        result = self.execute_dql("""
+            SELECT step_id, begin, end, all_tables FROM undostep
+            WHERE tablename=(?) AND fk IS (?) AND redo=(?)
+            ORDER BY step_id DESC LIMIT 1
+        """, (self.name, foreign_key, int(is_redo)))
+        if not result:
+            return None
+        return result[0]
+
+    def push_step(self, foreign_key: int, is_redo: bool, begin: int, end: int,
+                  all_tables: bool=False):
+        """Add the undolog interval from 'begin' to 'end' as an undo or redo step."""
+        self.execute_dml("""
+            INSERT INTO undostep(tablename, fk, redo, begin, end, all_tables)
+            VALUES (?,?,?,?,?,?)
+        """, (self.name, foreign_key, int(is_redo), begin, end, int(all_tables)))
+
+    def clear_steps(self, foreign_key: int, is_redo: bool):
+        """Delete the undo or redo steps and their undolog entries."""
+        for (_, begin, end, all_tables) in self.execute_dql("""
+            SELECT step_id, begin, end, all_tables FROM undostep
+            WHERE tablename=(?) AND fk IS (?) AND redo=(?)
+        """, (self.name, foreign_key, int(is_redo))) or []:
+            self.delete_log(foreign_key, begin, end, all_tables)
+        self.execute_dml("""
+            DELETE FROM undostep WHERE tablename=(?) AND fk IS (?) AND redo=(?)
+        """, (self.name, foreign_key, int(is_redo)))
+
+    def compact_steps(self, foreign_key: int):
+        """Delete the oldest undo steps exceeding 'undo_limit'."""
+        old_steps = self.execute_dql("""
+            SELECT step_id, begin, end, all_tables FROM undostep
+            WHERE tablename=(?) AND fk IS (?) AND redo=0
+            ORDER BY step_id DESC LIMIT -1 OFFSET (?)
+        """, (self.name, foreign_key, SQLTableBase.undo_limit))
+        if not old_steps:
+            return
+        for (_, begin, end, all_tables) in old_steps:
+            if all_tables:
+                self.delete_log(foreign_key, begin, end, True)
+        last_end = max(step[2] for step in old_steps)
+        self.delete_log(foreign_key, None, last_end)
+        self.execute_dml("""
+            DELETE FROM undostep
+            WHERE tablename=(?) AND fk IS (?) AND redo=0 AND step_id<=(?)
+        """, (self.name, foreign_key, old_steps[0][0]))
+
+    def delete_log(self, foreign_key: int, begin: int, end: int, all_tables: bool=False):
+        """Delete the undolog entries of this table from 'begin' to 'end'.
+
+        Use None as 'begin' to delete all entries until 'end'. With
+        'all_tables' the entries of all tables in the interval are deleted.
+        """
+        if all_tables:
+            self.execute_dml("DELETE FROM undolog WHERE seq>=(?) AND seq<=(?)", (begin, end))
+            return
+        self.execute_dml("""
+            DELETE FROM undolog
+            WHERE tablename=(?) AND fk IS (?) AND seq>=(?) AND seq<=(?)
+        """, (self.name, foreign_key, 0 if begin is None else begin, end))
 
     def start_interval(self, foreign_key: int):
         """Record the starting seq value of the interval."""
         _undo = SQLTableBase._undo
-        _undo['firstlog'][foreign_key] = self.execute_dql(
-            "SELECT coalesce(max(seq),0)+1 FROM undolog")[0][0]
+        _undo['firstlog'][foreign_key] = self.get_undo_maxseq() + 1
 
     def get_undo_maxseq(self) -> int:
         """Return the max undolog 'seq' value."""
@@ -658,40 +1364,42 @@ class SQLTableBase:
             True for undo step, False for redo step.
         """
         _undo = SQLTableBase._undo
-        if is_undo:
-            (begin, end) = self.undostack[foreign_key].pop()
+        step = self.peek_step(foreign_key, not is_undo)
+        if step is None:
+            return
+        (step_id, begin, end, all_tables) = step
+        self.execute_dml("DELETE FROM undostep WHERE step_id=(?)", (step_id,))
+
+        if all_tables:
+            result = self.execute_dql("""
+                SELECT tablename, op, pk, data FROM undolog
+                WHERE seq>=(?) AND seq<=(?)
+                ORDER BY seq DESC
+            """, (begin, end))
         else:
-            (begin, end) = self.redostack[foreign_key].pop()
+            result = self.execute_dql("""
+                SELECT tablename, op, pk, data FROM undolog
+                WHERE
+                    tablename=(?) AND
+                    fk IS (?) AND
+                    seq>=(?) AND seq<=(?)
+                ORDER BY seq DESC
+            """, (self.name, foreign_key, begin, end))
 
-        result = self.execute_dql("""
-            SELECT sql FROM undolog
-            WHERE
-                tablename=(?) AND
-                foreign_key=(?) AND
-                seq>=(?) AND seq<=(?)
-            ORDER BY seq DESC
-        """, (self.name, foreign_key, begin, end))
-
-        self.execute_dml("""
-            DELETE FROM undolog
-            WHERE
-                tablename=(?) AND
-                foreign_key=(?) AND
-                seq>=(?) AND seq<=(?)
-        """, (self.name, foreign_key, begin, end))
+        self.delete_log(foreign_key, begin, end, all_tables)
 
         self.start_interval(foreign_key)
 
-        for (sql,) in result:
-            self.execute_dml(sql)
+        with transaction(self.con):
+            # Rows deleted by a cascade are restored before their parents.
+            self.con.execute("PRAGMA defer_foreign_keys = ON")
+            for (tablename, op, pk, data) in result or []:
+                self.apply_undo(op, pk, data, tablename)
 
         end = self.get_undo_maxseq()
         begin = _undo['firstlog'][foreign_key]
 
-        if is_undo:
-            self.redostack[foreign_key].append((begin, end))
-        else:
-            self.undostack[foreign_key].append((begin, end))
+        self.push_step(foreign_key, is_undo, begin, end, all_tables)
         self.start_interval(foreign_key)
 
     def format_for_insert(self, data):
@@ -704,11 +1412,31 @@ class SQLTableBase:
 
 
 class CatalogueTable(SQLTableBase):
-    """Super class for operations of a catalogue table."""
+    """Super class for operations of a catalogue table.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection used by the tables.
+    catalogue : type
+        SQLTableBase subclass of the catalogue table, created on first use.
+    """
     def __init__(self, connection, catalogue):
         super().__init__(connection)
-        catalogue.create()
-        self.catalogue = catalogue
+        self.catalogue_class = catalogue
+        self._catalogue = None
+
+    @property
+    def catalogue(self):
+        """The connected catalogue table, created on first use."""
+        if self._catalogue is None:
+            self._catalogue = self.catalogue_class(self.con)
+        return self._catalogue
+
+    def create(self):
+        """Create the catalogue table and this table."""
+        self.catalogue.create()
+        super().create()
 
     def get_catalogue_table(self):
         """Return the connected catalogue table."""
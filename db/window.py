@@ -0,0 +1,177 @@
+"""Windowed access to the rows of a table for the grids.
+
+RowWindow loads the rows in blocks of 'block_size' rows in primary key
+order, only when a row of the block is asked for. The blocks are kept in
+a bounded cache and the least recently used block is dropped when the
+cache is full, so the memory used depends on the visible rows and not on
+the size of the table. The number of rows is read from the maintained
+counts, see db.counts.
+
+The blocks are selected with SQLTableBase.select_page. The primary key
+of the last row before each loaded block is kept, so a dropped block and
+the block after it are selected again without an OFFSET.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+
+from db.super import decode_page_token, encode_page_token
+
+
+class RowWindow:
+    """Sequence of the rows of a table loaded in cached blocks.
+
+    Rows are returned as lists, the cached row can be changed in place
+    after it's values are written to the database.
+
+    Parameters
+    ----------
+    table : SQLTableBase
+        Table of the rows, or a proxy to one.
+    foreign_key : int, optional
+        Foreign key of the rows as in 'select', by default None
+    filt : dict, optional
+        Filter of the rows as in 'select', by default None
+    count : int, optional
+        Number of rows if known, by default read from the table when needed.
+    block_size : int, optional
+        Number of rows selected at a time, by default 100.
+    max_blocks : int, optional
+        Max number of cached blocks, by default 8.
+    prefetch : int, optional
+        Number of rows loaded before and after the asked row, by default 25.
+        Must be less than half of 'block_size'.
+    """
+    def __init__(self, table, foreign_key: int=None, filt: dict=None, count: int=None,
+                 block_size: int=100, max_blocks: int=8, prefetch: int=25):
+        if prefetch * 2 >= block_size:
+            raise ValueError(
+                f"RowWindow prefetch {prefetch} must be less than half of block size {block_size}")
+        self.table = table
+        self.foreign_key = foreign_key
+        self.filter = filt
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.prefetch = prefetch
+        self.n_rows = count
+        self.blocks = OrderedDict()     # {block: [rows]}, least recently used first.
+        self.bounds = {}                # {block: primary key of the last row before it}
+        self.loads = 0                  # Number of selects, for tests and profiling.
+
+    def set_source(self, foreign_key: int=None, filt: dict=None, count: int=None):
+        """Show the rows of another foreign key or filter."""
+        self.foreign_key = foreign_key
+        self.filter = filt
+        self.refresh(count)
+
+    def refresh(self, count: int=None):
+        """Drop the cached rows, they are loaded again when asked for.
+
+        Parameters
+        ----------
+        count : int, optional
+            The new number of rows if known.
+        """
+        self.n_rows = count
+        self.blocks.clear()
+        self.bounds.clear()
+
+    def __len__(self):
+        if self.n_rows is None:
+            self.n_rows = self.table.count_rows(self.foreign_key, self.filter)
+        return self.n_rows
+
+    def __getitem__(self, row: int) -> list:
+        """Return the row at position 'row', raises IndexError if it does not exist.
+
+        The blocks within 'prefetch' rows are loaded too, so the rows next
+        to the visible ones are ready when scrolled to. A row of a cached
+        block is read without loading unless it's within 'prefetch' rows of
+        a missing neighbour block.
+        """
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        (block, pos) = divmod(row, self.block_size)
+        if pos < self.prefetch:
+            neighbour = block - 1
+        elif pos >= self.block_size - self.prefetch:
+            neighbour = block + 1
+        else:
+            neighbour = block
+        if block not in self.blocks or (
+                neighbour not in self.blocks and
+                0 <= neighbour * self.block_size < len(self)):
+            self.load(row - self.prefetch, row + self.prefetch)
+        rows = self.blocks.get(block)
+        if rows is None:
+            raise IndexError(row)
+        self.blocks.move_to_end(block)
+        # The table has fewer rows than counted if it changed after counting.
+        return rows[pos]
+
+    def load(self, first: int, last: int):
+        """Load the blocks with rows from position 'first' to 'last' not in the cache.
+
+        Each run of consecutive missing blocks is selected at once.
+        """
+        first_block = max(first, 0) // self.block_size
+        last_block = min(last, len(self) - 1) // self.block_size
+        run = []
+        for block in range(first_block, last_block + 1):
+            if block in self.blocks:
+                self.blocks.move_to_end(block)
+                if run:
+                    self.load_blocks(run[0], len(run))
+                    run = []
+            else:
+                run.append(block)
+        if run:
+            self.load_blocks(run[0], len(run))
+
+        while len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+
+    def load_blocks(self, block: int, count: int):
+        """Select 'count' blocks starting from 'block' and add them to the cache."""
+        if block == 0:
+            token = None
+        elif block in self.bounds:
+            token = encode_page_token(None, [self.bounds[block]])
+        else:
+            token = self.table.get_offset_token(
+                self.foreign_key, self.filter, block * self.block_size)
+            if token is None:
+                return
+            self.bounds[block] = decode_page_token(token, None)[0]
+
+        (rows, _) = self.table.select_page(
+            self.foreign_key, self.filter, None, count * self.block_size, token)
+        self.loads += 1
+        for i in range(count):
+            start = i * self.block_size
+            rows_of_block = [list(row) for row in rows[start:start + self.block_size]]
+            if not rows_of_block:
+                break
+            self.blocks[block + i] = rows_of_block
+            self.bounds[block + i + 1] = rows_of_block[-1][0]
+
+    def patch(self, rows: list) -> list:
+        """Replace the cached rows with the same primary keys as 'rows'.
+
+        Rows not in the cache are loaded from the database when asked for.
+
+        Returns
+        -------
+        list
+            [(position, [changed columns]), ...] of the replaced rows.
+        """
+        changed = []
+        for row in rows:
+            for (block, cached) in self.blocks.items():
+                pos = bisect_left(cached, row[0], key=lambda r: r[0])
+                if pos < len(cached) and cached[pos][0] == row[0]:
+                    cols = [c for (c, v) in enumerate(row) if cached[pos][c] != v]
+                    cached[pos] = list(row)
+                    changed.append((block * self.block_size + pos, cols))
+                    break
+        return changed
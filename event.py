@@ -1,5 +1,7 @@
 """."""
 
+import threading
+
 GROUP_SELECT = 100  # [primary_key]
 GROUP_CHANGE = 101  # []
 
@@ -12,6 +14,9 @@ TABLE_ROW = 301     # [table_id, foreign_key, primary_key]
 class EventHandler:
     """."""
     queue = {}
+    # Function calling handlers in the main thread, like wx.CallAfter,
+    # used for events notified from other threads.
+    dispatch = None
 
     def bind(self, code, handler):
         """Bind an event."""
@@ -22,9 +27,15 @@ class EventHandler:
 
     def notify(self, code, event):
         """Notify of the occurance of an event."""
+        dispatch = EventHandler.dispatch
+        if threading.current_thread() is threading.main_thread():
+            dispatch = None
         try:
             for handler in self.queue[code]:
-                handler(event)
+                if dispatch is None:
+                    handler(event)
+                else:
+                    dispatch(handler, event)
         except KeyError:
             pass
 
@@ -1,9 +1,4 @@
-"""Classes for handling grids.
-
-TODO: GridBase.insert_rows should be changed to insert the whole row or multiple rows at once
-when db module supports it.
-
-"""
+"""Classes for handling grids."""
 
 from decimal import Decimal
 from types import FunctionType
@@ -14,6 +9,7 @@ import wx.grid as wxg
 from gui.grid_decimal_editor import GridDecimalEditor
 from db.super import SQLTableBase
 from db.database import connect
+from db.window import RowWindow
 
 
 class GridBase(wxg.GridTableBase):
@@ -21,6 +17,7 @@ class GridBase(wxg.GridTableBase):
         """Custom GridTableBase for grids using database as data source.
 
         Setting self.data as None will show an empty noneditable grid.
+        Otherwise it is a RowWindow loading the visible rows in blocks.
         Either filter or foreign key must not be None.
         To find everything in table with no foreign key set filter as
         an empty dictionary.
@@ -84,11 +81,7 @@ class GridBase(wxg.GridTableBase):
 
     def CanGetValueAs(self, row, col, type_name):
         """Test if value can be received as type."""
-        col_type = self.GetTypeName(row, col).split(":")[0]
-        if type_name == col_type:
-            return True
-        else:
-            return False
+        return type_name == self.db.get_schema().base_type(col)
 
     def CanSetValueAs(self, row, col, type_name):
         """Test if value can be set as type."""
@@ -118,10 +111,13 @@ class GridBase(wxg.GridTableBase):
         if rowid is not None:
             if isinstance(value, float):
                 value = Decimal(value)
-            success = self.db.update(rowid, col, value)
+            changed = self.db.update_cell(rowid, col, value)
 
-            if success:
-                self.update_data()
+            if changed is not None:
+                if is_last_row:
+                    self.update_data()
+                else:
+                    self.refresh_rows(changed)
                 return
 
             elif is_last_row:
@@ -183,11 +179,8 @@ class GridBase(wxg.GridTableBase):
         self.update_data()
     
     def insert_rows(self, rows: list):
-        """Set multiple rows of data to the grid."""
-        for row in rows:
-            pk = self.db.insert_empty(self.get_fk())
-            for col, value in enumerate(row):
-                self.db.update(pk, col, value)
+        """Set multiple rows of data to the grid as a single undo step."""
+        self.db.insert_rows(rows, self.get_fk())
 
     def update_data(self):
         """Update the displayed data from database."""
@@ -197,7 +190,10 @@ class GridBase(wxg.GridTableBase):
         except TypeError:
             oldn = 0
 
-        self.data = self.db.select(self.fk, self.filter)
+        if self.data is None:
+            self.data = RowWindow(self.db, self.fk, self.filter)
+        else:
+            self.data.set_source(self.fk, self.filter)
         # print("\nDATA FROM SELECT")
         # print(self.data)
         # print("\n")
@@ -216,6 +212,13 @@ class GridBase(wxg.GridTableBase):
         # self.DeleteRows(0, self.GetNumberRows() - 1)
         # self.AppendRows(newn + 1)
 
+    def refresh_rows(self, rows: list):
+        """Replace the changed rows in self.data and redraw only their cells."""
+        view = self.GetView()
+        for (row, cols) in self.data.patch(rows):
+            if cols:
+                view.RefreshBlock(row, min(cols), row, max(cols))
+
     def update_rows(self, old_row_count, new_row_count):
         """Update the number of rows in grid."""
         diff = new_row_count - old_row_count
@@ -244,6 +247,10 @@ class GridBase(wxg.GridTableBase):
         """Delete the data at given row."""
         self.db.delete(self.get_rowid(row))
 
+    def delete_rows_data(self, rows: list):
+        """Delete the data at given rows in one statement and undo step."""
+        return self.db.delete_many([self.get_rowid(row) for row in rows], self.fk)
+
     def is_init(self):
         """Return True if this grid table is connected to a source."""
         return self.fk is not None or self.filter is not None
@@ -383,7 +390,6 @@ class DbGrid(wxg.Grid):
         table: GridBase = self.GetTable()
         table.insert_rows(self.copied_rows)
         self.copied_rows = []
-        self.undo_barrier()
         self.update_content()
 
     def on_delete(self, evt):
@@ -392,12 +398,8 @@ class DbGrid(wxg.Grid):
 
     def delete(self):
         """Delete selected rows."""
-        selected_rows = self.GetSelectedRows()
-        selected_rows.sort(reverse=True)
-        for row in selected_rows:
-            self.delete_row(row)
+        self.GetTable().delete_rows_data(self.GetSelectedRows())
 
-        self.undo_barrier()
         self.update_content()
         self.ClearSelection()
         # self.ForceRefresh()
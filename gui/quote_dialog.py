@@ -0,0 +1,95 @@
+"""Dialog for creating, opening and deleting quotes."""
+
+import wx
+import wx.dataview as dv
+
+from quote import Quote
+from quote_index import list_changes
+from worker import call_async
+
+
+class QuoteDialog(wx.Dialog):
+    """Dialog for creating, opening and deleting quotes."""
+    def __init__(self, parent, quote):
+        super().__init__(parent, title="Valitse Tarjous",
+                         style=wx.RESIZE_BORDER)
+
+        self.quote: Quote = quote
+        self.rows = []      # [[quote_id, name]] shown in result
+        self.new_quote_btn = wx.Button(self, label="Uusi")
+        self.search = wx.SearchCtrl(self)
+        self.result: dv.DataViewListCtrl = dv.DataViewListCtrl(self, size=(-1, 350))
+        line = wx.StaticLine(self, size=(20, -1), style=wx.LI_HORIZONTAL)
+        btn_ok = wx.Button(self, wx.ID_OK)
+        btn_no = wx.Button(self, wx.ID_CANCEL)
+
+        self.result.AppendTextColumn("Tarjoukset")
+        btn_ok.SetDefault()
+
+        self.Bind(wx.EVT_SEARCH, self.on_search, self.search)
+        self.Bind(wx.EVT_TEXT, self.on_text, self.search)
+        self.Bind(wx.EVT_BUTTON, self.on_new, self.new_quote_btn)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        btn_sizer = wx.StdDialogButtonSizer()
+
+        btn_sizer.AddButton(btn_ok)
+        btn_sizer.AddButton(btn_no)
+        btn_sizer.Realize()
+
+        sizer.Add(self.new_quote_btn, 0, wx.EXPAND)
+        sizer.Add(self.search, 0, wx.EXPAND)
+        sizer.Add(self.result, 1, wx.EXPAND)
+        sizer.Add(line, 0, wx.EXPAND|wx.RIGHT|wx.TOP|wx.LEFT, 5)
+        sizer.Add(btn_sizer, 0, wx.EXPAND|wx.ALL, 5)
+
+        self.SetSizer(sizer)
+        sizer.Fit(self)
+
+    def on_search(self, evt):
+        """Handle search event."""
+        self.do_search(evt.GetString())
+
+    def on_text(self, _evt):
+        """Search as the text is typed."""
+        self.do_search(self.search.GetValue())
+
+    def on_new(self, _evt):
+        """Create a new quote."""
+        name = self.search.GetValue()
+        if name == "":
+            print("Can not create a quote with an empty name string.")
+            return
+        self.quote.new_quote(name)
+        self.do_search(name, True)
+
+    def get_selection(self):
+        """Return the selected item as [id, name]."""
+        item = self.result.GetSelection()
+        if item.IsOk():
+            row = self.result.ItemToRow(item)
+            return [self.result.GetItemData(item), self.result.GetValue(row, 0)]
+        return None
+
+    def do_search(self, name, select_first=False):
+        """Start a search replacing the unfinished one."""
+        call_async(
+            self.quote, "get_quotes", name,
+            key="quote_search",
+            callback=lambda quotes: self.show_results(quotes, select_first)
+        )
+
+    def show_results(self, quotes, select_first=False):
+        """Update the result list to the found quotes.
+
+        Only the changed rows are deleted and inserted.
+        """
+        for change in list_changes(self.rows, quotes):
+            if change[0] == "delete":
+                self.result.DeleteItem(change[1])
+            else:
+                (_, pos, row) = change
+                self.result.InsertItem(pos, [row[1]], row[0])
+        self.rows = quotes
+        if select_first and len(quotes) > 0:
+            self.result.SelectRow(0)
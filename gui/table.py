@@ -7,6 +7,8 @@ from decimal import Decimal
 import wx.grid as wxg
 
 from quote import Quote
+from worker import call_async
+from db.window import RowWindow
 from gui.grid_decimal_editor import GridDecimalEditor
 import event as evt
 
@@ -17,18 +19,26 @@ class TableBase(wxg.GridTableBase):
         super().__init__()
         self.quote: Quote = quote
         self.table = table
-        self.data = []
+        # Rows are loaded in blocks when drawn, empty until the first update.
+        self.data = RowWindow(quote.select_table(table), count=0)
+        self.schema = None
 
     def GetNumberRows(self):
         """Return the number of rows on display."""
-        try:
-            return len(self.data)
-        except TypeError:
-            return 0
+        return len(self.data)
+
+    def get_schema(self):
+        """Return the cached column schema, fetched again when stale.
+
+        wx asks for the column metadata for every cell it draws.
+        """
+        if self.schema is None or self.schema.stale:
+            self.schema = self.quote.col_schema(self.table)
+        return self.schema
 
     def GetNumberCols(self):
         """Return the number of columns."""
-        return self.quote.n_cols(self.table)
+        return len(self.get_schema())
 
     def IsEmptyCell(self, row, col):
         """Return true if given cell is empty.
@@ -47,18 +57,15 @@ class TableBase(wxg.GridTableBase):
 
     def GetColLabelValue(self, col):
         """Return the column label."""
-        return self.quote.col_label(self.table, col)
+        return self.get_schema().label(col)
 
     def GetTypeName(self, _row, col):
         """Return the type name."""
-        return self.quote.col_type(self.table, col)
+        return self.get_schema().type(col)
 
-    def CanGetValueAs(self, row, col, type_name):
+    def CanGetValueAs(self, _row, col, type_name):
         """Test if value can be received as type."""
-        col_type = self.GetTypeName(row, col).split(":")[0]
-        if type_name == col_type:
-            return True
-        return False
+        return type_name == self.get_schema().base_type(col)
 
     def CanSetValueAs(self, row, col, type_name):
         """Test if value can be set as type."""
@@ -76,14 +83,15 @@ class TableBase(wxg.GridTableBase):
             if isinstance(value, float):
                 value = Decimal(value)
 
-            if not self.quote.set_cell(self.table, primary_key, col, value):
+            changed = self.quote.set_cell(self.table, primary_key, col, value)
+            if changed is None:
                 print("\nGridBase.SetValue update value failed.")
                 # print(f"\ttable: {self.table}")
                 # print(f"\t(row, col): ({row}, {col})")
                 # print(f"\tpk_value: {pk_value}")
                 # print(f"\tvalue: {value}")
             else:
-                self.data[row][col] = value
+                self.refresh_rows(changed)
 
     def AppendRows(self, numRows):
         """Append rows to the grid."""
@@ -137,6 +145,13 @@ class TableBase(wxg.GridTableBase):
         except IndexError:
             return None
 
+    def refresh_rows(self, rows: list):
+        """Replace the changed rows in self.data and redraw only their cells."""
+        view = self.GetView()
+        for (row, cols) in self.data.patch(rows):
+            if cols:
+                view.RefreshBlock(row, min(cols), row, max(cols))
+
     def update_rows(self, old, new):
         """Update the number of rows displayed."""
         diff = new - old
@@ -159,7 +174,7 @@ class Table(wxg.Grid, evt.EventHandler):
         self.RegisterDataType("decimal", None, GridDecimalEditor())
 
         # Set column attributes.
-        read_only_list = self.db().get_column_read_only()
+        read_only_list = self.GetTable().get_schema().get("ro")
         for col, ro in enumerate(read_only_list):
             if ro == 1:
                 attr = wxg.GridCellAttr()
@@ -210,21 +225,25 @@ class Table(wxg.Grid, evt.EventHandler):
 
 
     def update(self, _data):
-        """Update the contents of this table."""
-        content = self.GetTable().data
-        try:
-            oldn = len(content)
-        except TypeError:
-            oldn = 0
-
-        content = self.db().select(self.group())
-
-        try:
-            newn = len(content)
-        except TypeError:
-            newn = 0
-
-        self.GetTable().update_rows(oldn, newn)
+        """Update the contents of this table.
+
+        The count runs in the database worker, a newer update supersedes it.
+        The rows are loaded when drawn, see db.window.RowWindow.
+        """
+        group = self.group()
+        call_async(
+            self.db(), "count_rows", group,
+            key=("table", self.table),
+            callback=lambda count: self.set_content(group, count)
+        )
+
+    def set_content(self, group, count):
+        """Show the 'count' rows of the group."""
+        data = self.GetTable().data
+        oldn = len(data)
+        data.set_source(group, None, count)
+
+        self.GetTable().update_rows(oldn, count)
         self.ForceRefresh()
 
     ###########################################
@@ -1,25 +1,64 @@
 """Main application"""
+import sys
+
 import wx
 
-from gui.main_panel import MainPanel
-from gui.frame import Frame
-from quote import Quote
+from timing import Phases
+import event
 
 
 def main():
     """Main app"""
+    phases = Phases()
+
+    with phases.phase("wx.App"):
+        app = wx.App()
+
+    # The database is opened in the worker thread while the GUI is imported.
+    with phases.phase("start database"):
+        from quote import Quote
+        from db.super import SQLTableBase
+        from worker import Worker, WorkerProxy
+        worker = Worker(Quote, wx.CallAfter, wait=False)
+
+    with phases.phase("import gui"):
+        from gui.main_panel import MainPanel
+        from gui.frame import Frame
+
+    # The database is used only in the worker thread.
+    with phases.phase("open database"):
+        worker.wait()
+        quote = WorkerProxy(worker, wrap=(SQLTableBase,))
+        event.EventHandler.dispatch = wx.CallAfter
 
-    quote = Quote()
     # Open for testing.
     quote.state.open_quote = 1
     quote.state.open_group = 1
 
-    app = wx.App()
+    with phases.phase("create frame"):
+        frame = Frame()
+        MainPanel(frame, quote)
+
+    # Commit cell edits on time, when the app loses focus and on close.
+    quote.commits.schedule = worker.call_later
+
+    def on_activate(evt):
+        if not evt.GetActive():
+            quote.flush()
+        evt.Skip()
+
+    def on_close(evt):
+        quote.close()
+        worker.close()
+        evt.Skip()
 
-    frame = Frame()
-    MainPanel(frame, quote)
+    frame.Bind(wx.EVT_ACTIVATE, on_activate)
+    frame.Bind(wx.EVT_CLOSE, on_close)
 
-    frame.Show()
+    with phases.phase("show frame"):
+        frame.Show()
+    if Phases.enabled():
+        print(phases.report(), file=sys.stderr)
     app.MainLoop()
 
 
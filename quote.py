@@ -1,6 +1,7 @@
 """Interface for database and container for app state"""
 
 from db.database import Database
+from quote_index import QuoteIndex
 import values as val
 #from event import EventHandler
 import event as evt
@@ -19,8 +20,11 @@ class AppState:
 class Quote(evt.EventHandler):
     """Interface for database class."""
     def __init__(self):
-        self.database: Database = Database("test", True, True, True)
+        self.database: Database = Database("test", True, True, True, profile="interactive")
         self.state = AppState()
+        # Coalesce cell edits, set commits.schedule to commit on time.
+        self.commits = self.database.commits
+        self.quote_index = QuoteIndex(self.load_quote_names)
 
     def get_group_list(self, quote_id: int=None):
         """Return a list of groups in quote as [[group_id, name], ...]
@@ -49,21 +53,24 @@ class Quote(evt.EventHandler):
         self.notify(evt.GROUP_CHANGE, evt.Event(self, [name]))
 
     def delete_groups(self, items: list):
-        """Delete groups with ids given in items list"""
-        for i in items:
-            if i == self.state.open_group:
-                self.state.open_group = None
-                self.notify(evt.GROUP_SELECT, evt.Event(self, [i]))
-                #self.state.event(val.EVT_SELECT_GROUP)
+        """Delete groups with ids given in items list.
 
-            success = self.database.groups.delete(i)
-            if not success:
-                print(f"Failed to delete group with id '{i}'.")
+        The groups are deleted in one statement and undo step.
+        """
+        if self.state.open_group in items:
+            closed = self.state.open_group
+            self.state.open_group = None
+            self.notify(evt.GROUP_SELECT, evt.Event(self, [closed]))
+            #self.state.event(val.EVT_SELECT_GROUP)
+
+        if self.database.groups.delete_many(items, self.state.open_quote) is None:
+            print(f"Failed to delete groups with ids '{items}'.")
 
         self.notify(evt.GROUP_CHANGE, evt.Event(self, []))
 
     def select_group(self, group_id):
         """Select a group and run the events bound to it."""
+        self.commits.flush()
         self.state.open_group = group_id
         # self.state.event(val.EVT_SELECT_GROUP)
         self.notify(evt.GROUP_SELECT, evt.Event(self, [group_id]))
@@ -82,11 +89,16 @@ class Quote(evt.EventHandler):
             print(f"Could not find the group name with id {group_id}")
             return ""
 
-    def get_quotes(self, search_term):
-        """Return a list of [quote_id, quote_name] matching the search term."""
-        filt = {1: ["like", f"{search_term}%"]}
-        result = self.database.offers.select(filt=filt, pagination=(10,0))
-        return [[row[0], row[1]] for row in result]
+    def get_quotes(self, search_term, limit: int=100):
+        """Return a list of [quote_id, quote_name] matching the search term.
+
+        Searches the in-memory QuoteIndex, sorted by name.
+        """
+        return self.quote_index.search(search_term, limit)
+
+    def load_quote_names(self):
+        """Return the (quote_id, name) of all quotes for the QuoteIndex."""
+        return self.database.offers.execute_dql("SELECT offer_id, name FROM offers") or []
 
     def open_quote(self, quote_id, label):
         """Open the given quote."""
@@ -101,6 +113,7 @@ class Quote(evt.EventHandler):
         primary_key = self.database.offers.insert_empty()
         if primary_key:
             if self.database.offers.update(primary_key, val.COL_QUOTE_NAME, name):
+                self.quote_index.add(primary_key, name)
                 return primary_key
 
             self.database.offers.delete(primary_key)
@@ -147,13 +160,19 @@ class Quote(evt.EventHandler):
         """Return the number of columns in the table."""
         table = self.select_table(table_id)
         try:
-            i = table.get_num_columns()
-            print(f"NCOLS: {i}")
-            return i
+            return table.get_num_columns()
         except AttributeError:
             print(f"Table id {table_id} is not a valid table.")
             return 0
 
+    def col_schema(self, table_id):
+        """Return the ColumnSchema of the table.
+
+        The schema is replaced when the column setup changes, check it's
+        'stale' attribute before use.
+        """
+        return self.select_table(table_id).get_schema()
+
     def col_label(self, table_id, col):
         """Return the label for the column."""
         table = self.select_table(table_id)
@@ -164,17 +183,21 @@ class Quote(evt.EventHandler):
         table = self.select_table(table_id)
         return table.get_column_type(col)
 
-    def set_cell(self, table_id, primary_key, col, value) -> bool:
+    def set_cell(self, table_id, primary_key, col, value) -> list:
         """Set the value of a cell in table.
 
-        Return True on success.
+        Return the rows changed by the edit, see SQLTableBase.update_cell.
+        None on failure.
         """
         table = self.select_table(table_id)
-        success = table.update(primary_key, col, value)
+        changed = self.commits.write(table.update_cell, primary_key, col, value)
+        success = changed is not None
+        if success and table_id == val.TBL_QUOTE and col == val.COL_QUOTE_NAME:
+            self.quote_index.add(primary_key, value)
         if success:
             self.notify(evt.TABLE_CELL, evt.Event(self, [
                 table_id, primary_key, col, value]))
-        return success
+        return changed
 
     def table_update(self, table_id, _col):
         """Handle the update of a value in a table.
@@ -183,6 +206,14 @@ class Quote(evt.EventHandler):
         """
         _table = self.select_table(table_id)
 
+    def flush(self):
+        """Commit the pending cell edits."""
+        self.commits.flush()
+
+    def close(self):
+        """Commit the pending cell edits and close the database."""
+        self.database.close()
+
     def undo_barrier(self, table, group_id):
         """Create an undo barrier."""
         self.select_table(table).undo_barrier(group_id)
@@ -0,0 +1,157 @@
+"""In-memory index of the quote names for the search as you type.
+
+The words of each name are kept in a sorted list. A search finds the
+names with a word starting with each word of the search text, like the
+full-text search of the database. A search that refines the previous one
+filters it's results without searching the whole index.
+"""
+
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+
+from db.fts import WORD
+
+
+def fold(text: str) -> list:
+    """Return the casefolded words of text."""
+    return WORD.findall(text.casefold()) if text else []
+
+
+class QuoteIndex:
+    """Sorted word index of the quote names, loaded on first search.
+
+    Parameters
+    ----------
+    loader : callable
+        Returns the quotes as an iterable of (quote_id, name).
+    """
+    def __init__(self, loader):
+        self.loader = loader
+        self.names = None       # {quote_id: name}
+        self.folded = None      # {quote_id: (casefolded name, (words))}
+        self.words = None       # Sorted [(word, quote_id)]
+        self.last = (None, [])  # (words of the last search, it's sorted ids)
+
+    def load(self):
+        """Load the names if not loaded."""
+        if self.names is not None:
+            return
+        self.names = {}
+        self.folded = {}
+        self.words = []
+        for (quote_id, name) in self.loader():
+            self.set_name(quote_id, name)
+            self.words.extend((w, quote_id) for w in self.folded[quote_id][1])
+        self.words.sort()
+        self.last = (None, [])
+
+    def invalidate(self):
+        """Load the names again on next search."""
+        self.names = None
+        self.folded = None
+        self.words = None
+        self.last = (None, [])
+
+    def set_name(self, quote_id: int, name: str):
+        """Set the name and it's folded forms."""
+        name = name or ""
+        self.names[quote_id] = name
+        self.folded[quote_id] = (name.casefold(), tuple(fold(name)))
+
+    def sort_key(self, quote_id: int) -> tuple:
+        """Return the key sorting the results by name."""
+        return (self.folded[quote_id][0], quote_id)
+
+    def find_prefix(self, prefix: str) -> set:
+        """Return the ids of quotes with a word starting with prefix."""
+        found = set()
+        i = bisect_left(self.words, (prefix,))
+        while i < len(self.words) and self.words[i][0].startswith(prefix):
+            found.add(self.words[i][1])
+            i += 1
+        return found
+
+    def matches(self, quote_id: int, prefixes: list) -> bool:
+        """Return True if the name has a word starting with each prefix."""
+        words = self.folded[quote_id][1]
+        return all(any(w.startswith(p) for w in words) for p in prefixes)
+
+    def search(self, text: str, limit: int=None) -> list:
+        """Return [[quote_id, name], ...] of the names matching text.
+
+        Parameters
+        ----------
+        text : str
+            Search text, an empty text matches all quotes.
+        limit : int, optional
+            Max number of results, by default all.
+        """
+        self.load()
+        prefixes = fold(text)
+        (last_prefixes, last_ids) = self.last
+        if not prefixes:
+            ids = sorted(self.names, key=self.sort_key)
+        elif last_prefixes and self.refines(prefixes, last_prefixes):
+            ids = [i for i in last_ids if self.matches(i, prefixes)]
+        else:
+            ids = self.find_prefix(prefixes[0])
+            if len(prefixes) > 1:
+                ids = [i for i in ids if self.matches(i, prefixes[1:])]
+            ids = sorted(ids, key=self.sort_key)
+        self.last = (prefixes, ids)
+        return [[i, self.names[i]] for i in ids[:limit]]
+
+    @staticmethod
+    def refines(prefixes: list, previous: list) -> bool:
+        """Return True if the results of prefixes are within previous results."""
+        if len(prefixes) < len(previous):
+            return False
+        return all(p.startswith(q) for (p, q) in zip(prefixes, previous))
+
+    def add(self, quote_id: int, name: str):
+        """Add or rename a quote."""
+        if self.names is None:
+            return
+        if quote_id in self.names:
+            self.remove(quote_id)
+        self.set_name(quote_id, name)
+        for word in self.folded[quote_id][1]:
+            insort(self.words, (word, quote_id))
+        self.last = (None, [])
+
+    def remove(self, quote_id: int):
+        """Remove a quote."""
+        if self.names is None or quote_id not in self.names:
+            return
+        del self.names[quote_id]
+        for word in self.folded.pop(quote_id)[1]:
+            i = bisect_left(self.words, (word, quote_id))
+            if i < len(self.words) and self.words[i] == (word, quote_id):
+                del self.words[i]
+        self.last = (None, [])
+
+
+def list_changes(old: list, new: list) -> list:
+    """Return the edits turning the list of old rows to new rows.
+
+    Rows are compared as tuples, so a renamed row is replaced. The edits
+    are in the order they are applied and the positions are valid at the
+    time of each edit.
+
+    Returns
+    -------
+    list
+        [("delete", position) | ("insert", position, row)]
+    """
+    old_rows = [tuple(row) for row in old]
+    new_rows = [tuple(row) for row in new]
+    changes = []
+    opcodes = SequenceMatcher(None, old_rows, new_rows, autojunk=False).get_opcodes()
+    for (tag, i1, i2, j1, j2) in reversed(opcodes):
+        if tag == "equal":
+            continue
+        for pos in range(i2 - 1, i1 - 1, -1):
+            changes.append(("delete", pos))
+        for (offset, row) in enumerate(new[j1:j2]):
+            changes.append(("insert", i1 + offset, row))
+    return changes
@@ -0,0 +1,83 @@
+"""Measure the startup phases of the app without the GUI.
+
+Every run starts a new interpreter so the imports are measured like on the
+start of the app. The median of each phase over the runs is printed in the
+format of timing.Phases. Run with 'python -X importtime startup_benchmark.py'
+to also print the import times of each run.
+
+Usage:
+    python startup_benchmark.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+RUN = """
+import json, sys
+from timing import Phases
+phases = Phases()
+with phases.phase("import quote"):
+    import quote
+    from db.database import Database
+with phases.phase("create database"):
+    Database(sys.argv[2]).close()
+with phases.phase("open database"):
+    database = Database(sys.argv[1], profile="interactive")
+with phases.phase("first select"):
+    database.groups.select(1)
+    database.group_parts.select(1)
+try:
+    with phases.phase("import gui"):
+        import gui.main_panel
+except ImportError:
+    phases.records.pop()
+database.close()
+print(json.dumps(phases.records))
+"""
+
+
+def run_once(path: str, new_path: str) -> list:
+    """Run the phases in a new interpreter and return the records."""
+    options = ["-X", "importtime"] if "importtime" in sys._xoptions else []
+    result = subprocess.run(
+        [sys.executable] + options + ["-c", RUN, path, new_path],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if options:
+        print(result.stderr, file=sys.stderr)
+    if os.path.exists(new_path):
+        os.remove(new_path)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main(runs: int=5):
+    """Print the median time of each phase over the runs."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from db.database import Database
+    from timing import Phases
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database = Database(path)
+        offer_id = database.offers.insert(["offer"] + [None] * 9)
+        database.groups.insert([offer_id, "group"])
+        database.close()
+
+        results = [run_once(path, os.path.join(tmp, "new.db")) for _ in range(runs)]
+
+    phases = Phases()
+    for (i, (depth, name, _, _)) in enumerate(results[0]):
+        own = statistics.median(r[i][2] for r in results)
+        total = statistics.median(r[i][3] for r in results)
+        phases.records.append((depth, name, own, total))
+    print(f"Median of {runs} runs:")
+    print(phases.report())
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
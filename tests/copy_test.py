@@ -0,0 +1,101 @@
+from decimal import Decimal
+import unittest
+
+from db.database import Database
+
+
+class TestCopy(unittest.TestCase):
+    """Test copying groups and offers with their content."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.offer_id = self.db.offers.insert(["template", "Matti"] + [None] * 8)
+        self.groups = []
+        for g in range(3):
+            group_id = self.db.groups.insert([self.offer_id, f"g{g}"])
+            self.groups.append(group_id)
+            self.db.group_predefs.insert([group_id, "sivu", "M1"])
+            self.db.group_materials.insert([
+                group_id, "M1", None, None, None, 18, "varasto", "€/m2",
+                Decimal('10.00'), None, None, None, None
+            ])
+            for p in range(2):
+                product_id = self.db.group_products.insert([
+                    group_id, f"P{p}", 1, None, None, None, 600, 800, 500, None, None
+                ])
+                self.db.group_parts.insert([
+                    [product_id, "sivu", 2, None, None, 1, None, None, None, None,
+                     "=tleveys", "=tkorkeus - mpaksuus", "=12.5"],
+                    [product_id, "hylly", 1, None, None, 0, "M1", None, None, None,
+                     '="sivu".leveys', None, None],
+                ], True)
+                self.db.group_parts.select(product_id)
+        self.db.groups.undo_barrier(self.offer_id)
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def content(self, offer_id):
+        """Return the content of the offer without the primary and foreign keys."""
+        rows = []
+        for group in self.db.groups.select(offer_id):
+            rows.append(group[2:])
+            rows.extend(r[2:] for r in self.db.group_predefs.select(group[0]))
+            rows.extend(r[2:] for r in self.db.group_materials.select(group[0]))
+            for product in self.db.group_products.select(group[0]):
+                rows.append(product[2:])
+                # Column 20 is the group id of the product.
+                rows.extend(r[2:20] + r[21:] for r in self.db.group_parts.select(product[0]))
+        return rows
+
+    def test_copy_offer(self):
+        new_id = self.db.copy_offer(self.offer_id)
+        self.assertEqual(self.db.offers.select_keys([new_id])[0][1:3], ("template (2)", "Matti"))
+        self.assertEqual(self.content(new_id), self.content(self.offer_id))
+        self.assertEqual(len(self.content(new_id)), 3 * (3 + 2 * 3))
+        self.assertEqual(self.db.get_offer_cost(new_id), self.db.get_offer_cost(self.offer_id))
+        self.assertGreater(self.db.get_offer_cost(new_id), 0)
+
+        self.assertEqual(self.db.copy_offer(self.offer_id, "named"), new_id + 1)
+        self.assertEqual(self.db.get_copy_name("offers", "template"), "template (3)")
+        self.assertIsNone(self.db.copy_offer(999))
+
+    def test_copy_group(self):
+        new_id = self.db.copy_group(self.groups[1], self.offer_id)
+        self.assertEqual(self.db.groups.select_keys([new_id])[0][1:], (self.offer_id, "g1 (2)"))
+        content = self.content(self.offer_id)
+        self.assertEqual(content[-9:], [("g1 (2)",)] + content[10:18])
+
+        other = self.db.offers.insert(["other"] + [None] * 9)
+        self.assertEqual(self.db.groups.select_keys([self.db.copy_group(new_id, other)])[0][2],
+                         "g1 (2)")
+        self.assertIsNone(self.db.copy_group(999, other))
+
+    def test_copy_name_with_wildcards(self):
+        for name in ("50% off", "50x off", "50% off (2)", "a_b", "axb (2)", "Template (2)"):
+            self.db.offers.insert([name] + [None] * 9)
+        self.assertEqual(self.db.get_copy_name("offers", "50% off"), "50% off (3)")
+        self.assertEqual(self.db.get_copy_name("offers", "a_b"), "a_b (2)")
+        self.assertEqual(self.db.get_copy_name("offers", "template"), "template (2)")
+
+    def test_undo(self):
+        n_log = self.db.con.execute("SELECT COUNT(*) FROM undolog").fetchone()[0]
+        new_id = self.db.copy_group(self.groups[0], self.offer_id)
+        self.assertEqual(
+            self.db.con.execute("SELECT COUNT(*) FROM undolog").fetchone()[0], n_log + 1)
+
+        self.db.groups.undo(self.offer_id)
+        self.assertEqual(self.db.groups.select_keys([new_id]), [])
+        self.assertEqual(self.db.group_parts.count_rows(), 12)
+        self.db.groups.redo(self.offer_id)
+        self.assertEqual(self.content(self.offer_id)[-8:], self.content(self.offer_id)[1:9])
+
+    def test_failure_rolls_back(self):
+        self.db.con.execute("""
+            CREATE TRIGGER fail_copy BEFORE INSERT ON group_parts
+            WHEN new.part='hylly' AND new.group_product_id>6 BEGIN
+                SELECT RAISE(ABORT, 'no shelves');
+            END
+        """)
+        self.assertIsNone(self.db.copy_offer(self.offer_id))
+        self.assertEqual(self.db.offers.count_rows(), 1)
+        self.assertEqual(self.db.group_products.count_rows(), 6)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from db.database import Database
+
+
+class TestCostRollups(unittest.TestCase):
+    """Test that the cost rollups follow the changes in source tables."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.db.con.execute("UPDATE variables SET value_decimal=3000 WHERE variable_id=0")
+        self.db.con.commit()
+        self.offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([self.offer_id, "group"])
+        self.product_id = self.db.group_products.insert([
+            self.group_id, "P1", 1, None, None, None, 600, 800, 500,
+            Decimal('1.00'), Decimal('2.50')
+        ])
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def insert_part(self, product_id, part, cost):
+        self.db.con.execute(
+            "INSERT INTO group_parts(group_product_id, part, cost) VALUES (?,?,?)",
+            (product_id, part, cost)
+        )
+
+    def reference_costs(self):
+        """Return the group costs computed from the source tables."""
+        return self.db.con.execute("""
+            SELECT g.group_id, coalesce(SUM(
+                coalesce((SELECT SUM(cost) FROM group_parts AS a
+                          WHERE a.group_product_id=p.group_product_id), 0)
+                + (p.work_time * 3000 + 50) / 100
+            ), 0)
+            FROM groups AS g LEFT JOIN group_products AS p USING(group_id)
+            GROUP BY g.group_id ORDER BY g.group_id
+        """).fetchall()
+
+    def rollup_costs(self):
+        return self.db.con.execute(
+            "SELECT group_id, tot_cost FROM group_costs ORDER BY group_id"
+        ).fetchall()
+
+    def test_product_costs(self):
+        self.insert_part(self.product_id, "a", 725)
+        self.insert_part(self.product_id, "b", 100)
+        row = self.db.group_products.select(self.group_id)[0]
+        self.assertEqual(row[12], Decimal('8.25'))
+        self.assertEqual(row[13], Decimal('83.25'))
+
+    def test_group_and_offer_costs(self):
+        self.insert_part(self.product_id, "a", 725)
+        group_id = self.db.groups.insert([self.offer_id, "group 2"])
+        product_id = self.db.group_products.insert([
+            group_id, "P2", 1, None, None, None, 1, 1, 1, None, Decimal('1.00')
+        ])
+        self.insert_part(product_id, "a", 1000)
+        self.assertEqual(self.rollup_costs(), self.reference_costs())
+        costs = self.db.get_group_costs(self.offer_id)
+        self.assertEqual([c[2] for c in costs], [Decimal('82.25'), Decimal('40.00')])
+        self.assertEqual(self.db.get_offer_cost(self.offer_id), Decimal('122.25'))
+
+    def test_updates_and_deletes(self):
+        self.insert_part(self.product_id, "a", 725)
+        group_id = self.db.groups.insert([self.offer_id, "group 2"])
+        self.db.con.execute(
+            "UPDATE group_parts SET cost=900 WHERE group_product_id=?", (self.product_id,)
+        )
+        self.db.group_products.update(self.product_id, 11, Decimal('1.00'))
+        self.assertEqual(self.rollup_costs(), self.reference_costs())
+
+        self.db.group_products.update(self.product_id, 1, group_id)
+        self.assertEqual(self.rollup_costs(), self.reference_costs())
+
+        self.db.con.execute("UPDATE variables SET value_decimal=1000 WHERE variable_id=0")
+        self.assertEqual(self.db.get_offer_cost(self.offer_id), Decimal('19.00'))
+
+        self.db.groups.delete(group_id)
+        self.assertEqual(self.db.get_offer_cost(self.offer_id), Decimal('0.00'))
+
+    def test_cascade_delete(self):
+        self.insert_part(self.product_id, "a", 725)
+        self.db.group_products.delete(self.product_id)
+        self.assertEqual(self.db.get_offer_cost(self.offer_id), Decimal('0.00'))
+        count = self.db.con.execute("SELECT COUNT(*) FROM product_costs").fetchone()[0]
+        self.assertEqual(count, 0)
+
+
+class TestCostRollupsRefresh(unittest.TestCase):
+    """Test filling the rollups of a database created without them."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        database = Database(self.path)
+        offer_id = database.offers.insert(["offer"] + [None] * 9)
+        group_id = database.groups.insert([offer_id, "group"])
+        product_id = database.group_products.insert([
+            group_id, "P1", 1, None, None, None, 1, 1, 1, None, None
+        ])
+        database.con.execute(
+            "INSERT INTO group_parts(group_product_id, part, cost) VALUES (?,?,?)",
+            (product_id, "a", 500)
+        )
+        for table in database.costs.TABLES:
+            database.con.execute(f"DROP TABLE {table}")
+        # Written by a version without schema versions.
+        database.con.execute("PRAGMA user_version = 0")
+        database.con.commit()
+        database.con.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_refresh(self):
+        database = Database(self.path)
+        self.assertEqual(database.get_offer_cost(1), Decimal('5.00'))
+        database.con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+from decimal import Decimal
+import unittest
+
+from db.database import Database
+
+
+class TestDeleteMany(unittest.TestCase):
+    """Test deleting sets of rows in one statement and undo step."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.groups = [self.db.groups.insert([self.offer_id, f"g{i}"]) for i in range(4)]
+        for group_id in self.groups:
+            self.db.group_predefs.insert([[group_id, f"p{i}", None] for i in range(3)], True)
+        self.db.groups.undo_barrier(self.offer_id)
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_delete_with_cascade_and_undo(self):
+        groups = self.db.groups
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        self.assertEqual(groups.delete_many(self.groups[1:3] + [self.groups[1]], self.offer_id), 2)
+        self.db.con.set_trace_callback(None)
+        self.assertEqual({s for s in statements if s.startswith("DELETE FROM groups")}, {
+            f"DELETE FROM groups WHERE group_id IN ({self.groups[1]},{self.groups[2]})"
+        })
+        self.assertEqual(statements.count("COMMIT"), 1)
+
+        self.assertEqual([r[0] for r in groups.select(self.offer_id)],
+                         [self.groups[0], self.groups[3]])
+        self.assertEqual(self.db.group_predefs.count_rows(), 6)
+
+        groups.undo(self.offer_id)
+        self.assertEqual(len(groups.select(self.offer_id)), 4)
+
+    def test_undo_restores_cascaded_rows(self):
+        db = self.db
+        for group_id in self.groups[:2]:
+            db.group_materials.insert([
+                group_id, "M1", None, None, None, 18, "varasto", "€/m2",
+                Decimal('10.00'), None, None, None, None
+            ])
+            product_id = db.group_products.insert([
+                group_id, "P1", 1, None, None, None, 600, 800, 500, None, 2
+            ])
+            db.group_parts.insert([
+                [product_id, "sivu", 2, None, None, 0, "M1", None, None, None,
+                 "=tleveys", "=tkorkeus", "=12.5"],
+                [product_id, "hylly", 1, None, None, 0, "M1", None, None, None,
+                 '="sivu".leveys', None, None],
+            ], True)
+            db.group_parts.select(product_id)
+        db.groups.undo_barrier(self.offer_id)
+        tables = [db.groups, db.group_predefs, db.group_materials,
+                  db.group_products, db.group_parts]
+        before = [table.select() for table in tables]
+        cost = db.get_offer_cost(self.offer_id)
+        self.assertGreater(cost, 0)
+
+        self.assertEqual(db.groups.delete_many(self.groups[:2], self.offer_id), 2)
+        self.assertEqual([table.count_rows() for table in tables], [2, 6, 0, 0, 0])
+        self.assertEqual(db.get_offer_cost(self.offer_id), 0)
+
+        db.groups.undo(self.offer_id)
+        self.assertEqual([table.select() for table in tables], before)
+        self.assertEqual([table.count_rows() for table in tables], [4, 12, 2, 2, 4])
+        self.assertEqual(db.get_offer_cost(self.offer_id), cost)
+
+        db.groups.redo(self.offer_id)
+        self.assertEqual([table.count_rows() for table in tables], [2, 6, 0, 0, 0])
+        db.groups.undo(self.offer_id)
+        self.assertEqual([table.select() for table in tables], before)
+        self.assertEqual(db.get_offer_cost(self.offer_id), cost)
+
+    def test_temp_table(self):
+        predefs = self.db.group_predefs
+        pks = [r[0] for r in predefs.select()]
+        self.assertEqual(predefs.delete_many(pks[:-1] + [999], None, temp_limit=3), 11)
+        self.assertEqual([r[0] for r in predefs.select()], pks[-1:])
+        self.assertEqual(self.db.con.execute("SELECT COUNT(*) FROM temp.delete_keys").fetchone()[0], 0)
+        self.assertEqual(predefs.delete_many(pks, None, temp_limit=3), 1)
+
+    def test_nothing_to_delete(self):
+        self.assertEqual(self.db.groups.delete_many([]), 0)
+        self.assertEqual(self.db.groups.delete_many([None, 999]), 0)
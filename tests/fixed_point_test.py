@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from decimal import Decimal
+
+import db.dbtypes as dbt
+from db.database import Database, connect
+
+
+LEGACY_GROUP_MATERIALS = """
+    CREATE TABLE group_materials (
+        group_material_id INTEGER PRIMARY KEY,
+        group_id    INTEGER NOT NULL,
+        code        TEXT,
+        category    TEXT,
+        desc        TEXT,
+        prod        TEXT,
+        thickness   INTEGER,
+        is_stock    TEXT DEFAULT 'varasto',
+        unit        TEXT,
+        cost        PYDECIMAL,
+        add_cost    PYDECIMAL,
+        edg_cost    PYDECIMAL,
+        loss        PYDECIMAL,
+        discount    PYDECIMAL,
+        tot_cost    PYDECIMAL
+            GENERATED ALWAYS AS (
+                material_cost(cost, add_cost, edg_cost, loss, discount)
+            ) STORED,
+        UNIQUE(group_id, code)
+    )
+"""
+
+
+class TestFixedPointTypes(unittest.TestCase):
+    """Test the scaled integer adapter, converter and functions."""
+    def test_adapter_rounds_to_hundredths(self):
+        self.assertEqual(dbt.adapter_fixed(Decimal('12.345')), 1234)
+        self.assertEqual(dbt.adapter_fixed(Decimal('12.355')), 1236)
+        self.assertEqual(dbt.adapter_fixed(Decimal('-0.5')), -50)
+
+    def test_converter(self):
+        self.assertEqual(dbt.converter_fixed(b'1250'), Decimal('12.50'))
+        self.assertEqual(dbt.converter_fixed(b'12.5'), Decimal('12.50'))
+
+    def test_sql_matches_reference(self):
+        con = connect(":memory:")
+        rows = [
+            (1278, 510, 510, 15, 15),
+            (1050, 100, 50, 10, 5),
+            (333, None, 7, 9, 100),
+            (-125, 3, 0, 0, 0),
+            (None, None, None, None, None),
+        ]
+        expr = dbt.sql_material_cost("?1", "?2", "?3", "?4", "?5")
+        for row in rows:
+            native = con.execute(f"SELECT {expr}", row).fetchone()[0]
+            self.assertEqual(native, dbt.fixed_material_cost(*row))
+
+        expr = dbt.sql_product_cost("?1", "?2", "?3")
+        for row in [(1000, 250, 3000), (None, 125, 1), (5, -5, 5)]:
+            native = con.execute(f"SELECT {expr}", row).fetchone()[0]
+            self.assertEqual(native, dbt.fixed_product_cost(*row))
+        con.close()
+
+
+class TestFixedPointStorage(unittest.TestCase):
+    """Test that Database stores and sums pydecimals as integers."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([offer_id, "group"])
+        self.offer_id = offer_id
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_material_tot_cost(self):
+        self.db.group_materials.insert([
+            self.group_id, "M1", "cat", "desc", "prod", 18, "varasto", "€/m2",
+            Decimal('10.50'), Decimal('1.00'), Decimal('0.50'), Decimal('0.10'),
+            Decimal('0.05')
+        ])
+        row = self.db.group_materials.select(self.group_id)[0]
+        self.assertEqual(row[14], Decimal('12.40'))
+        stored = self.db.con.execute(
+            "SELECT typeof(cost), typeof(tot_cost) FROM group_materials"
+        ).fetchone()
+        self.assertEqual(stored, ("integer", "integer"))
+
+    def test_group_costs(self):
+        self.db.con.execute("UPDATE variables SET value_decimal=3000 WHERE variable_id=0")
+        product_id = self.db.group_products.insert([
+            self.group_id, "P1", 1, "cat", "desc", "prod", 600, 800, 500,
+            Decimal('1.00'), Decimal('2.50')
+        ])
+        self.db.con.execute(
+            "INSERT INTO group_parts(group_product_id, part, cost) VALUES (?,?,?)",
+            (product_id, "side", 725)
+        )
+        row = self.db.group_products.select(self.group_id)[0]
+        self.assertEqual(row[12], Decimal('7.25'))
+        self.assertEqual(row[13], Decimal('82.25'))
+        costs = self.db.get_group_costs(self.offer_id)
+        self.assertEqual(costs[0][2], Decimal('82.25'))
+
+
+class TestFixedPointMigration(unittest.TestCase):
+    """Test migrating a database with pydecimals stored as ASCII bytes."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        con = sqlite3.connect(self.path)
+        con.create_function("material_cost", 5, dbt.material_cost, deterministic=True)
+        con.execute(LEGACY_GROUP_MATERIALS)
+        con.executemany(
+            """INSERT INTO group_materials(group_id, code, cost, add_cost, edg_cost,
+            loss, discount) VALUES (?,?,?,?,?,?,?)""",
+            [
+                (1, f"M{n}", b'10.5', b'1.00', b'0.5', b'0.10', b'0.05')
+                for n in range(7)
+            ]
+        )
+        con.commit()
+        con.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_migrate(self):
+        database = Database(self.path)
+        rows = database.group_materials.select(1)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0][9], Decimal('10.50'))
+        self.assertEqual(rows[0][14], Decimal('12.40'))
+
+        sql = database.con.execute(
+            "SELECT sql FROM sqlite_master WHERE name='group_materials'"
+        ).fetchone()[0]
+        self.assertNotIn("material_cost(", sql)
+        types = database.con.execute(
+            "SELECT DISTINCT typeof(cost) FROM group_materials"
+        ).fetchall()
+        self.assertEqual(types, [("integer",)])
+        database.con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+from decimal import Decimal
+
+from db.database import Database
+from db.formula import FormulaCompiler
+
+
+class TestFormulaCompiler(unittest.TestCase):
+    """Test compiling and evaluating part codes."""
+    def setUp(self):
+        self.compiler = FormulaCompiler(["määrä", "leveys", "tleveys", "mpaksuus"])
+
+    def test_invalid_code(self):
+        self.assertIsNone(self.compiler.compile(None))
+        self.assertIsNone(self.compiler.compile(""))
+        self.assertIsNone(self.compiler.compile("12"))
+        self.assertIsNone(self.compiler.compile("=1 +"))
+
+    def test_references(self):
+        formula = self.compiler.compile('="sivu".leveys - 2 * mpaksuus + mpaksuus')
+        self.assertEqual(formula.refs, [("sivu", "leveys"), (None, "mpaksuus")])
+
+    def test_keys_are_not_replaced_inside_other_keys(self):
+        formula = self.compiler.compile("=tleveys-leveys")
+        self.assertEqual(formula.refs, [(None, "tleveys"), (None, "leveys")])
+        self.assertEqual(self.compiler.evaluate(formula, [600, 18]), 582)
+
+    def test_evaluate(self):
+        formula = self.compiler.compile("=määrä * 11.12")
+        self.assertEqual(self.compiler.evaluate(formula, [4]), Decimal('44.48'))
+        formula = self.compiler.compile("=määrä / 0")
+        self.assertIsNone(self.compiler.evaluate(formula, [4]))
+
+    def test_cache(self):
+        self.compiler.compile("=leveys * 2")
+        self.compiler.compile("=leveys * 2")
+        info = self.compiler.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+
+
+class TestPartCodes(unittest.TestCase):
+    """Test that GroupPartsTable.select parses the codes."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        group_id = self.db.groups.insert([offer_id, "group"])
+        self.db.group_materials.insert([
+            group_id, "M1", None, None, None, 18, "varasto", "€/m2",
+            Decimal('10.00'), None, None, None, None
+        ])
+        self.product_id = self.db.group_products.insert([
+            group_id, "P1", 1, None, None, None, 600, 800, 500, None, None
+        ])
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def insert_part(self, part, code_width, code_length=None, code_cost=None):
+        """Insert a part using material M1."""
+        return self.db.group_parts.insert([
+            self.product_id, part, 2, None, None, 0, "M1", None, None, None,
+            code_width, code_length, code_cost
+        ])
+
+    def test_reference_to_first_part(self):
+        self.insert_part("sivu", "=tleveys", "=tkorkeus - mpaksuus")
+        self.insert_part("hylly", '="sivu".pituus / 2')
+        self.db.group_parts.select(self.product_id)
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertEqual(rows[0][8], 600)
+        self.assertEqual(rows[0][9], 782)
+        self.assertEqual(rows[1][8], 391)
+
+    def test_cost(self):
+        self.insert_part("sivu", "=500", "=1000", "=leveys * pituus / 1000000 * mhinta * määrä")
+        self.db.group_parts.select(self.product_id)
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertEqual(rows[0][10], Decimal('10.00'))
+
+    def test_select_is_not_journaled(self):
+        part_id = self.insert_part("sivu", "=tleveys", "=tkorkeus")
+        self.db.group_parts.update(part_id, 12, "=tleveys / 2")
+        count = "SELECT COUNT(*) FROM undolog WHERE tablename='group_parts'"
+        before = self.db.con.execute(count).fetchone()[0]
+
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        rows = self.db.group_parts.select(self.product_id)
+        self.db.con.set_trace_callback(None)
+
+        self.assertEqual(rows[0][9], 300)
+        self.assertEqual(self.db.con.execute(count).fetchone()[0], before)
+        stored = self.db.con.execute(
+            "SELECT width, length FROM group_parts WHERE group_part_id=?", (part_id,)
+        ).fetchone()
+        self.assertEqual(stored, (600, 300))
+        selects = [sql for sql in statements if "FROM group_parts" in sql
+                   and sql.lstrip().startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+
+
+class TestPartRecalculation(unittest.TestCase):
+    """Test that only the parts affected by a change are recalculated."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([offer_id, "group"])
+        self.material_id = self.db.group_materials.insert([
+            self.group_id, "M1", None, None, None, 18, "varasto", "€/m2",
+            Decimal('10.00'), None, None, None, None
+        ])
+        self.product_id = self.db.group_products.insert([
+            self.group_id, "P1", 1, None, None, None, 600, 800, 500, None, None
+        ])
+        parts = self.db.group_parts
+        parts.insert([
+            [self.product_id, "sivu", 2, None, None, 0, "M1", None, None, None,
+             "=tsyvyys", "=tkorkeus", "=leveys * pituus / 1000000 * mhinta * määrä"],
+            [self.product_id, "hylly", 1, None, None, 0, None, None, None, None,
+             '=tleveys - 2 * "sivu".mpaksuus', '="sivu".leveys', "=1"],
+            [self.product_id, "tausta", 1, None, None, 0, None, None, None, None,
+             "=500", "=1000", "=2"],
+        ], many=True)
+        self.evaluated = []
+        evaluate = parts.formulas.evaluate
+
+        def counting_evaluate(formula, args):
+            self.evaluated.append(formula.text)
+            return evaluate(formula, args)
+        parts.formulas.evaluate = counting_evaluate
+        parts.select(self.product_id)
+        self.evaluated.clear()
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_nothing_changed(self):
+        self.db.group_parts.select(self.product_id)
+        self.assertEqual(self.evaluated, [])
+
+    def test_product_dimension(self):
+        self.db.group_products.update(self.product_id, 7, 1000)
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertEqual(self.evaluated, ['tleveys - 2 * "sivu".mpaksuus'])
+        self.assertEqual(rows[1][8], 964)
+
+    def test_dependent_parts_in_order(self):
+        self.db.group_products.update(self.product_id, 9, 300)
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertEqual(self.evaluated, [
+            "tsyvyys",
+            "leveys * pituus / 1000000 * mhinta * määrä",
+            '"sivu".leveys',
+        ])
+        self.assertEqual(rows[0][10], Decimal('4.80'))
+        self.assertEqual(rows[1][9], 300)
+
+    def test_material_cost(self):
+        self.db.group_materials.update(self.material_id, 9, Decimal('20.00'))
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertEqual(self.evaluated, ["leveys * pituus / 1000000 * mhinta * määrä"])
+        self.assertEqual(rows[0][10], Decimal('16.00'))
+
+    def test_cycle(self):
+        self.db.group_parts.update(3, 11, '="tausta".pituus')
+        self.db.group_parts.update(3, 12, '="tausta".leveys')
+        rows = self.db.group_parts.select(self.product_id)
+        self.assertIsNone(rows[2][8])
+        self.assertIsNone(rows[2][9])
+        self.assertEqual(rows[2][10], Decimal('2.00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
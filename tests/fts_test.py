@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db.fts as fts
+from db.database import Database
+
+
+class TestFullTextSearch(unittest.TestCase):
+    """Test the full-text search of offers and catalogues."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.db.materials.insert([
+            ["TAM18", "levy", "tammi 18mm lakattu", "Puukeskus"] + [None] * 8,
+            ["KOI18", "levy", "koivu 18mm", "Puukeskus"] + [None] * 8,
+            ["TAM22", "levy", "tammi 22mm", "Stark"] + [None] * 8,
+            ["LISTA", "lista", "listat tammi-viilu 18mm", "Stark"] + [None] * 8,
+        ], True)
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def codes(self, text, limit=50):
+        return [row[1] for row in self.db.search("materials", text, limit)]
+
+    def test_prefix_and_tokens(self):
+        self.assertEqual(sorted(self.codes("tammi 18mm")), ["LISTA", "TAM18"])
+        self.assertEqual(sorted(self.codes("tam 18")), ["LISTA", "TAM18"])
+        self.assertEqual(self.codes("koi"), ["KOI18"])
+        self.assertEqual(self.codes("nothing"), [])
+
+    def test_ranking(self):
+        # Matches in code weigh more than in desc.
+        codes = self.codes("tam")
+        self.assertEqual(sorted(codes[:2]), ["TAM18", "TAM22"])
+        self.assertEqual(codes[2], "LISTA")
+        self.assertEqual(self.codes("lista")[0], "LISTA")
+        self.assertEqual(len(self.codes("levy", 2)), 2)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.codes('tammi" OR -koivu*'), [])
+        self.assertEqual(self.codes("TAM18 AND"), [])
+        self.assertIsNone(fts.match_query(" -*\" "))
+
+    def test_empty_text(self):
+        self.assertEqual(self.codes(""), ["TAM18", "KOI18", "TAM22", "LISTA"])
+
+    def test_sync_with_table(self):
+        materials = self.db.materials
+        materials.update(2, 3, "pyökki 18mm")
+        self.assertEqual(self.codes("koivu"), [])
+        self.assertEqual(self.codes("pyökki"), ["KOI18"])
+        materials.delete(1)
+        self.assertEqual(self.codes("tammi 18mm"), ["LISTA"])
+        self.db.con.execute(
+            "INSERT INTO materials_fts(materials_fts) VALUES ('integrity-check')")
+
+    def test_offers(self):
+        self.db.offers.insert(["Keittiö Virtanen"] + [None] * 9)
+        self.db.offers.insert(["Kylpyhuone", None, "Virtanen"] + [None] * 7)
+        rows = self.db.search("offers", "virtanen")
+        self.assertEqual([r[1] for r in rows], ["Keittiö Virtanen", "Kylpyhuone"])
+
+    def test_groups(self):
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        for name in ("Keittiö", "Kylpyhuone", "Keittiön saareke"):
+            self.db.groups.insert([offer_id, name])
+        rows = self.db.search("groups", "keittiö")
+        self.assertEqual([r[2] for r in rows], ["Keittiö", "Keittiön saareke"])
+
+    def test_best_match_of_common_word(self):
+        self.db.materials.insert(
+            [[f"X{i}", "levy", "tammi levy", "Stark"] + [None] * 8 for i in range(3000)], True)
+        self.db.materials.insert(["TAMMI", "levy", "tammi", "Stark"] + [None] * 8)
+        self.assertEqual(self.codes("tammi", 1), ["TAMMI"])
+        self.assertEqual(self.codes("tammi", 3), ["TAMMI", "TAM18", "TAM22"])
+
+    def test_ranking_is_bounded(self):
+        self.db.materials.insert(
+            [[f"X{i}", "levy", "tammi levy", "Stark"] + [None] * 8 for i in range(3000)], True)
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        codes = self.codes("levy", 5)
+        self.db.con.set_trace_callback(None)
+        # Too many matches in all columns, none in the code, nothing is ranked.
+        self.assertEqual(codes, ["TAM18", "KOI18", "TAM22", "X0", "X1"])
+        self.assertEqual([s for s in statements if "bm25" in s], [])
+        self.assertTrue(any("LIMIT (2001)" in s for s in statements))
+
+        with patch.object(fts, "RANK_LIMIT", 2):
+            codes = self.codes("tam", 4)
+        self.assertEqual(sorted(codes[:2]), ["TAM18", "TAM22"])
+        self.assertEqual(codes[2:], ["LISTA", "X0"])
+
+
+class TestFullTextMigration(unittest.TestCase):
+    """Test creating the index for a database written without it."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        database = Database(self.path)
+        database.offers.insert(["Keittiö"] + [None] * 9)
+        for table in fts.SEARCH_COLUMNS:
+            database.con.execute(f"DROP TABLE {table}_fts")
+            for op in ("it", "ut", "dt"):
+                database.con.execute(f"DROP TRIGGER {table}_fts_{op}")
+        database.con.execute("PRAGMA user_version = 1")
+        database.con.commit()
+        database.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_index_filled(self):
+        database = Database(self.path)
+        self.assertEqual([r[1] for r in database.search("offers", "keit")], ["Keittiö"])
+        database.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db.database import Database
+from db.groupcommit import GroupCommit
+
+
+class TestGroupCommit(unittest.TestCase):
+    """Test coalescing cell edits into timed commits."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.db = Database(self.path)
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([offer_id, "group"])
+        self.row_id = self.db.group_predefs.insert([self.group_id, "part", None])
+        self.now = 0.0
+        self.scheduled = []
+        self.commits = GroupCommit(
+            self.db.con, 0.2, lambda ms, fn: self.scheduled.append((ms, fn))
+        )
+        self.commits.clock = lambda: self.now
+
+    def tearDown(self):
+        self.db.con.close()
+        os.remove(self.path)
+
+    def committed(self):
+        con = sqlite3.connect(self.path)
+        value = con.execute(
+            "SELECT material FROM group_predefs WHERE group_predef_id=?", (self.row_id,)
+        ).fetchone()[0]
+        con.close()
+        return value
+
+    def edit(self, value):
+        return self.commits.write(self.db.group_predefs.update, self.row_id, 3, value)
+
+    def test_coalesce(self):
+        for n in range(5):
+            self.assertTrue(self.edit(f"M{n}"))
+            self.now += 0.01
+        self.assertIsNone(self.committed())
+        self.assertEqual(len(self.scheduled), 1)
+        self.assertEqual(self.scheduled[0][0], 200)
+
+        self.scheduled[0][1]()
+        self.assertEqual(self.committed(), "M4")
+        self.assertEqual(list(self.commits.absorbed), [5])
+
+    def test_window_ends_on_write(self):
+        self.commits.schedule = None
+        self.edit("M1")
+        self.now = 0.5
+        self.edit("M2")
+        self.assertEqual(self.committed(), "M1")
+        self.assertEqual(self.commits.flush(), 1)
+        self.assertEqual(self.committed(), "M2")
+        self.assertEqual(self.commits.get_stats(), (2, 2, 1))
+
+    def test_old_schedule_is_ignored(self):
+        self.edit("M1")
+        self.commits.flush()
+        self.edit("M2")
+        self.scheduled[0][1]()
+        self.assertEqual(self.commits.pending, 1)
+        self.scheduled[1][1]()
+        self.assertEqual(self.committed(), "M2")
+
+    def test_batch_rollback_inside(self):
+        self.edit("M1")
+        table = self.db.group_predefs
+        with self.assertRaises(ValueError):
+            with table.batch(self.group_id):
+                table.insert([self.group_id, "other", None])
+                raise ValueError("stop")
+        self.commits.close()
+        self.assertEqual(self.committed(), "M1")
+        self.assertEqual(len(table.select(self.group_id)), 1)
+
+        # Writes through after close.
+        self.edit("M3")
+        self.assertEqual(self.committed(), "M3")
+
+
+if __name__ == '__main__':
+    unittest.main()
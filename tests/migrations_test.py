@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db.migrations as migrations
+from db.database import Database
+
+
+class TestMigrations(unittest.TestCase):
+    """Test the schema versions of database files."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        database = Database(self.path)
+        self.offer_id = database.offers.insert(["offer"] + [None] * 9)
+        database.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def open_traced(self) -> tuple:
+        """Return a Database opened on the file and the executed statements."""
+        statements = []
+        with patch("db.database.sqlite3.connect", side_effect=self.traced_connect(statements)):
+            database = Database(self.path)
+        return (database, statements)
+
+    @staticmethod
+    def traced_connect(statements):
+        connect = sqlite3.connect
+
+        def traced(*args, **kwargs):
+            con = connect(*args, **kwargs)
+            con.set_trace_callback(statements.append)
+            return con
+        return traced
+
+    def test_version_set(self):
+        con = sqlite3.connect(self.path)
+        self.assertEqual(migrations.get_version(con), migrations.SCHEMA_VERSION)
+        con.close()
+
+    def test_current_skips_ddl(self):
+        (database, statements) = self.open_traced()
+        ddl = [
+            s for s in statements
+            if s.lstrip().upper().startswith(("CREATE", "DROP", "INSERT"))
+            and "TEMP" not in s.upper()
+        ]
+        database.close()
+        self.assertEqual(ddl, [])
+
+    def test_triggers_persist(self):
+        database = Database(self.path)
+        self.assertEqual(database.con.execute("SELECT COUNT(*) FROM undolog").fetchone()[0], 0)
+        database.groups.insert([self.offer_id, "group"])
+        self.assertEqual(database.con.execute("SELECT COUNT(*) FROM undolog").fetchone()[0], 1)
+        self.assertEqual(database.get_offer_cost(self.offer_id), 0)
+        database.close()
+
+    def test_columns_seeded_once(self):
+        database = Database(self.path)
+        count = database.con.execute(
+            "SELECT COUNT(*) FROM columns WHERE tablename='offers'").fetchone()[0]
+        self.assertEqual(count, len(database.offers.default_columns))
+        database.close()
+
+    def test_new_migration(self):
+        calls = []
+        version = migrations.SCHEMA_VERSION + 1
+        with patch.dict(migrations.MIGRATIONS, {version: calls.append}):
+            Database(self.path).close()
+            Database(self.path).close()
+        self.assertEqual(len(calls), 1)
+        con = sqlite3.connect(self.path)
+        self.assertEqual(migrations.get_version(con), version)
+        con.close()
+
+    def test_failed_migration(self):
+        def fail(database):
+            database.con.execute("ALTER TABLE no_such_table ADD COLUMN x")
+
+        version = migrations.SCHEMA_VERSION + 1
+        with patch.dict(migrations.MIGRATIONS, {version: fail}):
+            Database(self.path).close()
+        con = sqlite3.connect(self.path)
+        self.assertEqual(migrations.get_version(con), migrations.SCHEMA_VERSION)
+        con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from db.database import Database
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test paging through catalogue tables with tokens."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        rows = []
+        for i in range(237):
+            category = None if i % 7 == 0 else f"cat{i % 5}"
+            code = None if i % 50 == 3 else f"code{(i * 37) % 1000:04d}"
+            rows.append([code, category] + [None] * 10)
+        self.assertTrue(self.db.materials.insert(rows, True))
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def page_all(self, order, limit, filt=None, search=False):
+        pages = []
+        token = None
+        while True:
+            if search:
+                (rows, token) = self.db.search_page("materials", filt, order, limit, token)
+            else:
+                (rows, token) = self.db.materials.select_page(None, filt, order, limit, token)
+            pages.append(rows)
+            if token is None:
+                return pages
+
+    def expected(self, order_by, where=""):
+        ids = self.db.con.execute(
+            f"SELECT material_id FROM materials {where} ORDER BY {order_by}, material_id"
+        ).fetchall()
+        return [i[0] for i in ids]
+
+    def test_orders_match_full_sort(self):
+        for (order, order_by) in ((None, "material_id"), ("code", "code"),
+                                  ("category", "category, code")):
+            for limit in (1, 10, 236, 237, 500):
+                pages = self.page_all(order, limit)
+                ids = [row[0] for page in pages for row in page]
+                self.assertEqual(ids, self.expected(order_by), (order, limit))
+                self.assertTrue(all(len(p) == limit for p in pages[:-1]))
+                self.assertEqual(len(pages), max(1, -(-237 // limit)))
+
+    def test_filter_and_reader(self):
+        filt = {2: ["=", "cat3"]}
+        pages = self.page_all("code", 4, filt, search=True)
+        ids = [row[0] for page in pages for row in page]
+        self.assertEqual(ids, self.expected("code", "WHERE category='cat3'"))
+
+    def test_invalid_token(self):
+        (_, token) = self.db.materials.select_page(order="code", limit=5)
+        with self.assertRaises(ValueError):
+            self.db.materials.select_page(order="category", token=token)
+        with self.assertRaises(ValueError):
+            self.db.materials.select_page(order="code", token="not a token")
+        with self.assertRaises(ValueError):
+            self.db.materials.select_page(order="no_such_order")
+
+    def test_uses_index(self):
+        for (order, index) in (("code", "idx_materials_code"),
+                               ("category", "idx_materials_category")):
+            (_, token) = self.db.materials.select_page(order=order, limit=100)
+            (sql, values, _) = self.db.materials.get_page_sql(None, None, order, 100, token)
+            plan = " ".join(
+                row[3] for row in self.db.con.execute(f"EXPLAIN QUERY PLAN {sql}", values))
+            self.assertIn(index, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_offers_by_name(self):
+        for name in ("b", "a", "c"):
+            self.db.offers.insert([name] + [None] * 9)
+        (rows, token) = self.db.offers.select_page(order="name", limit=2)
+        self.assertEqual([r[1] for r in rows], ["a", "b"])
+        (rows, token) = self.db.offers.select_page(order="name", limit=2, token=token)
+        self.assertEqual([r[1] for r in rows], ["c"])
+        self.assertIsNone(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from decimal import Decimal
+import unittest
+
+from db.database import Database
+
+
+class TestInsertRows(unittest.TestCase):
+    """Test inserting pasted rows in one statement and undo step."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.groups = [self.db.groups.insert([offer_id, f"g{i}"]) for i in range(2)]
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_copy_rows_to_group(self):
+        materials = self.db.group_materials
+        materials.insert([
+            self.groups[0], "M1", "levy", None, None, 18, "varasto", "€/m2",
+            Decimal('10.50'), None, None, None, None
+        ])
+        materials.insert([
+            self.groups[0], "M2", "levy", None, None, 22, "varasto", "€/m2",
+            Decimal('12.00'), None, None, None, None
+        ])
+        copied = materials.select(self.groups[0])
+
+        pks = materials.insert_rows(copied, self.groups[1])
+        self.assertEqual(len(pks), 2)
+        rows = materials.select(self.groups[1])
+        self.assertEqual([r[0] for r in rows], pks)
+        self.assertEqual([r[2] for r in rows], ["M1", "M2"])
+        self.assertEqual([r[3:] for r in rows], [r[3:] for r in copied])
+        self.assertEqual(rows[0][9], Decimal('10.50'))
+        self.assertEqual(rows[0][14], copied[0][14])
+
+        # The codes are unique in a group.
+        pks = materials.insert_rows(copied + copied, self.groups[1])
+        self.assertEqual([r[2] for r in materials.select_keys(pks)], [None] * 4)
+
+    def test_coerce_types(self):
+        materials = self.db.materials
+        pks = materials.insert_rows([
+            [None, "A1", "cat", "", None, "18", "varasto", None, 10.25, "x", None, None, None],
+            [None, "A2", None, None, None, 18.6, None, None, "1.5", None, None, None, None],
+        ])
+        rows = materials.select_keys(pks)
+        self.assertEqual(rows[0][5], 18)
+        self.assertIsNone(rows[0][3])
+        self.assertEqual(rows[0][8], Decimal("10.25"))
+        self.assertIsNone(rows[0][9])
+        self.assertEqual(rows[1][5], 19)
+        self.assertEqual(rows[1][8], Decimal("1.50"))
+
+        # Existing and repeated codes are set to None.
+        pks = materials.insert_rows([[None, "A1"], [None, "A3"], [None, "A3"]])
+        self.assertEqual([r[1] for r in materials.select_keys(pks)], [None, "A3", None])
+
+    def test_coerce_words_and_decimal_comma(self):
+        coerce = self.db.materials.coerce
+        for value in (True, "true", "True", "yes", "kyllä", "Kyllä", "1", 2):
+            self.assertEqual(coerce("bool", value), 1, value)
+        for value in (False, "false", "No", "ei", "0", 0):
+            self.assertEqual(coerce("bool", value), 0, value)
+        self.assertIsNone(coerce("bool", "maybe"))
+        self.assertEqual(coerce("double", "1,5"), Decimal("1.5"))
+        self.assertEqual(coerce("double", " 12,25 "), Decimal("12.25"))
+        self.assertEqual(coerce("long", "18,6"), 19)
+        self.assertIsNone(coerce("double", "1,5,0"))
+
+        pks = self.db.materials.insert_rows([
+            [None, "B1", None, None, None, "18,5", None, None, "10,25"] + [None] * 4])
+        row = self.db.materials.select_keys(pks)[0]
+        self.assertEqual(row[8], Decimal("10.25"))
+
+    def test_single_undo_step(self):
+        predefs = self.db.group_predefs
+        predefs.insert([self.groups[0], "sivu", "M1"])
+        predefs.undo_barrier(self.groups[0])
+        rows = [[None, None, f"osa{i}", "M1"] for i in range(50)] + [[None, None, "sivu", "M2"]]
+        pks = predefs.insert_rows(rows, self.groups[0])
+        self.assertEqual(len(pks), 51)
+        self.assertEqual(predefs.count_rows(self.groups[0]), 52)
+        self.assertIsNone(predefs.select_keys([pks[-1]])[0][2])
+
+        predefs.undo(self.groups[0])
+        self.assertEqual(len(predefs.select(self.groups[0])), 1)
+        predefs.redo(self.groups[0])
+        self.assertEqual(len(predefs.select(self.groups[0])), 52)
+
+    def test_failure_rolls_back(self):
+        predefs = self.db.group_predefs
+        self.assertEqual(predefs.insert_rows([[None, None, "a"], [None, None, "b"]], 999), [])
+        self.assertEqual(predefs.count_rows(), 0)
+        self.assertEqual(predefs.insert_rows([]), [])
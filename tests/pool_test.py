@@ -0,0 +1,96 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+
+from db.database import Database
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test the WAL mode and the read-only connections."""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.db")
+        self.db = Database(self.path, profile="interactive", readers=2)
+        self.offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.db.groups.insert([self.offer_id, "group"])
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def test_wal(self):
+        mode = self.db.con.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+        self.assertEqual(self.db.con.execute("PRAGMA synchronous").fetchone()[0], 1)
+
+    def test_read_during_write(self):
+        with self.db.transaction():
+            self.db.groups.insert([self.offer_id, "uncommitted"])
+            result = self.db.search_filter("groups", {1: ["=", self.offer_id]})
+            self.assertEqual([row[2] for row in result], ["group"])
+        result = self.db.search_filter("groups", {1: ["=", self.offer_id]})
+        self.assertEqual(len(result), 2)
+
+    def test_reader_is_read_only(self):
+        with self.db.reader() as con:
+            self.assertEqual(con.execute("SELECT dec_add(100, 250)").fetchone()[0], 350)
+            with self.assertRaises(sqlite3.OperationalError):
+                con.execute("DELETE FROM groups")
+
+    def test_pool_size(self):
+        readers = []
+        with self.db.reader() as first:
+            with self.db.reader() as second:
+                readers = [first, second]
+                self.assertIsNot(first, second)
+        with self.db.reader() as con:
+            self.assertIn(con, readers)
+        self.assertEqual(self.db.pool.n_readers, 2)
+
+    def test_readers_in_threads(self):
+        costs = []
+
+        def read():
+            costs.append(self.db.get_group_costs(self.offer_id)[0][2])
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(costs, [Decimal('0.00')] * 4)
+
+    def test_reads_see_pending_edits(self):
+        self.db.con.execute("UPDATE variables SET value_decimal=1000 WHERE variable_id=0")
+        group_id = self.db.groups.select(self.offer_id)[0][0]
+        product_id = self.db.group_products.insert([
+            group_id, "P1", 1, None, None, None, 600, 800, 500, None, None
+        ])
+        self.db.con.commit()
+        self.db.commits.write(self.db.group_products.update_cell, product_id, 11, Decimal('2.0'))
+        self.assertEqual(self.db.commits.pending, 1)
+
+        self.assertEqual(self.db.get_group_costs(self.offer_id)[0][2], Decimal('20.00'))
+        self.assertEqual(self.db.commits.pending, 0)
+        self.assertEqual(self.db.price_offer(self.offer_id).get_total(), Decimal('20.00'))
+
+    def test_checkpoint(self):
+        self.db.groups.insert([self.offer_id, "group 2"])
+        (busy, _, _) = self.db.pool.checkpoint()
+        self.assertEqual(busy, 0)
+
+
+class TestInMemoryPool(unittest.TestCase):
+    """Test that an in memory database reads with the writer."""
+    def test_reader(self):
+        database = Database(":memory:", profile="interactive")
+        with database.reader() as con:
+            self.assertIs(con, database.con)
+        database.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
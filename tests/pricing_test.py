@@ -0,0 +1,177 @@
+import random
+import unittest
+from decimal import Decimal
+
+import db.dbtypes as dbt
+from db.database import Database
+from db import pricing
+
+
+class TestPricing(unittest.TestCase):
+    """Test the numpy pricing against the sqlite functions of db.dbtypes."""
+    def setUp(self):
+        rand = random.Random(7)
+        self.db = Database(":memory:")
+        self.db.con.execute("UPDATE variables SET value_decimal=3275 WHERE variable_id=0")
+        self.offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        other_offer = self.db.offers.insert(["other"] + [None] * 9)
+        con = self.db.con
+        for g in range(4):
+            offer_id = other_offer if g == 3 else self.offer_id
+            group_id = self.db.groups.insert([offer_id, f"group {g}"])
+            con.executemany(
+                """INSERT INTO group_materials(
+                    group_id, code, cost, add_cost, edg_cost, loss, discount
+                ) VALUES (?,?,?,?,?,?,?)""",
+                [
+                    (group_id, f"M{n}", rand.randint(-500, 100000),
+                     rand.choice([None, rand.randint(0, 999)]), rand.randint(0, 999),
+                     rand.randint(0, 50), rand.randint(0, 40))
+                    for n in range(50)
+                ]
+            )
+            for n in range(30):
+                con.execute(
+                    "INSERT INTO group_products(group_id, code, work_time) VALUES (?,?,?)",
+                    (group_id, f"P{n}", rand.choice([None, rand.randint(0, 1000)]))
+                )
+        # Leave one product without parts.
+        products = [row[0] for row in con.execute("SELECT group_product_id FROM group_products")]
+        con.executemany(
+            "INSERT INTO group_parts(group_product_id, part, cost) VALUES (?,?,?)",
+            [
+                (rand.choice(products[1:]), f"part {n}",
+                 rand.choice([None, rand.randint(-1000, 500000)]))
+                for n in range(1000)
+            ]
+        )
+        con.commit()
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_matches_reference(self):
+        prices = self.db.price_offer(self.offer_id)
+        con = self.db.con
+        materials = con.execute("""
+            SELECT m.group_material_id,
+                material_cost(m.cost, m.add_cost, m.edg_cost, m.loss, m.discount)
+            FROM group_materials AS m INNER JOIN groups AS g USING(group_id)
+            WHERE g.offer_id=? ORDER BY m.group_material_id
+        """, (self.offer_id,)).fetchall()
+        self.assertEqual(prices.material_ids.tolist(), [r[0] for r in materials])
+        self.assertEqual(prices.material_costs.tolist(), [r[1] for r in materials])
+
+        products = con.execute("""
+            SELECT p.group_product_id, p.group_id, product_cost(
+                (SELECT dec_sum(cost) FROM group_parts AS a
+                 WHERE a.group_product_id=p.group_product_id),
+                p.work_time,
+                (SELECT value_decimal FROM variables WHERE variable_id=0)
+            )
+            FROM group_products AS p INNER JOIN groups AS g USING(group_id)
+            WHERE g.offer_id=? ORDER BY p.group_product_id
+        """, (self.offer_id,)).fetchall()
+        self.assertEqual(prices.product_ids.tolist(), [r[0] for r in products])
+        self.assertEqual(prices.product_costs.tolist(), [r[2] for r in products])
+
+        groups = {}
+        for (_, group_id, cost) in products:
+            groups[group_id] = groups.get(group_id, 0) + cost
+        self.assertEqual(prices.group_costs.tolist(), list(groups.values()))
+        self.assertEqual(prices.total, sum(groups.values()))
+        self.assertEqual(prices.get_total(), self.db.get_offer_cost(self.offer_id))
+
+    def test_round_div(self):
+        values = list(range(-250, 251))
+        result = pricing.round_div(pricing.np.array(values, dtype=pricing.np.int64), 100)
+        self.assertEqual(result.tolist(), [dbt.round_div(v, 100) for v in values])
+
+    def test_empty_offer(self):
+        offer_id = self.db.offers.insert(["empty"] + [None] * 9)
+        prices = self.db.price_offer(offer_id)
+        self.assertEqual(prices.get_groups(), {})
+        self.assertEqual(prices.get_total(), Decimal('0.00'))
+
+    def test_scenarios(self):
+        scenarios = [
+            pricing.Scenario(),
+            pricing.Scenario(work_cost=Decimal('40.00')),
+            pricing.Scenario(loss=Decimal('0.15'), discount=Decimal('0.05')),
+            pricing.Scenario(Decimal('12.34'), Decimal('2.5'), Decimal('0.01'), Decimal('0.3')),
+        ]
+        self.db.con.execute("UPDATE group_products SET inst_unit=125 WHERE group_product_id%3=0")
+        prices = self.db.price_scenarios(self.offer_id, scenarios)
+        self.assertEqual(prices.product_costs.shape, (len(prices.product_ids), 4))
+        self.assertEqual(prices.get_totals()[0], self.db.price_offer(self.offer_id).get_total())
+
+        rows = self.db.con.execute("""
+            SELECT p.group_product_id, p.group_id, p.work_time, p.inst_unit,
+                (SELECT dec_sum(cost) FROM group_parts AS a
+                 WHERE a.group_product_id=p.group_product_id)
+            FROM group_products AS p INNER JOIN groups AS g USING(group_id)
+            WHERE g.offer_id=? ORDER BY p.group_product_id
+        """, (self.offer_id,)).fetchall()
+        for k, scenario in enumerate(scenarios):
+            work_cost = 3275 if scenario.work_cost is None else dbt.to_fixed(scenario.work_cost)
+            mult = dbt.to_fixed(scenario.install_unit_mult)
+            expected = [
+                dbt.fixed_material_cost(part_cost, 0, 0, scenario.loss, scenario.discount)
+                + dbt.fixed_product_cost(0, work_time, work_cost)
+                + dbt.fixed_mul(inst_unit, mult)
+                for (_, _, work_time, inst_unit, part_cost) in rows
+            ]
+            self.assertEqual(prices.product_costs[:, k].tolist(), expected)
+            self.assertEqual(int(prices.totals[k]), sum(expected))
+
+    def test_default_scenario_matches_offer_cost(self):
+        con = self.db.con
+        con.execute("UPDATE variables SET value_decimal=150 WHERE variable_id=1")
+        con.execute("UPDATE group_products SET inst_unit=125")
+        group_id = self.db.groups.insert([self.offer_id, "parts with codes"])
+        self.db.group_materials.insert([
+            group_id, "LD", None, None, None, 18, "varasto", "€/m2",
+            Decimal('10.00'), Decimal('1.50'), Decimal('2.00'), Decimal('0.20'), Decimal('0.10')
+        ])
+        product_id = self.db.group_products.insert([
+            group_id, "P", 1, None, None, None, 600, 800, 500, Decimal('1.5'), Decimal('2.0')
+        ])
+        self.db.group_parts.insert([product_id, "sivu", 2, None, None, 0, "LD", None, None,
+                                    None, "=tleveys", "=tkorkeus", None])
+        self.db.group_parts.select(product_id)
+        part_cost = con.execute(
+            "SELECT cost FROM group_parts WHERE group_product_id=?", (product_id,)).fetchone()[0]
+        self.assertNotEqual(part_cost, 0)
+
+        prices = self.db.price_scenarios(self.offer_id, [
+            pricing.Scenario(), pricing.Scenario(install_unit_mult=Decimal('1.5'))
+        ])
+        total = self.db.price_offer(self.offer_id).get_total()
+        self.assertEqual(prices.get_totals()[0], total)
+        self.assertEqual(prices.get_totals()[0], self.db.get_offer_cost(self.offer_id))
+        self.assertGreater(prices.get_totals()[1], total)
+
+
+class TestPricingLargeOffer(unittest.TestCase):
+    """Test pricing an offer with 10000 parts."""
+    def test_large_offer(self):
+        database = Database(":memory:")
+        offer_id = database.offers.insert(["offer"] + [None] * 9)
+        group_id = database.groups.insert([offer_id, "group"])
+        con = database.con
+        con.executemany(
+            "INSERT INTO group_products(group_id, code, work_time) VALUES (?,?,?)",
+            [(group_id, f"P{n}", 100) for n in range(1000)]
+        )
+        con.executemany(
+            "INSERT INTO group_parts(group_product_id, part, cost) VALUES (?,?,?)",
+            [(n % 1000 + 1, f"part {n}", 150) for n in range(10000)]
+        )
+        con.commit()
+        prices = database.price_offer(offer_id)
+        self.assertEqual(prices.get_total(), Decimal('15000.00'))
+        database.con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
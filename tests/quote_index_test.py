@@ -0,0 +1,94 @@
+import random
+import unittest
+
+from db.database import Database
+from quote_index import QuoteIndex, list_changes
+
+
+class TestQuoteIndex(unittest.TestCase):
+    """Test the in-memory search of quote names."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        for name in ("Keittiö Virtanen", "Kylpyhuone Virtanen", "keittiö Laine",
+                     "Vaatehuone", "Kylpyhuone 2"):
+            self.db.offers.insert([name] + [None] * 9)
+        self.loads = 0
+        self.index = QuoteIndex(self.load)
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def load(self):
+        self.loads += 1
+        return self.db.con.execute("SELECT offer_id, name FROM offers").fetchall()
+
+    def names(self, text, limit=None):
+        return [row[1] for row in self.index.search(text, limit)]
+
+    def test_search(self):
+        self.assertEqual(self.names("kei"), ["keittiö Laine", "Keittiö Virtanen"])
+        self.assertEqual(self.names("virt kyl"), ["Kylpyhuone Virtanen"])
+        self.assertEqual(self.names("HUONE"), [])
+        self.assertEqual(self.names(""), sorted(self.names(""), key=str.casefold))
+        self.assertEqual(len(self.names("", 2)), 2)
+
+    def test_loaded_once(self):
+        self.assertEqual(self.names("k"), [
+            "keittiö Laine", "Keittiö Virtanen", "Kylpyhuone 2", "Kylpyhuone Virtanen"])
+        self.assertEqual(self.names("ky"), ["Kylpyhuone 2", "Kylpyhuone Virtanen"])
+        self.assertEqual(self.names("kylpyhuone 2"), ["Kylpyhuone 2"])
+        self.assertEqual(self.names("kylpyhuone"), ["Kylpyhuone 2", "Kylpyhuone Virtanen"])
+        self.assertEqual(self.loads, 1)
+
+    def test_add_rename_remove(self):
+        self.names("vaate")
+        self.index.add(10, "Vaatehuone Laine")
+        self.assertEqual(self.names("vaate"), ["Vaatehuone", "Vaatehuone Laine"])
+        self.index.add(10, "Sauna")
+        self.assertEqual(self.names("vaate"), ["Vaatehuone"])
+        self.assertEqual(self.names("sau"), ["Sauna"])
+        self.index.remove(10)
+        self.assertEqual(self.names("sau"), [])
+        self.assertEqual(self.loads, 1)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        words = ["keittiö", "kylpy", "kylpyhuone", "laine", "virtanen", "sauna", "2", "b2"]
+        quotes = [(i, " ".join(rng.sample(words, rng.randint(1, 3)))) for i in range(300)]
+        index = QuoteIndex(lambda: quotes)
+        for text in ["k", "ky", "kylpy", "kylpyh", "kylpyh la", "s", "2", "b", "vir k"]:
+            prefixes = text.split()
+            expected = sorted(
+                (i for (i, n) in quotes
+                 if all(any(w.startswith(p) for w in n.split()) for p in prefixes)),
+                key=lambda i: (quotes[i][1], i)
+            )
+            self.assertEqual([r[0] for r in index.search(text)], expected, text)
+
+
+class TestListChanges(unittest.TestCase):
+    """Test the edits updating a list control."""
+    def apply(self, old, new):
+        rows = list(old)
+        for change in list_changes(old, new):
+            if change[0] == "delete":
+                del rows[change[1]]
+            else:
+                rows.insert(change[1], change[2])
+        return rows
+
+    def test_changes(self):
+        old = [[1, "a"], [2, "b"], [3, "c"], [4, "d"]]
+        for new in ([], [[2, "b"], [4, "d"]], [[1, "a"], [5, "e"], [3, "c"]],
+                    [[0, "x"]] + old, [[1, "a"], [2, "B"], [3, "c"], [4, "d"]]):
+            self.assertEqual(self.apply(old, new), new)
+            self.assertEqual(self.apply(new, old), old)
+
+    def test_refinement_only_deletes(self):
+        old = [[1, "a"], [2, "b"], [3, "c"]]
+        changes = list_changes(old, [[1, "a"], [3, "c"]])
+        self.assertEqual(changes, [("delete", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from db.database import Database
+
+
+class TestColumnSchema(unittest.TestCase):
+    """Test the cached column setup of the tables."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.statements = []
+        self.db.con.set_trace_callback(self.statements.append)
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def query_columns(self, key):
+        return [row[0] for row in self.db.con.execute(
+            f"SELECT {key} FROM columns WHERE tablename=(?) ORDER BY col_idx",
+            (self.db.group_parts.name,)
+        )]
+
+    def test_matches_columns_table(self):
+        table = self.db.group_parts
+        schema = table.get_schema()
+        self.assertEqual(len(schema), len(table.default_columns))
+        self.assertEqual(table.get_num_columns(), len(self.query_columns("key")))
+        self.assertEqual(schema.get("label"), self.query_columns("label"))
+        self.assertEqual(table.get_column_read_only(), self.query_columns("ro"))
+        for col, type_str in enumerate(self.query_columns("type")):
+            self.assertEqual(table.get_column_type(col), type_str)
+            self.assertEqual(schema.base_type(col), type_str.split(":")[0])
+
+    def test_loaded_once(self):
+        table = self.db.group_parts
+        table.get_schema()
+        self.statements.clear()
+        for col in range(table.get_num_columns()):
+            table.get_column_label(col)
+            table.get_column_type(col)
+            table.get_column_width(col)
+        self.assertEqual(self.statements, [])
+
+    def test_set_column_setup_invalidates(self):
+        table = self.db.group_parts
+        other = self.db.group_products.get_schema()
+        schema = table.get_schema()
+        self.assertTrue(table.set_column_setup("width", 2, 120))
+        self.assertTrue(schema.stale)
+        self.assertFalse(other.stale)
+        self.assertIs(self.db.group_products.get_schema(), other)
+        self.assertEqual(table.get_column_width(2), 120)
+        self.assertFalse(table.get_schema().stale)
+
+    def test_failed_set_keeps_schema(self):
+        table = self.db.group_parts
+        schema = table.get_schema()
+        self.assertFalse(table.set_column_setup("no_such_key", 2, 120))
+        self.assertIs(table.get_schema(), schema)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from db.database import Database
+from timing import Phases
+
+
+class TestLazyStartup(unittest.TestCase):
+    """Test that slow modules and tables are created on first use."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        Database(self.path).close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_asteval_not_imported(self):
+        code = (
+            "import sys, quote\n"
+            "from db.database import Database\n"
+            f"Database({self.path!r}).groups.select(1)\n"
+            "print('asteval' in sys.modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_catalogues_created_on_use(self):
+        database = Database(self.path)
+        self.assertIsNone(database.group_materials._catalogue)
+        self.assertIs(database.get_table("materials"), database.materials)
+        self.assertIsNotNone(database.group_materials._catalogue)
+        self.assertEqual(database.materials.select(), [])
+        database.close()
+
+    def test_formula_interpreter_on_use(self):
+        database = Database(self.path)
+        formulas = database.group_parts.formulas
+        self.assertIsNone(formulas._aeval)
+        self.assertEqual(formulas.evaluate(formulas.compile("=2*3"), []), 6)
+        database.close()
+
+
+class TestPhases(unittest.TestCase):
+    """Test the startup phase report."""
+    def test_nested(self):
+        phases = Phases()
+        with phases.phase("outer"):
+            with phases.phase("inner"):
+                pass
+        self.assertEqual([(d, n) for (d, n, _, _) in phases.records],
+                         [(1, "inner"), (0, "outer")])
+        (_, _, own, total) = phases.records[1]
+        self.assertAlmostEqual(own + phases.records[0][3], total)
+        self.assertEqual(phases.get_total(), total)
+        lines = phases.report().splitlines()
+        self.assertTrue(lines[1].endswith("|   inner"))
+        self.assertTrue(lines[2].endswith("| outer"))
+
+
+if __name__ == '__main__':
+    unittest.main()
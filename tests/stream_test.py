@@ -0,0 +1,49 @@
+import sqlite3
+import unittest
+
+from db.database import Database
+
+
+class TestIterSelect(unittest.TestCase):
+    """Test reading the rows of tables in chunks."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        rows = [[f"code{i:03d}", f"cat{i % 3}"] + [None] * 10 for i in range(95)]
+        self.assertTrue(self.db.materials.insert(rows, True))
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_same_as_select(self):
+        table = self.db.materials
+        self.assertEqual(list(table.iter_select(chunk_size=10)), table.select())
+        filt = {2: ["=", "cat1"]}
+        self.assertEqual(list(table.iter_select(filt=filt, chunk_size=7)), table.select(filt=filt))
+        self.assertEqual(list(self.db.iter_search("materials", chunk_size=9)), table.select())
+
+    def test_foreign_key(self):
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.db.groups.insert([offer_id, "a"])
+        self.db.groups.insert([offer_id, "b"])
+        rows = list(self.db.groups.iter_select(offer_id))
+        self.assertEqual([r[2] for r in rows], ["a", "b"])
+
+    def test_row_factory(self):
+        rows = list(self.db.materials.iter_select(row_factory=sqlite3.Row))
+        self.assertEqual(rows[5]["code"], "code005")
+
+    def test_fetched_in_chunks(self):
+        made = []
+
+        def factory(cursor, row):
+            made.append(row)
+            return row
+
+        rows = self.db.materials.iter_select(chunk_size=10, row_factory=factory)
+        self.assertEqual(next(rows)[1], "code000")
+        self.assertEqual(len(made), 10)
+        rows.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
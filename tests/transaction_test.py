@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db.database import Database
+
+
+class TestTransaction(unittest.TestCase):
+    """Test the batch and transaction blocks."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.db = Database(self.path)
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([offer_id, "group"])
+        self.table = self.db.group_predefs
+        self.table.start_interval(self.group_id)
+
+    def tearDown(self):
+        self.db.con.close()
+        os.remove(self.path)
+
+    def count_committed(self):
+        con = sqlite3.connect(self.path)
+        count = con.execute("SELECT COUNT(*) FROM group_predefs").fetchone()[0]
+        con.close()
+        return count
+
+    def test_commit_at_end(self):
+        with self.table.batch(self.group_id):
+            for n in range(10):
+                self.table.insert([self.group_id, f"part {n}", None])
+            self.assertEqual(self.count_committed(), 0)
+        self.assertEqual(self.count_committed(), 10)
+
+    def test_single_undo_step(self):
+        with self.table.batch(self.group_id):
+            for n in range(10):
+                self.table.insert([self.group_id, f"part {n}", None])
+        self.table.undo(self.group_id)
+        self.assertEqual(self.table.select(self.group_id), [])
+        self.assertFalse(self.table.can_undo(self.group_id))
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.table.batch(self.group_id):
+                self.table.insert([self.group_id, "part", None])
+                raise ValueError("stop")
+        self.assertEqual(self.table.select(self.group_id), [])
+        self.assertFalse(self.table.can_undo(self.group_id))
+        self.assertFalse(self.db.con.in_transaction)
+
+        # Autocommit works after the rollback.
+        self.table.insert([self.group_id, "part", None])
+        self.assertEqual(self.count_committed(), 1)
+
+    def test_nested(self):
+        with self.db.transaction():
+            with self.table.batch(self.group_id):
+                self.table.insert([self.group_id, "part", None])
+            self.db.groups.insert([1, "group 2"])
+            self.assertEqual(self.count_committed(), 0)
+        self.assertEqual(self.count_committed(), 1)
+        self.assertEqual(len(self.db.groups.select(1)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
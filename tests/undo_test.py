@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from db.database import Database
+from db.super import SQLTableBase
+
+
+class TestUndo(unittest.TestCase):
+    """Test the undo journal."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.group_id = self.db.groups.insert([offer_id, "group"])
+        self.table = self.db.group_predefs
+        self.table.start_interval(self.group_id)
+
+    def tearDown(self):
+        SQLTableBase.undo_limit = 100
+        self.db.con.close()
+
+    def count(self):
+        return self.table.select(self.group_id, count=True)[0][0]
+
+    def insert_steps(self, n, prefix="part"):
+        for i in range(n):
+            self.table.insert([self.group_id, f"{prefix} {i}", None])
+            self.table.undo_barrier(self.group_id)
+
+    def test_undo_redo(self):
+        self.insert_steps(3)
+        self.table.undo(self.group_id)
+        self.table.undo(self.group_id)
+        self.assertEqual(self.count(), 1)
+        self.assertTrue(self.table.can_redo(self.group_id))
+        self.table.redo(self.group_id)
+        self.assertEqual(self.count(), 2)
+
+        # A new step clears the redo steps.
+        self.insert_steps(1, "new")
+        self.assertFalse(self.table.can_redo(self.group_id))
+        self.table.undo(self.group_id)
+        self.table.undo(self.group_id)
+        self.table.undo(self.group_id)
+        self.assertEqual(self.count(), 0)
+        self.assertFalse(self.table.can_undo(self.group_id))
+        self.table.undo(self.group_id)
+
+    def test_no_foreign_key(self):
+        offers = self.db.offers
+        offers.start_interval(None)
+        offers.insert(["another"] + [None] * 9)
+        offers.undo_barrier(None)
+        self.assertTrue(offers.can_undo(None))
+        offers.undo(None)
+        self.assertEqual(offers.select(count=True)[0][0], 1)
+
+    def test_limit(self):
+        SQLTableBase.undo_limit = 5
+        self.insert_steps(8)
+        steps = self.db.con.execute(
+            "SELECT COUNT(*) FROM undostep WHERE tablename='group_predefs'"
+        ).fetchone()[0]
+        entries = self.db.con.execute(
+            "SELECT COUNT(*) FROM undolog WHERE tablename='group_predefs'"
+        ).fetchone()[0]
+        self.assertEqual(steps, 5)
+        self.assertEqual(entries, 5)
+
+        for _ in range(6):
+            self.table.undo(self.group_id)
+        self.assertEqual(self.count(), 3)
+
+    def test_update_records_changed_column(self):
+        materials = self.db.group_materials
+        materials.start_interval(self.group_id)
+        row_id = materials.insert([
+            self.group_id, "M1", "cat", "desc", "prod", 18, "varasto", "€/m2",
+            Decimal('10.50'), Decimal('1.00'), None, None, None
+        ])
+        materials.undo_barrier(self.group_id)
+        materials.update(row_id, 9, Decimal('12.00'))
+        materials.undo_barrier(self.group_id)
+        entry = self.db.con.execute(
+            "SELECT op, pk, data FROM undolog ORDER BY seq DESC LIMIT 1"
+        ).fetchone()
+        self.assertEqual(entry, ("U", row_id, '{"cost":1050}'))
+
+        materials.undo(self.group_id)
+        self.assertEqual(materials.select(self.group_id)[0][9], Decimal('10.50'))
+        materials.redo(self.group_id)
+        self.assertEqual(materials.select(self.group_id)[0][9], Decimal('12.00'))
+
+    def test_undo_delete(self):
+        self.insert_steps(1)
+        row = self.table.select(self.group_id)[0]
+        self.table.delete(row[0])
+        self.table.undo_barrier(self.group_id)
+        self.table.undo(self.group_id)
+        self.assertEqual(self.table.select(self.group_id), [row])
+
+    def test_index_is_used(self):
+        plan = self.db.con.execute("""
+            EXPLAIN QUERY PLAN SELECT op, pk, data FROM undolog
+            WHERE tablename=? AND fk IS ? AND seq>=? AND seq<=?
+        """, ("group_predefs", 1, 1, 10)).fetchall()
+        self.assertIn("idx_undolog", plan[0][3])
+
+
+class TestPersistentUndo(unittest.TestCase):
+    """Test keeping the undo history between sessions."""
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_persist(self):
+        database = Database(self.path, persist_undo=True)
+        offer_id = database.offers.insert(["offer"] + [None] * 9)
+        group_id = database.groups.insert([offer_id, "group"])
+        database.group_predefs.start_interval(group_id)
+        database.group_predefs.insert([group_id, "part", None])
+        database.group_predefs.undo_barrier(group_id)
+        database.con.close()
+
+        database = Database(self.path, persist_undo=True)
+        self.assertTrue(database.group_predefs.can_undo(group_id))
+        database.group_predefs.undo(group_id)
+        self.assertEqual(database.group_predefs.select(group_id), [])
+        database.con.close()
+
+        database = Database(self.path)
+        self.assertFalse(database.group_predefs.can_undo(group_id))
+        database.con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
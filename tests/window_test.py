@@ -0,0 +1,201 @@
+import unittest
+
+from db.database import Database
+from db.window import RowWindow
+
+
+class TestRowCounts(unittest.TestCase):
+    """Test the row counts kept by triggers."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.groups = [self.db.groups.insert([self.offer_id, f"g{i}"]) for i in range(2)]
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def assertCounts(self, table):
+        for fk in [None] + self.groups:
+            self.assertEqual(table.count_rows(fk), len(table.select(fk)), fk)
+
+    def test_insert_update_delete(self):
+        table = self.db.group_predefs
+        rows = [[self.groups[i % 2], f"p{i}", None] for i in range(7)]
+        self.assertTrue(table.insert(rows, True))
+        self.assertEqual(table.count_rows(self.groups[0]), 4)
+        self.assertCounts(table)
+
+        table.update(1, 1, self.groups[1])
+        self.assertEqual(table.count_rows(self.groups[1]), 4)
+        table.delete(2)
+        self.assertCounts(table)
+        table.undo(self.groups[0])
+        self.assertCounts(table)
+
+    def test_cascade(self):
+        table = self.db.group_predefs
+        table.insert([[g, "p", None] for g in self.groups], True)
+        self.db.groups.delete(self.groups[0])
+        self.assertEqual(table.count_rows(self.groups[0]), 0)
+        self.assertEqual(table.count_rows(), 1)
+        self.assertEqual(self.db.groups.count_rows(self.offer_id), 1)
+
+    def test_filter_and_catalogue(self):
+        materials = self.db.materials
+        materials.insert([[f"c{i}", f"cat{i % 3}"] + [None] * 10 for i in range(10)], True)
+        self.assertEqual(materials.count_rows(), 10)
+        self.assertEqual(materials.count_rows(None, {2: ["=", "cat0"]}), 4)
+
+    def test_refresh_existing_rows(self):
+        materials = self.db.materials
+        materials.insert([[f"c{i}", None] + [None] * 10 for i in range(5)], True)
+        self.db.con.execute("DELETE FROM row_counts")
+        self.db.counts.refresh(materials)
+        self.assertEqual(materials.count_rows(), 5)
+
+
+class TestRowWindow(unittest.TestCase):
+    """Test loading the rows of a table in cached blocks."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        rows = [[f"code{i:04d}", f"cat{i % 4}"] + [None] * 10 for i in range(1005)]
+        self.assertTrue(self.db.materials.insert(rows, True))
+        self.db.materials.delete(10)
+        self.rows = self.db.materials.select()
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def window(self, **kwargs):
+        return RowWindow(self.db.materials, block_size=50, max_blocks=4, prefetch=10, **kwargs)
+
+    def test_same_as_select(self):
+        window = self.window()
+        self.assertEqual(len(window), 1004)
+        self.assertEqual([tuple(window[i]) for i in range(len(window))], self.rows)
+        self.assertLessEqual(len(window.blocks), 4)
+        with self.assertRaises(IndexError):
+            window[1004]
+
+    def test_scrolling_loads_visible_blocks(self):
+        window = self.window()
+        for i in range(0, 30):
+            window[i]
+        self.assertEqual(window.loads, 1)
+        self.assertEqual(list(window.blocks), [0])
+        window[45]
+        self.assertEqual(sorted(window.blocks), [0, 1])
+
+        # Jumping far selects only the blocks around the row.
+        window[700]
+        self.assertEqual(sorted(window.blocks), [0, 1, 13, 14])
+        self.assertEqual(tuple(window[700]), self.rows[700])
+        window[300]
+        self.assertEqual(len(window.blocks), 4)
+        self.assertNotIn(0, window.blocks)
+
+    def test_cached_block_is_not_loaded_again(self):
+        window = self.window()
+        window[120]
+        calls = []
+        (load, load_blocks) = (window.load, window.load_blocks)
+        window.load = lambda *args: calls.append(("load",) + args) or load(*args)
+        window.load_blocks = lambda *args: calls.append(args) or load_blocks(*args)
+        for i in range(110, 140):
+            window[i]
+        self.assertEqual(calls, [])
+
+        # Near the end of the block the next block is prefetched once.
+        window[145]
+        window[146]
+        self.assertEqual(calls, [("load", 135, 155), (3, 1)])
+
+        with self.assertRaises(ValueError):
+            RowWindow(self.db.materials, block_size=100, prefetch=50)
+
+    def test_evicted_block_reloads_after_bound(self):
+        window = self.window()
+        window[120]
+        for i in range(300, 1000, 50):
+            window[i]
+        self.assertNotIn(2, window.blocks)
+        self.assertIn(2, window.bounds)
+        self.assertEqual(tuple(window[120]), self.rows[120])
+
+    def test_filter_and_refresh(self):
+        filt = {2: ["=", "cat1"]}
+        window = self.window(filt=filt)
+        expected = self.db.materials.select(None, filt)
+        self.assertEqual([tuple(window[i]) for i in range(len(window))], expected)
+
+        self.db.materials.delete(self.rows[0][0])
+        window.set_source()
+        self.assertEqual(len(window), 1003)
+        self.assertEqual(tuple(window[0]), self.rows[1])
+
+    def test_group_parts(self):
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        group_id = self.db.groups.insert([offer_id, "group"])
+        product_id = self.db.group_products.insert([
+            group_id, "P1", 1, None, None, None, 600, 800, 500, None, None
+        ])
+        parts = self.db.group_parts
+        for i in range(5):
+            parts.insert([product_id, f"p{i}", 2, None, None, 0, None, None, None, None,
+                          "=tleveys", f"=tkorkeus - {i}", None])
+        # The window parses the codes like select.
+        window = RowWindow(parts, product_id, block_size=2, prefetch=0)
+        self.assertEqual(len(window), 5)
+        self.assertEqual(window[3][9], 797)
+        self.assertEqual([tuple(window[i]) for i in range(5)], parts.select(product_id))
+
+
+class TestUpdateCell(unittest.TestCase):
+    """Test returning the rows changed by an edit and patching the window."""
+    def setUp(self):
+        self.db = Database(":memory:")
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        group_id = self.db.groups.insert([offer_id, "group"])
+        self.products = [
+            self.db.group_products.insert([
+                group_id, f"P{i}", 1, None, None, None, 600, 800, 500, None, None
+            ]) for i in range(2)
+        ]
+        self.parts = self.db.group_parts
+        for product_id in self.products:
+            self.parts.insert([product_id, "sivu", 2, None, None, 0, None, None, None, None,
+                               "=tleveys", "=tkorkeus", None])
+            self.parts.insert([product_id, "hylly", 2, None, None, 0, None, None, None, None,
+                               '="sivu".leveys / 2', None, None])
+            self.parts.insert([product_id, "tausta", 1, None, None, 0, None, None, None, None,
+                               "=tleveys", None, None])
+        self.parts.select(self.products[0])
+        self.parts.select(self.products[1])
+
+    def tearDown(self):
+        self.db.con.close()
+
+    def test_changed_parts(self):
+        # Editing the code of 'sivu' changes 'hylly' but not 'tausta'.
+        changed = self.parts.update_cell(1, 11, "=tleveys - 100")
+        self.assertEqual([(r[0], r[8]) for r in changed], [(1, 500), (2, 250)])
+        self.assertEqual(changed, self.parts.select_keys([1, 2]))
+
+        changed = self.parts.update_cell(3, 5, "takaseinä")
+        self.assertEqual([r[0] for r in changed], [3])
+        self.assertIsNone(self.parts.update_cell(3, 2, "sivu"))
+
+    def test_patch_window(self):
+        window = RowWindow(self.parts, block_size=2, prefetch=0)
+        rows = [tuple(window[i]) for i in range(len(window))]
+        self.assertEqual(window.patch(self.parts.update_cell(1, 11, "=tleveys - 100")),
+                         [(0, [8, 11]), (1, [8])])
+        self.assertEqual(window[0][8], 500)
+        self.assertEqual(window[1][8], 250)
+        self.assertEqual([tuple(window[i]) for i in range(2, 6)], rows[2:])
+
+        # Rows not in the cache are left to load.
+        window.blocks.pop(2)
+        self.assertEqual(window.patch(self.parts.update_cell(5, 5, "x")), [])
+        self.assertEqual(window[4][5], "x")
+        self.assertEqual(self.db.offers.update_cell(1, 1, "renamed")[0][1], "renamed")
@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+import event
+from db.database import Database
+from db.super import SQLTableBase
+from worker import Worker, WorkerProxy, call_async
+
+
+class TestWorker(unittest.TestCase):
+    """Test running the database in a worker thread."""
+    def setUp(self):
+        self.dispatched = []
+        self.worker = Worker(Database, self.dispatch)
+        self.db = WorkerProxy(self.worker, wrap=(SQLTableBase,))
+
+    def tearDown(self):
+        self.db.close()
+        self.worker.close()
+
+    def dispatch(self, fn, *args):
+        self.dispatched.append(threading.current_thread())
+        fn(*args)
+
+    def test_blocking_calls(self):
+        offer_id = self.db.offers.insert(["offer"] + [None] * 9)
+        self.assertEqual(self.db.offers.select()[0][1], "offer")
+        self.assertIsInstance(self.db.offers, WorkerProxy)
+        self.assertEqual(self.db.get_table_keys()[0], "offers")
+        self.assertEqual(offer_id, 1)
+
+    def test_future(self):
+        results = []
+        future = self.db.submit("get_offer_cost", 1, callback=results.append)
+        self.assertIsNone(future.result(timeout=5))
+        self.worker.submit(lambda: None).result(timeout=5)
+        self.assertEqual(results, [None])
+        self.assertEqual(self.dispatched, [self.worker.thread])
+
+    def test_superseded(self):
+        blocked = threading.Event()
+        self.worker.submit(blocked.wait)
+        results = []
+        first = call_async(self.db.offers, "select", key="search", callback=results.append)
+        second = call_async(self.db.offers, "select", key="search", callback=results.append)
+        blocked.set()
+        self.assertEqual(second.result(timeout=5), [])
+        self.assertTrue(first.cancelled())
+        self.assertEqual(results, [[]])
+
+    def test_error(self):
+        future = self.worker.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result(timeout=5)
+
+
+class TestCallAsyncWithoutWorker(unittest.TestCase):
+    """Test that call_async works on objects without a worker."""
+    def test_call(self):
+        database = Database(":memory:")
+        results = []
+        future = call_async(database, "get_table_keys", callback=results.append)
+        self.assertEqual(future.result()[0], "offers")
+        self.assertEqual(len(results), 1)
+        database.close()
+
+
+class TestEventDispatch(unittest.TestCase):
+    """Test that events from other threads are dispatched."""
+    def tearDown(self):
+        event.EventHandler.dispatch = None
+        event.EventHandler.queue.pop(-1, None)
+
+    def test_dispatch(self):
+        calls = []
+        event.EventHandler.dispatch = lambda fn, evt: calls.append(("dispatched", evt.data))
+        handler = event.EventHandler()
+        handler.bind(-1, lambda evt: calls.append(("direct", evt.data)))
+        handler.notify(-1, event.Event(self, 1))
+        thread = threading.Thread(target=handler.notify, args=(-1, event.Event(self, 2)))
+        thread.start()
+        thread.join()
+        self.assertEqual(calls, [("direct", 1), ("dispatched", 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Timing of the startup phases of the app.
+
+Phases are nested blocks timed with time.perf_counter. The report uses the
+format of 'python -X importtime', a phase is listed after the phases nested
+in it:
+
+    startup time: self [us] | cumulative | phase
+
+Run the app with 'python -X importtime main.py' or with the environment
+variable TTK_STARTUP_TIMES set to print the phases after the imports.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Phases:
+    """Record the durations of nested startup phases."""
+    def __init__(self):
+        self.records = []       # [(depth, name, self seconds, cumulative seconds)]
+        self.nested = [0.0]     # Time in the finished child phases of each open phase.
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the block as the phase 'name'."""
+        start = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            children = self.nested.pop()
+            self.nested[-1] += total
+            self.records.append((len(self.nested) - 1, name, total - children, total))
+
+    def get_total(self) -> float:
+        """Return the seconds in the top level phases."""
+        return self.nested[0]
+
+    def report(self) -> str:
+        """Return the phases in the format of -X importtime."""
+        lines = ["startup time: self [us] | cumulative | phase"]
+        for (depth, name, own, total) in self.records:
+            lines.append(
+                f"startup time: {int(own * 1e6):>9} | {int(total * 1e6):>10} | "
+                f"{'  ' * depth}{name}"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def enabled() -> bool:
+        """Return True if the startup times should be printed."""
+        return "importtime" in sys._xoptions or bool(os.environ.get("TTK_STARTUP_TIMES"))
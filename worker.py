@@ -0,0 +1,199 @@
+"""Worker thread owning the database and a facade for calling it.
+
+The Worker creates it's target, like Quote, in it's own thread so the
+sqlite connection is used only there. WorkerProxy forwards the method calls
+of the target to the worker. A plain call blocks until the result is ready,
+'submit' returns a Future and calls the callback in the GUI thread using
+the dispatch function, like wx.CallAfter.
+
+Requests with the same key supersede each other. A pending request is
+cancelled when a new one with it's key is submitted, and the callback of a
+running one is not called.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class Worker:
+    """Thread running the calls on the object created by factory.
+
+    Parameters
+    ----------
+    factory : callable
+        Called in the worker thread to create the target object.
+    dispatch : callable, optional
+        Function as dispatch(fn, *args) that calls fn in the GUI thread,
+        like wx.CallAfter. By default callbacks are called in the worker.
+    wait : bool, optional
+        Set False to return before the target is created, call 'wait'
+        before using it. By default True.
+    """
+    def __init__(self, factory, dispatch=None, wait: bool=True):
+        self.dispatch = dispatch
+        self.jobs = queue.Queue()
+        self.latest = {}        # {key: Future of the latest request}
+        self.lock = threading.Lock()
+        self.target = None
+        self.error = None
+        self.started = threading.Event()
+
+        def create():
+            try:
+                self.target = factory()
+            except Exception as err:    # pylint: disable=broad-except
+                self.error = err
+            self.started.set()
+
+        self.thread = threading.Thread(target=self.run, args=(create,),
+                                       name="db-worker", daemon=True)
+        self.thread.start()
+        if wait:
+            self.wait()
+
+    def wait(self):
+        """Wait until the target is created and return it.
+
+        Raises the exception of the factory if it failed.
+        """
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+        return self.target
+
+    def in_worker(self) -> bool:
+        """Return True if called from the worker thread."""
+        return threading.current_thread() is self.thread
+
+    def submit(self, fn, *args, key=None, callback=None, **kwargs) -> Future:
+        """Queue a call of fn in the worker and return it's Future.
+
+        Parameters
+        ----------
+        fn : callable
+            Function to call in the worker.
+        key : hashable, optional
+            Requests with the same key supersede the earlier ones.
+        callback : callable, optional
+            Called with the result as callback(result) when fn succeeds and
+            the request is not superseded.
+        """
+        future = Future()
+        if key is not None:
+            with self.lock:
+                previous = self.latest.get(key)
+                self.latest[key] = future
+            if previous is not None:
+                previous.cancel()
+        self.jobs.put((future, fn, args, kwargs, key, callback))
+        return future
+
+    def call_later(self, milliseconds: int, fn):
+        """Call fn in the worker after a delay, like wx.CallLater."""
+        timer = threading.Timer(milliseconds / 1000, self.submit, (fn,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def is_latest(self, key, future) -> bool:
+        """Return True if the future is the latest request of it's key."""
+        if key is None:
+            return True
+        with self.lock:
+            return self.latest.get(key) is future
+
+    def run(self, create):
+        """Create the target and run the queued calls until closed."""
+        create()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            (future, fn, args, kwargs, key, callback) = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as err:    # pylint: disable=broad-except
+                future.set_exception(err)
+                print(f"{type(err).__name__} in worker call {fn}: {err}")
+                continue
+            future.set_result(result)
+
+            if key is not None and not self.is_latest(key, future):
+                continue
+            if callback is not None:
+                if self.dispatch is None:
+                    callback(result)
+                else:
+                    self.dispatch(callback, result)
+
+    def close(self, timeout: float=None):
+        """Finish the queued calls and stop the thread."""
+        self.jobs.put(None)
+        self.thread.join(timeout)
+
+
+class WorkerProxy:
+    """Forward attribute access and method calls to an object of a worker.
+
+    Parameters
+    ----------
+    worker : Worker
+        Worker owning the object.
+    target : object
+        The object, by default the worker's target.
+    wrap : tuple, optional
+        Types of returned objects that are wrapped in a WorkerProxy,
+        like the table classes returned by Quote.select_table.
+    """
+    def __init__(self, worker: Worker, target=None, wrap: tuple=()):
+        self._worker = worker
+        self._target = worker.target if target is None else target
+        self._wrap = wrap
+
+    def _result(self, value):
+        if self._wrap and isinstance(value, self._wrap):
+            return WorkerProxy(self._worker, value, self._wrap)
+        return value
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return self._result(attr)
+
+        def call(*args, **kwargs):
+            if self._worker.in_worker():
+                return self._result(attr(*args, **kwargs))
+            future = self._worker.submit(attr, *args, **kwargs)
+            return self._result(future.result())
+        return call
+
+    def submit(self, name: str, *args, key=None, callback=None, **kwargs) -> Future:
+        """Call the method 'name' in the worker and return the Future.
+
+        See Worker.submit for key and callback.
+        """
+        fn = getattr(self._target, name)
+        if callback is not None:
+            cb = callback
+            callback = lambda result: cb(self._result(result))
+        return self._worker.submit(fn, *args, key=key, callback=callback, **kwargs)
+
+
+def call_async(target, name: str, *args, key=None, callback=None, **kwargs) -> Future:
+    """Call a method of target through it's worker if it has one.
+
+    Without a worker the method is called now and the callback is called
+    with the result before returning.
+    """
+    if isinstance(target, WorkerProxy):
+        return target.submit(name, *args, key=key, callback=callback, **kwargs)
+
+    future = Future()
+    result = getattr(target, name)(*args, **kwargs)
+    future.set_result(result)
+    if callback is not None:
+        callback(result)
+    return future